@@ -0,0 +1,141 @@
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Pages written to one Parquet part before it is closed; a crash loses at most the open part
+PAGES_PER_FILE = 20
+
+# Fixed schemas for the paged API responses, so every page (and every part) has the same columns
+# whatever fields a page happens to carry. Fields missing from a record are written as nulls.
+CDO_DATA_SCHEMA = pa.schema([
+    ('date', pa.string()),
+    ('datatype', pa.string()),
+    ('station', pa.string()),
+    ('attributes', pa.string()),
+    ('value', pa.float64()),
+])
+CDO_STATIONS_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('name', pa.string()),
+    ('latitude', pa.float64()),
+    ('longitude', pa.float64()),
+    ('elevation', pa.float64()),
+    ('elevationUnit', pa.string()),
+    ('mindate', pa.string()),
+    ('maxdate', pa.string()),
+    ('datacoverage', pa.float64()),
+    ('state', pa.string()),
+])
+EIA_REGION_DATA_SCHEMA = pa.schema([
+    ('period', pa.string()),
+    ('respondent', pa.string()),
+    ('respondent-name', pa.string()),
+    ('type', pa.string()),
+    ('type-name', pa.string()),
+    ('value', pa.float64()),
+    ('value-units', pa.string()),
+])
+EIA_SUBBA_DATA_SCHEMA = pa.schema([
+    ('period', pa.string()),
+    ('subba', pa.string()),
+    ('subba-name', pa.string()),
+    ('parent', pa.string()),
+    ('parent-name', pa.string()),
+    ('value', pa.float64()),
+    ('value-units', pa.string()),
+])
+
+
+def eia_monthly_schema(data_column, facets):
+    """Schema of a monthly EIA data route: period, its facet id/description columns and one data column."""
+    return pa.schema(
+        [('period', pa.string())]
+        + [(facet, pa.string()) for facet in facets]
+        + [(data_column, pa.float64()), (f"{data_column}-units", pa.string())]
+    )
+
+
+def page_batch(records, schema, constants=None):
+    """Convert one page of JSON records into a record batch with exactly `schema`'s columns.
+
+    Values are converted to the schema types (EIA returns numbers as strings); `constants`
+    fills columns that are not part of the records themselves.
+    """
+    constants = constants or {}
+    columns = []
+    for field in schema:
+        if field.name in constants:
+            values = [constants[field.name]] * len(records)
+        else:
+            values = [record.get(field.name) for record in records]
+        try:
+            columns.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns.append(pa.array(values).cast(field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def open_page_sink(path, schema, pages_per_file=PAGES_PER_FILE):
+    """Start a Parquet dataset directory at `path` (replacing any earlier one) that pages are appended to.
+
+    Set sink['constants'] to add fixed column values (e.g. the state being fetched) to later pages.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    return {
+        'path': path,
+        'schema': schema,
+        'pages_per_file': pages_per_file,
+        'constants': {},
+        'writer': None,
+        'part': 0,
+        'pages_in_part': 0,
+        'rows': 0,
+    }
+
+
+def part_path(sink, temporary=False):
+    # The open part is hidden (dot-prefixed), so readers of the dataset skip it until it is complete
+    name = f"part-{sink['part']:05d}.parquet"
+    return os.path.join(sink['path'], f".{name}.tmp" if temporary else name)
+
+
+def write_page(sink, records):
+    """Append one page of records as it arrives; nothing but the open part's buffers is kept."""
+    if not records:
+        return
+    if sink['writer'] is None:
+        sink['writer'] = pq.ParquetWriter(part_path(sink, temporary=True), sink['schema'])
+    sink['writer'].write_batch(page_batch(records, sink['schema'], sink['constants']))
+    sink['rows'] += len(records)
+    sink['pages_in_part'] += 1
+    if sink['pages_in_part'] >= sink['pages_per_file']:
+        close_part(sink)
+
+
+def close_part(sink):
+    if sink['writer'] is None:
+        return
+    sink['writer'].close()
+    os.replace(part_path(sink, temporary=True), part_path(sink))
+    sink['writer'] = None
+    sink['part'] += 1
+    sink['pages_in_part'] = 0
+
+
+def close_page_sink(sink):
+    """Finish the open part; returns the number of rows written."""
+    close_part(sink)
+    return sink['rows']
+
+
+def stream_to_parquet(path, schema, fetch):
+    """Run `fetch(sink)` against a fresh sink at `path`, closing it even if the fetch fails; returns rows written."""
+    sink = open_page_sink(path, schema)
+    try:
+        fetch(sink)
+    finally:
+        close_page_sink(sink)
+    return sink['rows']
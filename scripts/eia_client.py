@@ -0,0 +1,131 @@
+import requests
+import pandas as pd
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from http_response_cache import cache_lookup, cache_store
+from api_page_sink import write_page
+from request_scheduler import open_request_scheduler, scheduled_get, PRIORITY_NORMAL
+
+EIA_BASE_URL = "https://api.eia.gov/v2/"
+PAGE_LENGTH = 5000  # Maximum records per page, as per EIA API
+
+# Pages fetched at once after the first one; the request scheduler keeps them within the API's rate
+MAX_WORKERS = 8
+
+# Server errors are retried with exponential backoff (BACKOFF_FACTOR * 2^n seconds); 429s are left
+# to the request scheduler, which holds back every job sharing the rate limit. urllib3 would
+# otherwise retry any 429 carrying Retry-After itself, so that header is not honoured here.
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 1.0
+RETRY_STATUSES = (500, 502, 503, 504)
+REQUEST_TIMEOUT = 60
+
+
+def new_eia_client(api_key, max_workers=MAX_WORKERS, cache=None, scheduler=None, priority=PRIORITY_NORMAL):
+    """Pooled session with retries, sized for `max_workers` concurrent page requests.
+
+    Pages are read from and stored in `cache` (see http_response_cache.open_response_cache) when
+    given. Requests wait their turn with `scheduler` (see request_scheduler), at `priority`.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=False,
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=max_workers, max_retries=retry))
+    return {
+        "session": session,
+        "api_key": api_key,
+        "max_workers": max_workers,
+        "cache": cache,
+        "scheduler": scheduler or open_request_scheduler(),
+        "priority": priority,
+    }
+
+
+def fetch_eia_page(client, route, params, offset, length=PAGE_LENGTH):
+    """Fetch one page of an EIA v2 data route; returns the JSON `response` object."""
+    url = EIA_BASE_URL + route
+    page_params = {**params, "offset": offset, "length": length}
+    if client["cache"] is not None:
+        data = cache_lookup(client["cache"], url, page_params)
+        if data is not None:
+            return data["response"]
+
+    response = scheduled_get(
+        client["scheduler"], url, client["priority"], session=client["session"],
+        params={**page_params, "api_key": client["api_key"]}, timeout=REQUEST_TIMEOUT
+    )
+    data = response.json()
+    if "response" not in data:
+        raise KeyError(data.get("error", f"Unexpected response with status {response.status_code}"))
+    if client["cache"] is not None:
+        cache_store(client["cache"], url, page_params, data)
+    return data["response"]
+
+
+def iter_eia_pages(client, route, params, length=PAGE_LENGTH):
+    """Yield the record lists of every page of an EIA v2 data query, in offset order.
+
+    The first page gives the row `total`; the remaining offsets are then fetched concurrently
+    on the client's pool and scheduler, with at most max_workers pages in flight or waiting
+    to be yielded.
+    """
+    first = fetch_eia_page(client, route, params, 0, length)
+    yield first.get("data", [])
+
+    offsets = iter(range(length, int(first.get("total", 0)), length))
+    with ThreadPoolExecutor(max_workers=client["max_workers"]) as pool:
+        window = deque(
+            pool.submit(fetch_eia_page, client, route, params, offset, length)
+            for offset in islice(offsets, client["max_workers"])
+        )
+        while window:
+            page = window.popleft().result()
+            for offset in islice(offsets, 1):
+                window.append(pool.submit(fetch_eia_page, client, route, params, offset, length))
+            yield page.get("data", [])
+
+
+def fetch_eia_data(client, route, params, length=PAGE_LENGTH, label=None):
+    """Fetch every page of an EIA v2 data query into one DataFrame.
+
+    Returns an empty DataFrame (after printing the error) if any page fails once its retries are spent.
+    """
+    label = label or route
+    records, pages = [], 0
+    try:
+        for page in iter_eia_pages(client, route, params, length):
+            records.extend(page)
+            pages += 1
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        print(f"Error fetching EIA data for {label}: {e}")
+        return pd.DataFrame()
+
+    print(f"Retrieved {len(records)} records for {label} in {pages} pages.")
+    return pd.DataFrame(records)
+
+
+def stream_eia_data(client, route, params, sink, length=PAGE_LENGTH, label=None):
+    """Write every page of an EIA v2 data query to a page sink (see api_page_sink) as it arrives.
+
+    Returns the number of rows written. On a failed page the pages already written are kept.
+    """
+    label = label or route
+    rows = 0
+    try:
+        for page in iter_eia_pages(client, route, params, length):
+            write_page(sink, page)
+            rows += len(page)
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        print(f"Error fetching EIA data for {label} after {rows} records: {e}")
+        return rows
+
+    print(f"Streamed {rows} records for {label}.")
+    return rows
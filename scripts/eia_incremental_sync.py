@@ -0,0 +1,111 @@
+import os
+import json
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from eia_client import fetch_eia_data
+
+# Hourly EIA series that can be synced, by the facet that identifies one series
+SERIES = {
+    "respondent": {"route": "electricity/rto/region-data/data/", "keys": ["period", "respondent", "type"]},
+    "subba": {"route": "electricity/rto/region-sub-ba-data/data/", "keys": ["period", "subba", "parent"]},
+}
+
+PERIOD_FORMAT = "%Y-%m-%dT%H"  # EIA hourly periods (UTC), e.g. 2023-07-01T14
+REVISION_LOOKBACK_HOURS = 72  # Hours before the watermark re-fetched to pick up revised values
+WATERMARKS_FILE = "_watermarks.json"
+
+
+def load_watermarks(store_dir):
+    """Last ingested period per series, keyed "<facet>=<id>"."""
+    try:
+        with open(os.path.join(store_dir, WATERMARKS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_watermarks(store_dir, watermarks):
+    path = os.path.join(store_dir, WATERMARKS_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def partition_dir(store_dir, facet, series_id, month):
+    return os.path.join(store_dir, f"{facet}={series_id}", f"month={month}")
+
+
+def upsert_partitions(store_dir, facet, series_id, frame, keys):
+    """Merge rows into the series' monthly Parquet partitions; newer rows replace rows with the same keys.
+
+    Only the months present in `frame` are read and rewritten. Returns the number of rows
+    that were not in the store before.
+    """
+    added = 0
+    for month, rows in frame.groupby(frame["period"].str[:7]):
+        directory = partition_dir(store_dir, facet, series_id, month)
+        path = os.path.join(directory, "data.parquet")
+        existing = pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame(columns=rows.columns)
+
+        merged = pd.concat([existing, rows], ignore_index=True)
+        merged = merged.drop_duplicates(subset=keys, keep="last").sort_values(keys, ignore_index=True)
+        added += len(merged) - len(existing)
+
+        # Write beside the old partition and swap, so an interrupted sync never leaves it truncated;
+        # the temporary file is hidden (dot-prefixed) so dataset readers skip it if a sync dies mid-write
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, ".data.parquet.tmp")
+        merged.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+    return added
+
+
+def sync_start(watermark, default_start, lookback_hours=REVISION_LOOKBACK_HOURS):
+    """First period to request: `lookback_hours` before the watermark, or `default_start` on the first sync."""
+    if watermark is None:
+        return default_start
+    start = datetime.strptime(watermark, PERIOD_FORMAT) - timedelta(hours=lookback_hours)
+    return start.strftime(PERIOD_FORMAT)
+
+
+def sync_series(client, facet, series_id, default_start, store_dir, lookback_hours=REVISION_LOOKBACK_HOURS):
+    """Fetch the hours of one series since its watermark (less the lookback) and upsert them.
+
+    Returns the number of new rows. The watermark only advances once the rows are stored.
+    """
+    series = SERIES[facet]
+    os.makedirs(store_dir, exist_ok=True)
+    watermarks = load_watermarks(store_dir)
+    watermark_key = f"{facet}={series_id}"
+    start = sync_start(watermarks.get(watermark_key), default_start, lookback_hours)
+
+    # A closed end hour keeps each refresh a distinct request (see http_response_cache)
+    end = datetime.now(timezone.utc).strftime(PERIOD_FORMAT)
+    params = {
+        "frequency": "hourly",
+        "data[0]": "value",
+        f"facets[{facet}][]": series_id,
+        "start": start,
+        "end": end,
+        "sort[0][column]": "period",
+        "sort[0][direction]": "desc",
+    }
+    data = fetch_eia_data(client, series["route"], params, label=f"{series_id} since {start}")
+    if data.empty:
+        print(f"No new hours for {watermark_key} since {start}.")
+        return 0
+
+    added = upsert_partitions(store_dir, facet, series_id, data, series["keys"])
+    watermarks = load_watermarks(store_dir)  # Re-read so syncs of other series are not overwritten
+    watermarks[watermark_key] = max(data["period"].max(), watermarks.get(watermark_key, ""))
+    save_watermarks(store_dir, watermarks)
+    print(f"Synced {watermark_key}: {len(data)} rows fetched, {added} new, watermark {watermarks[watermark_key]}")
+    return added
+
+
+def read_series(store_dir, facet, series_id):
+    """All stored hours of one series, oldest first."""
+    directory = os.path.join(store_dir, f"{facet}={series_id}")
+    if not os.path.isdir(directory):
+        return pd.DataFrame()
+    return pd.read_parquet(directory).sort_values("period", ignore_index=True)
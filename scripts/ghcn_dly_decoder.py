@@ -0,0 +1,208 @@
+import gzip
+import numpy as np
+import pandas as pd
+
+# Fixed-width positions of a GHCN-Daily .dly record (0-based, end-exclusive)
+ID_SPEC = (0, 11)        # Station ID, e.g. "USW00023174"
+YEAR_SPEC = (11, 15)     # Year YYYY
+MONTH_SPEC = (15, 17)    # Month MM
+ELEMENT_SPEC = (17, 21)  # Element code, e.g. "TMAX", "PRCP"
+
+# 31 day slots follow the header, each a 5-byte value and the MFLAG, QFLAG and SFLAG bytes
+DAYS_OFFSET = 21
+DAY_SLOT_WIDTH = 8
+N_DAYS = 31
+RECORD_LENGTH = DAYS_OFFSET + N_DAYS * DAY_SLOT_WIDTH  # 269
+
+MISSING_VALUE = -9999
+NEWLINE = ord("\n")
+
+# Known codes of each day-slot flag in the GHCN-Daily readme; blank (no flag) is code 0 and
+# becomes the "" category. Unknown bytes decode to missing.
+FLAG_CODES = {
+    "mflag": " BDHKLOPTW",
+    "qflag": " DGIKLMNORSTWXZ",
+    "sflag": " 0678ABCDEFGHIKMNQRSTUWXZabmrsuz"
+}
+FLAG_CATEGORIES = {name: [code.strip() for code in codes] for name, codes in FLAG_CODES.items()}
+
+
+def flag_lookup(codes):
+    """256-entry table mapping a raw flag byte to its category code (-1 for unknown bytes)."""
+    table = np.full(256, -1, dtype=np.int8)
+    table[np.frombuffer(codes.encode("ascii"), dtype=np.uint8)] = np.arange(len(codes), dtype=np.int8)
+    return table
+
+FLAG_LOOKUPS = {name: flag_lookup(codes) for name, codes in FLAG_CODES.items()}
+
+
+def read_dly_buffer(file_path):
+    """Read a .dly file (plain or gzipped) into a uint8 byte buffer."""
+    opener = gzip.open if str(file_path).endswith(".gz") else open
+    with opener(file_path, "rb") as file:
+        return np.frombuffer(file.read(), dtype=np.uint8)
+
+
+def dly_record_matrix(buf):
+    """View a .dly buffer as an (n_records, 269) byte matrix; shorter (malformed) lines are dropped."""
+    if buf.size == 0:
+        return np.empty((0, RECORD_LENGTH), dtype=np.uint8)
+
+    # Fast path: every line is exactly 269 bytes plus "\n", so the buffer reshapes without copying
+    stride = RECORD_LENGTH + 1
+    if buf.size % stride == 0 and (buf[RECORD_LENGTH::stride] == NEWLINE).all():
+        return buf.reshape(-1, stride)[:, :RECORD_LENGTH]
+
+    newlines = np.flatnonzero(buf == NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [buf.size]))
+    starts = starts[(ends - starts) >= RECORD_LENGTH]
+    return buf[starts[:, None] + np.arange(RECORD_LENGTH)]
+
+
+def field_strings(matrix):
+    """View an ASCII byte matrix as one Python string per row."""
+    matrix = np.ascontiguousarray(matrix)
+    return matrix.view(f"S{matrix.shape[1]}").ravel().astype(str)
+
+
+def parse_right_justified(field):
+    """Convert right-justified signed ASCII numbers (e.g. "  -12") to int64 values plus a validity mask."""
+    digits = field.astype(np.int64) - ord("0")
+    is_digit = (digits >= 0) & (digits <= 9)
+    is_blank = field == ord(" ")
+    is_minus = field == ord("-")
+
+    valid = (is_digit | is_blank | is_minus).all(axis=1) & is_digit[:, -1]
+    powers = 10 ** np.arange(field.shape[1] - 1, -1, -1, dtype=np.int64)
+    values = np.where(is_digit, digits, 0) @ powers
+    return np.where(is_minus.any(axis=1), -values, values), valid
+
+
+def select_elements(records, elements=None):
+    """Keep the records of the requested elements, compared on the raw element bytes."""
+    if elements is None:
+        return records
+    wanted = np.array([element.encode("ascii") for element in elements], dtype="S4")
+    codes = np.ascontiguousarray(records[:, ELEMENT_SPEC[0]:ELEMENT_SPEC[1]]).view("S4").ravel()
+    return records[np.isin(codes, wanted)]
+
+
+def days_in_month(years, months):
+    """Vectorized number of days in each (year, month)."""
+    month_start = ((years - 1970) * 12 + (months - 1)).astype("datetime64[M]")
+    return ((month_start + 1).astype("datetime64[D]") - month_start.astype("datetime64[D]")).astype(np.int64)
+
+
+def decode_dly_records(records, elements=None, drop_qc_failed=False):
+    """Decode .dly records into per-record headers and (n_records, 31) day matrices.
+
+    Returns station_id, year, month and element arrays per record, int16 `values`,
+    the MFLAG/QFLAG/SFLAG byte matrices and a `valid` mask that is False for missing
+    (-9999), malformed and impossible dates (e.g. February 30). With `drop_qc_failed`,
+    values carrying any QFLAG are masked as well. Elements are selected before any day
+    slot is decoded.
+    """
+    records = select_elements(records, elements)
+    years, years_ok = parse_right_justified(records[:, YEAR_SPEC[0]:YEAR_SPEC[1]])
+    months, months_ok = parse_right_justified(records[:, MONTH_SPEC[0]:MONTH_SPEC[1]])
+    header_ok = years_ok & months_ok & (months >= 1) & (months <= 12)
+    records, years, months = records[header_ok], years[header_ok], months[header_ok]
+
+    # (n, 31, 8) view of the day slots: bytes 0-4 value, 5 MFLAG, 6 QFLAG, 7 SFLAG
+    slots = records[:, DAYS_OFFSET:].reshape(len(records), N_DAYS, DAY_SLOT_WIDTH)
+    values, valid = parse_right_justified(slots[:, :, :5].reshape(-1, 5))
+    values, valid = values.reshape(-1, N_DAYS), valid.reshape(-1, N_DAYS)
+    valid &= values != MISSING_VALUE
+    valid &= np.arange(1, N_DAYS + 1) <= days_in_month(years, months)[:, None]
+    if drop_qc_failed:
+        valid &= slots[:, :, 6] == ord(" ")
+
+    return {
+        "station_id": field_strings(records[:, ID_SPEC[0]:ID_SPEC[1]]),
+        "year": years,
+        "month": months,
+        "element": field_strings(records[:, ELEMENT_SPEC[0]:ELEMENT_SPEC[1]]),
+        "values": np.where(valid, values, 0).astype(np.int16),
+        "mflag": slots[:, :, 5],
+        "qflag": slots[:, :, 6],
+        "sflag": slots[:, :, 7],
+        "valid": valid
+    }
+
+
+def flag_categorical(decoded, flag, record, day, rows=None, n_rows=None):
+    """Decode one flag of the given day slots into a 1-byte pandas categorical.
+
+    When `rows` is given the codes are scattered into an `n_rows` column; like any fancy
+    assignment the last occurrence of a row wins.
+    """
+    codes = FLAG_LOOKUPS[flag][decoded[flag][record, day]]
+    if rows is not None:
+        column = np.full(n_rows, -1, dtype=np.int8)
+        column[rows] = codes
+        codes = column
+    return pd.Categorical.from_codes(codes, categories=FLAG_CATEGORIES[flag])
+
+
+def day_dates(decoded, record, day):
+    """datetime64[D] dates of the given (record, 0-based day slot) pairs."""
+    month_start = ((decoded["year"] - 1970) * 12 + (decoded["month"] - 1)).astype("datetime64[M]")
+    return month_start.astype("datetime64[D]")[record] + day
+
+
+def dly_wide_frame(decoded, elements, flags=False):
+    """One row per (station, date) with a column per element, built by index assignment instead of a pivot.
+
+    Element values stay in their native GHCN units (tenths of degrees C, tenths of mm, ...);
+    days without a value for an element are NaN. When a station repeats an element-month the
+    first record wins. With `flags`, <ELEMENT>_mflag/_qflag/_sflag categorical columns follow
+    each element.
+    """
+    record, day = np.nonzero(decoded["valid"])
+    if len(record) == 0:
+        flag_columns = [f"{name}_{flag}" for name in elements for flag in FLAG_CODES] if flags else []
+        return pd.DataFrame(columns=["date", "station_id"] + list(elements) + flag_columns)
+
+    dates = day_dates(decoded, record, day)
+    station_codes, stations = pd.factorize(decoded["station_id"][record])
+
+    # One output row per distinct (station, date) key
+    keys = station_codes.astype(np.int64) << 32 | (dates.astype(np.int64) + (1 << 31))
+    unique_keys, row = np.unique(keys, return_inverse=True)
+    first = np.zeros(len(unique_keys), dtype=np.int64)
+    first[row[::-1]] = np.arange(len(row))[::-1]
+
+    result = pd.DataFrame({
+        "date": dates[first],
+        "station_id": np.asarray(stations)[station_codes[first]]
+    })
+    values = decoded["values"][record, day]
+    element = decoded["element"][record]
+    for name in elements:
+        column = np.full(len(unique_keys), np.nan)
+        is_element = np.flatnonzero(element == name)[::-1]
+        column[row[is_element]] = values[is_element]
+        result[name] = column
+        if flags:
+            for flag in FLAG_CODES:
+                result[f"{name}_{flag}"] = flag_categorical(
+                    decoded, flag, record[is_element], day[is_element], row[is_element], len(unique_keys)
+                )
+    return result
+
+
+def dly_long_frame(decoded, flags=False):
+    """One row per valid (station, element, date) value, with year and element ready for partitioning."""
+    record, day = np.nonzero(decoded["valid"])
+    result = pd.DataFrame({
+        "station_id": decoded["station_id"][record],
+        "date": day_dates(decoded, record, day),
+        "value": decoded["values"][record, day],
+        "element": decoded["element"][record],
+        "year": decoded["year"][record].astype(np.int16)
+    })
+    if flags:
+        for flag in FLAG_CODES:
+            result[flag] = flag_categorical(decoded, flag, record, day)
+    return result
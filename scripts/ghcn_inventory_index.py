@@ -0,0 +1,136 @@
+import os
+import json
+import numpy as np
+
+# Fixed-width positions in ghcnd-inventory.txt (0-based, end-exclusive)
+INVENTORY_SPECS = {
+    "station_id": (0, 11),
+    "latitude": (12, 20),
+    "longitude": (21, 30),
+    "element": (31, 35),
+    "first_year": (36, 40),
+    "last_year": (41, 45)
+}
+STATE_SPEC = (38, 40)  # State code in ghcnd-stations.txt
+
+# One compact record per (station, element); the file is sorted by element, then station
+INDEX_DTYPE = np.dtype([
+    ("element", "S4"),
+    ("station_id", "S11"),
+    ("state", "S2"),
+    ("latitude", "f4"),
+    ("longitude", "f4"),
+    ("first_year", "i2"),
+    ("last_year", "i2")
+])
+
+
+def read_fixed_width(path, specs):
+    """Slice the named fixed-width columns out of every line of a text file as stripped byte strings."""
+    with open(path, "rb") as file:
+        lines = np.array(file.read().splitlines())
+    width = max(end for _, end in specs.values())
+    lines = lines.astype(f"S{width}")  # Pads short lines so every field slice exists
+    matrix = lines.view(np.uint8).reshape(len(lines), width)
+    return {
+        name: np.char.strip(np.ascontiguousarray(matrix[:, start:end]).view(f"S{end - start}").ravel())
+        for name, (start, end) in specs.items()
+    }
+
+
+def key_path(index_path):
+    return index_path + ".key.json"
+
+
+def source_key(inventory_path, stations_path=None):
+    """Size and mtime of the inventory and stations files the index is built from (None for a missing stations file)."""
+    key = {}
+    for name, path in (("inventory", inventory_path), ("stations", stations_path)):
+        if path is not None and os.path.exists(path):
+            stat = os.stat(path)
+            key[name] = [stat.st_size, stat.st_mtime]
+        else:
+            key[name] = None
+    return key
+
+
+def build_inventory_index(inventory_path, stations_path=None, index_path=None):
+    """Compile ghcnd-inventory.txt (plus states from ghcnd-stations.txt) into a binary .npy index."""
+    columns = read_fixed_width(inventory_path, INVENTORY_SPECS)
+    index = np.zeros(len(columns["station_id"]), dtype=INDEX_DTYPE)
+    for name in ("element", "station_id"):
+        index[name] = columns[name]
+    for name in ("latitude", "longitude", "first_year", "last_year"):
+        index[name] = columns[name].astype(float)
+
+    if stations_path is not None and os.path.exists(stations_path):
+        stations = read_fixed_width(stations_path, {"station_id": (0, 11), "state": STATE_SPEC})
+        order = np.argsort(stations["station_id"])
+        station_ids = stations["station_id"][order]
+        position = np.clip(np.searchsorted(station_ids, index["station_id"]), 0, len(station_ids) - 1)
+        found = station_ids[position] == index["station_id"]
+        index["state"] = np.where(found, stations["state"][order][position], b"")
+
+    index.sort(order=["element", "station_id"])
+    index_path = index_path or inventory_path + ".idx.npy"
+    tmp_path = index_path + ".tmp.npy"
+    np.save(tmp_path, index)
+    os.replace(tmp_path, index_path)  # Publish atomically so readers never see a partial index
+
+    # Written last, so an index interrupted before this point is rebuilt on the next load
+    with open(key_path(index_path), "w") as file:
+        json.dump(source_key(inventory_path, stations_path), file)
+    print(f"Built inventory index with {len(index)} station-elements at {index_path}")
+    return index_path
+
+
+def load_inventory_index(inventory_path, stations_path=None, index_path=None):
+    """Memory-map the compiled index, rebuilding it first when missing or built from other source files.
+
+    The index is current while the size and mtime of both the inventory and the stations file
+    match those recorded when it was built, so an updated ghcnd-stations.txt (new states) or a
+    different stations file also triggers a rebuild.
+    """
+    index_path = index_path or inventory_path + ".idx.npy"
+    try:
+        with open(key_path(index_path)) as file:
+            current = os.path.exists(index_path) and json.load(file) == source_key(inventory_path, stations_path)
+    except (FileNotFoundError, ValueError):
+        current = False
+    if not current:
+        build_inventory_index(inventory_path, stations_path, index_path)
+    return np.load(index_path, mmap_mode="r")
+
+
+def query_stations(index, element, start_year=None, end_year=None, state=None, bbox=None, full_coverage=False):
+    """Station IDs that have `element` in the years [start_year, end_year] and the given area.
+
+    By default a station matches when its element record overlaps the years; with
+    `full_coverage` it must span all of them. `bbox` is (min_lat, min_lon, max_lat, max_lon).
+    Only the element's contiguous slice of the sorted index is scanned.
+    """
+    key = element.encode("ascii")
+    lo = np.searchsorted(index["element"], key, side="left")
+    hi = np.searchsorted(index["element"], key, side="right")
+    rows = index[lo:hi]
+
+    mask = np.ones(len(rows), dtype=bool)
+    if start_year is not None:
+        mask &= (rows["first_year"] <= start_year) if full_coverage else (rows["last_year"] >= start_year)
+    if end_year is not None:
+        mask &= (rows["last_year"] >= end_year) if full_coverage else (rows["first_year"] <= end_year)
+    if state is not None:
+        mask &= rows["state"] == state.encode("ascii")
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        mask &= (rows["latitude"] >= min_lat) & (rows["latitude"] <= max_lat)
+        mask &= (rows["longitude"] >= min_lon) & (rows["longitude"] <= max_lon)
+    return set(np.char.decode(rows["station_id"][mask], "ascii").tolist())
+
+
+def stations_with_any_element(index, elements, **filters):
+    """Union of query_stations over several elements: the stations whose files are worth opening."""
+    stations = set()
+    for element in elements:
+        stations |= query_stations(index, element, **filters)
+    return stations
@@ -1,8 +1,14 @@
 import os
+import asyncio
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-import boto3
-from datetime import datetime
-from io import StringIO
+from aiobotocore.session import get_session
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
+from ghcn_dly_decoder import dly_record_matrix, decode_dly_records, dly_wide_frame
+from ghcn_inventory_index import load_inventory_index, stations_with_any_element
 
 # S3 Configuration
 S3_BUCKET = 'research-project-cenergy'
@@ -10,110 +16,124 @@ S3_BASE_DIR = 'ghcnd_all/ghcnd_all'
 OUTPUT_BUCKET = S3_BUCKET  # If saving back to the same bucket
 OUTPUT_KEY = 'research_project_data/climate_data/observed_weather_data.csv'
 
-# Initialize boto3 S3 client
-s3_client = boto3.client('s3')
+# Point at a local S3 stand-in (moto server, MinIO, ...) by setting S3_ENDPOINT_URL; None uses AWS
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+
+# Number of station files fetched at once; the client's connection pool is sized to match
+MAX_CONCURRENT_FETCHES = 32
+
+# Threads decoding .dly bodies, so the CPU-bound parsing never blocks the event loop's fetches
+PARSE_WORKERS = os.cpu_count() or 4
 
 # Define target fields
 FIELDS = ['TOBS', 'PRCP']  # Specify variables of interest
 
+# Compiled inventory index used to skip stations that have none of FIELDS; None fetches every station
+INVENTORY_FILE = 'ghcnd-inventory.txt'
+
 def load_stations_from_csv(csv_path):
     """Load station information from `high_coverage_stations.csv`."""
     stations_df = pd.read_csv(csv_path)
     print(f"Loaded {len(stations_df)} stations from {csv_path}")
     return stations_df
 
-def fetch_s3_file(bucket, key):
-    """Fetch file from S3 and return as string content."""
-    response = s3_client.get_object(Bucket=bucket, Key=key)
-    return response['Body'].read().decode('utf-8')
-
-def parse_dly_file_from_s3(station_id):
-    """Parse the `.dly` file for specific variables (TOBS, PRCP) from S3."""
-    s3_key = f"{S3_BASE_DIR}/{station_id}.dly"
-    data_rows = []
-    
+async def fetch_s3_file(client, bucket, key):
+    """Fetch file from S3 and return its raw bytes, or None when the key does not exist."""
     try:
-        file_content = fetch_s3_file(S3_BUCKET, s3_key)
-        for line in file_content.splitlines():
-            element = line[17:21].strip()  # Get the element type (e.g., PRCP, TOBS)
-            
-            # Only process lines with required elements
-            if element in FIELDS:
-                year = line[11:15]
-                month = line[15:17]
-                
-                # Extract 31-day values for the month
-                for day in range(31):
-                    value = line[21 + day * 8:26 + day * 8].strip()  # Read each 5-character field
-                    measurement_flag = line[26 + day * 8:27 + day * 8].strip()
-                    
-                    # Skip missing values indicated by -9999
-                    if value != '-9999':
-                        date = f"{year}-{month}-{str(day + 1).zfill(2)}"
-                        data_rows.append({
-                            'station_id': station_id,
-                            'date': date,
-                            'element': element,
-                            'value': int(value),
-                            'flag': measurement_flag
-                        })
-    except s3_client.exceptions.NoSuchKey:
-        print(f"File not found in S3: {s3_key}")
-    
-    return pd.DataFrame(data_rows)
+        response = await client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    async with response['Body'] as stream:
+        return await stream.read()
+
+def parse_dly_bytes(raw, station_id, state):
+    """Parse `.dly` bytes for the FIELDS variables into one row per date with a column per element."""
+    decoded = decode_dly_records(dly_record_matrix(np.frombuffer(raw, dtype=np.uint8)), FIELDS)
+    weather_data = dly_wide_frame(decoded, FIELDS)
+    weather_data['station_id'] = station_id
+    weather_data.insert(2, 'state', state)
+    return weather_data
+
+def write_frame(writer, frame):
+    """Append a parsed station frame to the output spool file, writing the header once."""
+    frame.to_csv(writer['file'], header=not writer['header_written'], index=False)
+    writer['header_written'] = True
+    writer['rows'] += len(frame)
+
+async def fetch_worker(client, queue, writer, parse_pool):
+    """Take stations off the queue, fetch each file and stream it out once `parse_pool` has decoded it."""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            queue.task_done()
+            return
+        station_id, state = item
+        s3_key = f"{S3_BASE_DIR}/{station_id}.dly"
+        try:
+            raw = await fetch_s3_file(client, S3_BUCKET, s3_key)
+            if raw is None:
+                print(f"File not found in S3: {s3_key}")
+            else:
+                weather_data = await loop.run_in_executor(parse_pool, parse_dly_bytes, raw, station_id, state)
+                if weather_data.empty:
+                    print(f"No data available for station {station_id} in state {state}.")
+                else:
+                    write_frame(writer, weather_data)
+                    print(f"Processed data for station: {station_id} in state: {state}")
+        except Exception as e:
+            print(f"Error processing station {station_id}: {e}")
+        finally:
+            queue.task_done()
+
+async def extract_stations(stations, output_path, endpoint_url=S3_ENDPOINT_URL, max_concurrency=MAX_CONCURRENT_FETCHES,
+                           parse_workers=PARSE_WORKERS):
+    """Fetch, parse and upload all stations with at most `max_concurrency` requests in flight on one pooled client.
+
+    `stations` is a list of (station_id, state) pairs. Files are decoded on `parse_workers`
+    threads while the event loop keeps fetching. Returns the number of rows written.
+    """
+    config = AioConfig(max_pool_connections=max_concurrency)
+    async with get_session().create_client('s3', endpoint_url=endpoint_url, config=config) as client:
+        with open(output_path, 'w', newline='') as output, ThreadPoolExecutor(max_workers=parse_workers) as parse_pool:
+            writer = {'file': output, 'header_written': False, 'rows': 0}
+
+            # A bounded queue keeps the pending work (and bodies held in memory) to the concurrency window
+            queue = asyncio.Queue(maxsize=max_concurrency * 2)
+            workers = [asyncio.create_task(fetch_worker(client, queue, writer, parse_pool)) for _ in range(max_concurrency)]
+            for station in stations:
+                await queue.put(station)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        # Write the final aggregated data to S3 as a CSV, streamed from the spool file
+        if writer['rows']:
+            with open(output_path, 'rb') as body:
+                await client.put_object(Bucket=OUTPUT_BUCKET, Key=OUTPUT_KEY, Body=body)
+            print(f"Observed weather data for all stations saved to S3 at {OUTPUT_BUCKET}/{OUTPUT_KEY}")
+        else:
+            print("No data processed for any station.")
+        return writer['rows']
 
 def main():
     # Load station data from CSV
     stations_csv_path = "high_coverage_tobs_stations.csv"  # Local or S3 CSV
     stations_df = load_stations_from_csv(stations_csv_path)
-    
-    # Initialize an empty DataFrame to collect all parsed data
-    all_data = pd.DataFrame()
-
-    # Process each station individually
-    for _, row in stations_df.iterrows():
-        station_id = row['station_id'].split(":")[-1]  # Strip prefix, leaving just station ID
-        state = row['state']
-        
-        print(f"Processing data for station: {station_id} in state: {state}")
-        
-        # Parse .dly file from S3 for the station
-        weather_data = parse_dly_file_from_s3(station_id)
-        
-        if not weather_data.empty:
-            # Add state to data
-            weather_data['state'] = state
-            weather_data['date'] = pd.to_datetime(weather_data['date'])
-            
-            # Pivot the data to have each element (TOBS, PRCP) as a separate column
-            pivoted_data = weather_data.pivot_table(
-                index=['date', 'station_id', 'state'],
-                columns='element',
-                values='value',
-                aggfunc='first'
-            ).reset_index()
-            
-            # Ensure "TOBS" and "PRCP" columns are present, fill with NaN if missing
-            for column in FIELDS:
-                if column not in pivoted_data.columns:
-                    pivoted_data[column] = pd.NA
-            
-            # Flatten columns after pivoting
-            pivoted_data.columns.name = None
-            
-            # Append pivoted data to the collection DataFrame
-            all_data = pd.concat([all_data, pivoted_data], ignore_index=True)
-        else:
-            print(f"No data available for station {station_id} in state {state}.")
-
-    # Write the final aggregated data to S3 as a CSV
-    if not all_data.empty:
-        csv_buffer = StringIO()
-        all_data.to_csv(csv_buffer, index=False)
-        s3_client.put_object(Bucket=OUTPUT_BUCKET, Key=OUTPUT_KEY, Body=csv_buffer.getvalue())
-        print(f"Observed weather data for all stations saved to S3 at {OUTPUT_BUCKET}/{OUTPUT_KEY}")
-    else:
-        print("No data processed for any station.")
+
+    # Strip the prefix, leaving just the station ID
+    stations = list(zip(stations_df['station_id'].str.split(":").str[-1], stations_df['state']))
+
+    # Skip requests for stations whose inventory cannot match before any network round trip
+    if INVENTORY_FILE is not None and os.path.exists(INVENTORY_FILE):
+        candidates = stations_with_any_element(load_inventory_index(INVENTORY_FILE), FIELDS)
+        print(f"Inventory index skips {sum(sid not in candidates for sid, _ in stations)} of {len(stations)} stations")
+        stations = [(sid, state) for sid, state in stations if sid in candidates]
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        asyncio.run(extract_stations(stations, os.path.join(spool_dir, 'observed_weather_data.csv')))
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,18 @@
 import os
 import pandas as pd
+from station_region_weights import equal_weights
+from isd_state_hour_aggregator import new_normals_hour_accumulator, accumulate_normals_hours, normals_hour_means
 
 # Define file paths
 base_dir = "/media/christopher/Extreme SSD/research_project_data/climate_data"
 input_file = os.path.join(base_dir, "degh_filtered.csv")
 output_file = os.path.join(base_dir, "degh_filtered_aggregated.csv")
 
-# Columns to group by and to aggregate
-group_by_columns = ["month", "day", "hour", "state"]
+# Columns to aggregate; stations are averaged into states per (month, day, hour) with
+# equal weights, streaming the file through a fixed-size accumulator
+station_column = "GHCN_ID"
 aggregation_columns = ["HLY-CLDH-NORMAL", "HLY-HTDH-NORMAL"]
+chunk_size = 200000
 
 # Load the data with specified data types to avoid dtype warnings
 dtype = {
@@ -28,26 +32,24 @@ dtype = {
     "state": "str"
 }
 
-# Read the data
-print("Loading data...")
+# Read the station -> state membership first, so the weights are fixed before aggregating
+print("Loading station states...")
 try:
-    data = pd.read_csv(input_file, dtype=dtype)
-    print("Data loaded successfully.")
+    members = pd.read_csv(input_file, usecols=[station_column, "state"], dtype=dtype)
+    print("Station states loaded successfully.")
 except FileNotFoundError:
     print(f"Error: {input_file} not found. Ensure the file exists and try again.")
     exit(1)
+region_weights = equal_weights(members, key=station_column)
+accumulator = new_normals_hour_accumulator(region_weights, aggregation_columns)
 
-# Drop rows where HLY-CLDH-NORMAL or HLY-HTDH-NORMAL are -9999
-print("Dropping rows with -9999 in HLY-CLDH-NORMAL or HLY-HTDH-NORMAL...")
-data = data[(data["HLY-CLDH-NORMAL"] != -9999) & (data["HLY-HTDH-NORMAL"] != -9999)]
-
-# Group by month, day, hour, and state, then calculate the average of HLY-CLDH-NORMAL and HLY-HTDH-NORMAL
+# Average HLY-CLDH-NORMAL and HLY-HTDH-NORMAL per month, day, hour, and state, one chunk at a time
 print("Aggregating data...")
-aggregated_data = (
-    data.groupby(group_by_columns)[aggregation_columns]
-    .mean()  # Calculate the average for each group
-    .reset_index()
-)
+for chunk in pd.read_csv(input_file, dtype=dtype, chunksize=chunk_size):
+    # Drop rows where HLY-CLDH-NORMAL or HLY-HTDH-NORMAL are -9999
+    chunk = chunk[(chunk["HLY-CLDH-NORMAL"] != -9999) & (chunk["HLY-HTDH-NORMAL"] != -9999)]
+    accumulate_normals_hours(accumulator, chunk, key=station_column)
+aggregated_data = normals_hour_means(accumulator)
 
 # Save the aggregated data to a new CSV file
 print("Saving aggregated data...")
@@ -1,14 +1,19 @@
 import os
 import pandas as pd
+from station_region_weights import equal_weights
+from isd_state_hour_aggregator import new_normals_hour_accumulator, accumulate_normals_hours, normals_hour_means
 
 # Define file paths
 base_dir = "/media/christopher/Extreme SSD/research_project_data/climate_data"
 input_file = os.path.join(base_dir, "hidx_filtered.csv")
 output_file = os.path.join(base_dir, "hidx_filtered_aggregated.csv")
 
-# Columns to group by and to aggregate
-group_by_columns = ["state", "month", "day", "hour"]
+# Column to aggregate; stations are averaged into states per (month, day, hour) with
+# equal weights, streaming the file through a fixed-size accumulator
+station_column = "GHCN_ID"
+group_by_columns = ["state", "month", "day", "hour"]  # Output column and sort order
 aggregation_column = "HLY-HIDX-NORMAL"
+chunk_size = 200000
 
 # Load the data with the specified column types to avoid dtype warnings
 dtype = {
@@ -24,25 +29,26 @@ dtype = {
     "state": "str"
 }
 
-# Read the data
-print("Loading data...")
+# Read the station -> state membership first, so the weights are fixed before aggregating
+print("Loading station states...")
 try:
-    data = pd.read_csv(input_file, dtype=dtype)
-    print("Data loaded successfully.")
+    members = pd.read_csv(input_file, usecols=[station_column, "state"], dtype=dtype)
+    print("Station states loaded successfully.")
 except FileNotFoundError:
     print(f"Error: {input_file} not found. Ensure the file exists and try again.")
     exit(1)
+region_weights = equal_weights(members, key=station_column)
+accumulator = new_normals_hour_accumulator(region_weights, [aggregation_column])
 
-# Drop rows where HLY-HIDX-NORMAL is -9999
-print("Dropping rows with HLY-HIDX-NORMAL = -9999...")
-data = data[data[aggregation_column] != -9999]
-
-# Group by state, month, day, and hour, then calculate the average of HLY-HIDX-NORMAL
+# Average HLY-HIDX-NORMAL per state, month, day, and hour, one chunk at a time
 print("Aggregating data...")
+for chunk in pd.read_csv(input_file, dtype=dtype, chunksize=chunk_size):
+    # Drop rows where HLY-HIDX-NORMAL is -9999
+    chunk = chunk[chunk[aggregation_column] != -9999]
+    accumulate_normals_hours(accumulator, chunk, key=station_column)
 aggregated_data = (
-    data.groupby(group_by_columns)[aggregation_column]
-    .mean()  # Average is equivalent to mean here
-    .reset_index()
+    normals_hour_means(accumulator)[group_by_columns + [aggregation_column]]
+    .sort_values(group_by_columns, ignore_index=True)
 )
 
 # Save the aggregated data to a new CSV file
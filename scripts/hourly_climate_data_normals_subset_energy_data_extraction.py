@@ -1,9 +1,12 @@
 import os
-import requests
 import pandas as pd
 import boto3
 from io import StringIO
 from datetime import datetime
+from http_response_cache import open_response_cache
+from request_scheduler import open_request_scheduler
+from eia_client import new_eia_client, fetch_eia_data, stream_eia_data, PAGE_LENGTH
+from api_page_sink import stream_to_parquet, EIA_REGION_DATA_SCHEMA
 
 # AWS S3 configuration
 S3_BUCKET = 'research-project-cenergy'
@@ -12,6 +15,17 @@ ENERGY_DIR = 'hourly_energy_data'
 BASE_OUTPUT_DIR = os.path.abspath('research_project_data')
 EIA_API_KEY = 'Your_EIA_API_KEY'
 
+# Responses are cached on disk, and requests are paced by the scheduler shared with the other
+# extraction jobs; one pooled EIA client is shared by all regions
+api_cache = open_response_cache()
+scheduler = open_request_scheduler()
+eia_client = new_eia_client(EIA_API_KEY, cache=api_cache, scheduler=scheduler)
+
+# Stream each region's pages into <region>_hourly_energy_data.parquet as they arrive instead of
+# collecting the whole 2017-2024 range in memory for one CSV; off by default since the
+# energy/weather combine step reads the CSVs
+STREAM_TO_PARQUET = False
+
 # Define date range
 START_DATE = '2017-01-01'
 END_DATE = '2024-12-31'
@@ -78,49 +92,23 @@ def filter_and_save_chunked_data(s3_bucket, file_key, stations, output_file, dat
         header_written = True
         print(f"Processed and saved a chunk with {len(chunk)} rows matching stations")
 
-def get_hourly_energy_data(state_code, start_date, end_date, length=5000):
-    """Retrieve all available hourly energy data for the specified region with pagination."""
-    all_data = pd.DataFrame()
-    offset = 0  # Start offset for pagination
-    
-    while True:
-        # Construct URL with current offset
-        url = (
-            f"https://api.eia.gov/v2/electricity/rto/region-data/data/"
-            f"?api_key={EIA_API_KEY}"
-            f"&frequency=hourly"
-            f"&data[0]=value"
-            f"&facets[respondent][]={state_code}"
-            f"&start={start_date}"
-            f"&end={end_date}"
-            f"&sort[0][column]=period"
-            f"&sort[0][direction]=desc"
-            f"&offset={offset}"
-            f"&length={length}"
-        )
+def get_hourly_energy_data(state_code, start_date, end_date, length=PAGE_LENGTH, sink=None):
+    """Retrieve all available hourly energy data for the specified region, fetching pages concurrently.
 
-        response = requests.get(url)
-        
-        try:
-            data = response.json()
-            records = data.get('response', {}).get('data', [])
-            
-            if not records:
-                print(f"No more data found for {state_code}. Pagination complete.")
-                break
-            
-            # Append the new records to the all_data DataFrame
-            all_data = pd.concat([all_data, pd.DataFrame(records)], ignore_index=True)
-            print(f"Retrieved {len(records)} records for {state_code} with offset {offset}.")
-            
-            # Increment offset for the next batch
-            offset += length
-        
-        except (requests.exceptions.JSONDecodeError, KeyError) as e:
-            print(f"Error fetching energy data for state {state_code}: {e}")
-            break
-    
-    return all_data
+    With a page sink the pages are written to it as they arrive and the row count is returned.
+    """
+    params = {
+        "frequency": "hourly",
+        "data[0]": "value",
+        "facets[respondent][]": state_code,
+        "start": start_date,
+        "end": end_date,
+        "sort[0][column]": "period",
+        "sort[0][direction]": "desc",
+    }
+    if sink is not None:
+        return stream_eia_data(eia_client, "electricity/rto/region-data/data/", params, sink, length, label=state_code)
+    return fetch_eia_data(eia_client, "electricity/rto/region-data/data/", params, length, label=state_code)
 
 def main():
     # Define the states and associated regions
@@ -145,6 +133,12 @@ def main():
     
     # Step 3: Collect hourly energy data for each region and save to files
     for region in regions:
+        if STREAM_TO_PARQUET:
+            output_dir = os.path.join(BASE_OUTPUT_DIR, ENERGY_DIR, f"{region}_hourly_energy_data.parquet")
+            rows = stream_to_parquet(output_dir, EIA_REGION_DATA_SCHEMA, lambda sink: get_hourly_energy_data(region, START_DATE, END_DATE, sink=sink))
+            print(f"{rows} hourly energy records for {region} saved to {output_dir}")
+            continue
+
         energy_data = get_hourly_energy_data(region, START_DATE, END_DATE)
         if not energy_data.empty:
             output_file = os.path.join(BASE_OUTPUT_DIR, ENERGY_DIR, f"{region}_hourly_energy_data.csv")
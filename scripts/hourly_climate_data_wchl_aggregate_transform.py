@@ -1,17 +1,26 @@
 import pandas as pd
+from station_region_weights import equal_weights
+from isd_state_hour_aggregator import new_normals_hour_accumulator, accumulate_normals_hours, normals_hour_means
 
 # Set the base directory
 base_dir = "/media/christopher/Extreme SSD/research_project_data/climate_data/"
 
-# Read the CSV file
+# Stations are averaged into states per (month, day, hour) with equal weights, streaming the
+# file through a fixed-size accumulator
 file_path = base_dir + "wchl_filtered.csv"
-df = pd.read_csv(file_path)
+chunk_size = 200000
 
-# Filter out rows with -9999 in the 'HLY-WCHL-NORMAL' column
-df = df[df['HLY-WCHL-NORMAL'] != -9999]
+# Read the station -> state membership first, so the weights are fixed before aggregating
+members = pd.read_csv(file_path, usecols=['GHCN_ID', 'state'], dtype=str)
+accumulator = new_normals_hour_accumulator(equal_weights(members, key='GHCN_ID'), ['HLY-WCHL-NORMAL'])
 
-# Group the data by month, day, hour, and state, then calculate the average of 'HLY-WCHL-NORMAL'
-df_grouped = df.groupby(['month', 'day', 'hour', 'state'])['HLY-WCHL-NORMAL'].mean().reset_index()
+for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+    # Filter out rows with -9999 in the 'HLY-WCHL-NORMAL' column
+    chunk = chunk[chunk['HLY-WCHL-NORMAL'] != -9999]
+    accumulate_normals_hours(accumulator, chunk, key='GHCN_ID')
+
+# Average 'HLY-WCHL-NORMAL' by month, day, hour, and state
+df_grouped = normals_hour_means(accumulator)
 
 # Print the aggregated DataFrame
 print(df_grouped.head(20))
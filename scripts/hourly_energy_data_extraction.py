@@ -1,9 +1,11 @@
 import os
-import requests
-import pandas as pd
 import boto3
 from io import StringIO
 from datetime import datetime
+from http_response_cache import open_response_cache
+from eia_client import new_eia_client, fetch_eia_data, stream_eia_data, PAGE_LENGTH
+from eia_incremental_sync import sync_series, REVISION_LOOKBACK_HOURS
+from api_page_sink import stream_to_parquet, EIA_REGION_DATA_SCHEMA
 
 # AWS S3 configuration
 S3_BUCKET = 'research-project-cenergy'
@@ -12,68 +14,66 @@ ENERGY_DIR = 'hourly_energy_data'
 BASE_OUTPUT_DIR = os.path.abspath('research_project_data')
 EIA_API_KEY = 'Your_EIA_API_KEY'
 
+# Responses are cached on disk; one pooled, rate-limited client is shared by all requests
+api_cache = open_response_cache()
+eia_client = new_eia_client(EIA_API_KEY, cache=api_cache)
+
 # Define date range
 START_DATE = '2022-01-01'
 END_DATE = '2023-12-31'
 start_datetime = datetime.strptime(START_DATE, '%Y-%m-%d')
 end_datetime = datetime.strptime(END_DATE, '%Y-%m-%d')
 
+# "full" pulls START_DATE-END_DATE into one CSV per region; "incremental" only fetches hours after
+# each region's stored watermark (less REVISION_LOOKBACK_HOURS) and upserts them into SYNC_STORE_DIR
+SYNC_MODE = 'full'
+SYNC_STORE_DIR = os.path.join(BASE_OUTPUT_DIR, ENERGY_DIR, 'region_data_store')
+
+# Full pulls stream each page into <region>_hourly_energy_data.parquet as it arrives instead of
+# collecting the whole range in memory for one CSV; off by default since the energy/weather
+# combine step reads the CSVs
+STREAM_TO_PARQUET = False
+
 # Ensure output directories exist
 os.makedirs(os.path.join(BASE_OUTPUT_DIR, CLIMATE_DIR), exist_ok=True)
 os.makedirs(os.path.join(BASE_OUTPUT_DIR, ENERGY_DIR), exist_ok=True)
 
 
+def get_hourly_energy_data(state_code, start_date, end_date, length=PAGE_LENGTH, sink=None):
+    """Retrieve all available hourly energy data for the specified region, fetching pages concurrently.
 
-def get_hourly_energy_data(state_code, start_date, end_date, length=5000):
-    """Retrieve all available hourly energy data for the specified region with pagination."""
-    all_data = pd.DataFrame()
-    offset = 0  # Start offset for pagination
-    
-    while True:
-        # Construct URL with current offset
-        url = (
-            f"https://api.eia.gov/v2/electricity/rto/region-data/data/"
-            f"?api_key={EIA_API_KEY}"
-            f"&frequency=hourly"
-            f"&data[0]=value"
-            f"&facets[respondent][]={state_code}"
-            f"&start={start_date}"
-            f"&end={end_date}"
-            f"&sort[0][column]=period"
-            f"&sort[0][direction]=desc"
-            f"&offset={offset}"
-            f"&length={length}"
-        )
-
-        response = requests.get(url)
-        
-        try:
-            data = response.json()
-            records = data.get('response', {}).get('data', [])
-            
-            if not records:
-                print(f"No more data found for {state_code}. Pagination complete.")
-                break
-            
-            # Append the new records to the all_data DataFrame
-            all_data = pd.concat([all_data, pd.DataFrame(records)], ignore_index=True)
-            print(f"Retrieved {len(records)} records for {state_code} with offset {offset}.")
-            
-            # Increment offset for the next batch
-            offset += length
-        
-        except (requests.exceptions.JSONDecodeError, KeyError) as e:
-            print(f"Error fetching energy data for state {state_code}: {e}")
-            break
-    
-    return all_data
+    With a page sink the pages are written to it as they arrive and the row count is returned.
+    """
+    params = {
+        "frequency": "hourly",
+        "data[0]": "value",
+        "facets[respondent][]": state_code,
+        "start": start_date,
+        "end": end_date,
+        "sort[0][column]": "period",
+        "sort[0][direction]": "desc",
+    }
+    if sink is not None:
+        return stream_eia_data(eia_client, "electricity/rto/region-data/data/", params, sink, length, label=state_code)
+    return fetch_eia_data(eia_client, "electricity/rto/region-data/data/", params, length, label=state_code)
 
 
 def main():
     # Define the regions
     regions = ['CAL', 'FLA', 'NY', 'TEX']
     
+    if SYNC_MODE == 'incremental':
+        for region in regions:
+            sync_series(eia_client, 'respondent', region, START_DATE, SYNC_STORE_DIR, REVISION_LOOKBACK_HOURS)
+        return
+
     for region in regions:
+        if STREAM_TO_PARQUET:
+            output_dir = os.path.join(BASE_OUTPUT_DIR, ENERGY_DIR, f"{region}_hourly_energy_data.parquet")
+            rows = stream_to_parquet(output_dir, EIA_REGION_DATA_SCHEMA, lambda sink: get_hourly_energy_data(region, START_DATE, END_DATE, sink=sink))
+            print(f"{rows} hourly energy records for {region} saved to {output_dir}")
+            continue
+
         energy_data = get_hourly_energy_data(region, START_DATE, END_DATE)
         if not energy_data.empty:
             output_file = os.path.join(BASE_OUTPUT_DIR, ENERGY_DIR, f"{region}_hourly_energy_data.csv")
@@ -1,6 +1,12 @@
 import os
+import json
+import shutil
+import hashlib
 import pandas as pd
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from isd_record_decoder import read_isd_buffer, isd_bytes_to_buffer, iter_isd_tar_members, decode_isd_buffer
+from isd_hourly_resampler import deduplicate_station_hours, DEFAULT_REPORT_PRIORITY
+from isd_columnar_cache import write_station_year_cache
 
 # Base directory for ISD data
 base_dir = "/media/christopher/Extreme SSD/"
@@ -10,16 +16,49 @@ output_dir = os.path.join(base_dir, "yearly_data")  # Directory to store yearly
 # Create output directory if it doesn't exist
 os.makedirs(output_dir, exist_ok=True)
 
+# Parallel extraction settings: worker processes and per-file output shards
+PARALLEL_MODE = True
+NUM_WORKERS = os.cpu_count() or 1
+shard_dir = os.path.join(output_dir, "shards")  # Per-file shards, merged into the yearly CSVs
+
+# Predicates applied to the raw record bytes before decoding (None keeps everything)
+RECORD_FILTERS = {
+    "start_date": None,        # Inclusive, e.g. "2023-06-01"
+    "end_date": None,          # Inclusive, e.g. "2023-08-31"
+    "temp_quality": None,      # Accepted air temperature quality codes, e.g. ["0", "1", "4", "5", "9"]
+    "pressure_quality": None   # Accepted sea level pressure quality codes
+}
+
+# ISD additional-data sections to decode into extra columns (AA1-AA4, GA1, MA1, OC1, AJ1)
+DECODE_SECTIONS = ["AA1"]
+
+# Also write a typed, memory-mappable columnar cache per station-year (.npy columns)
+CACHE_MODE = True
+cache_dir = os.path.join(output_dir, "columnar_cache")
+
+# Keep one report per station-hour, preferring report types earlier in this list (None keeps all reports)
+REPORT_PRIORITY = list(DEFAULT_REPORT_PRIORITY)
+
+# Incremental runs: only new or changed source files are reprocessed and only their years re-merged
+INCREMENTAL_MODE = True
+manifest_file = os.path.join(output_dir, "ingest_manifest.json")
+
+# Read station-year members straight from the isd_YYYY_c*.tar.gz archives instead of extracted directories
+ARCHIVE_MODE = False
+
 # Load station IDs from stations_list.csv and create a combined identifier "USAF-WBAN"
-try:
-    stations_df = pd.read_csv(stations_file)
-    stations_df["station_id"] = stations_df["USAF"].astype(str).str.zfill(6) + "-" + stations_df["WBAN"].astype(str).str.zfill(5)
-    station_ids = stations_df["station_id"].tolist()
-    print(f"Loaded {len(station_ids)} station IDs from {stations_file}")
-    print(f"Sample station IDs: {station_ids[:5]}")  # Print a sample of loaded station IDs for verification
-except FileNotFoundError:
-    print(f"Error: {stations_file} not found. Ensure the file exists and try again.")
-    exit(1)
+def load_station_ids(stations_file):
+    """Load the "USAF-WBAN" station IDs to extract from the stations list."""
+    try:
+        stations_df = pd.read_csv(stations_file)
+        stations_df["station_id"] = stations_df["USAF"].astype(str).str.zfill(6) + "-" + stations_df["WBAN"].astype(str).str.zfill(5)
+        station_ids = stations_df["station_id"].tolist()
+        print(f"Loaded {len(station_ids)} station IDs from {stations_file}")
+        print(f"Sample station IDs: {station_ids[:5]}")  # Print a sample of loaded station IDs for verification
+        return station_ids
+    except FileNotFoundError:
+        print(f"Error: {stations_file} not found. Ensure the file exists and try again.")
+        exit(1)
 
 # Define the specific directories to search for ISD files
 directories = [
@@ -34,151 +73,386 @@ directories = [
 ]
 
 # Function to parse each ISD file and return a DataFrame
-def parse_isd_file(filepath, station_ids):
-    # Define column positions based on ISD specifications with 0-based indexing
-    colspecs = [
-        (0, 4),     # Total variable characters
-        (4, 10),    # USAF ID
-        (10, 15),   # WBAN ID
-        (15, 23),   # Observation date
-        (23, 27),   # Observation time
-        (65, 69),   # Wind speed (tenths of m/s)
-        (87, 92),   # Air temperature (tenths of degrees Celsius)
-        (92, 93),   # Air temperature quality code
-        (93, 98),   # Dew point temperature (tenths of degrees Celsius)
-        (99, 104),  # Sea level pressure (tenths of hPa)
-        (104, 105)  # Sea level pressure quality code
-    ]
-    col_names = [
-        "variable_characters", "usaf_id", "wban_id", "date", "time",
-        "wind_speed", "temperature", "temp_quality", "dew_point", "sea_level_pressure", "pressure_quality"
-    ]
-
+def parse_isd_file(filepath, station_ids, record_filters=None):
+    """Read an ISD file once and decode mandatory fields and AA1 precipitation in a single pass."""
     try:
-        # Read data using fixed-width column specifications, skipping bad lines if needed
-        df = pd.read_fwf(filepath, colspecs=colspecs, names=col_names, na_values=["+9999", "-9999"], error_bad_lines=False)
-    except Exception as e:
+        buf = read_isd_buffer(filepath)
+    except (OSError, EOFError) as e:
         print(f"Error reading file {filepath}: {e}")
-        return pd.DataFrame()  # Return empty DataFrame if parsing fails
+        return pd.DataFrame()  # Return empty DataFrame if reading fails
 
-    # Create a combined station ID "USAF-WBAN" for filtering
-    df["station_id"] = df["usaf_id"].astype(str).str.zfill(6) + "-" + df["wban_id"].astype(str).str.zfill(5)
+    full_data = decode_isd_buffer(buf, station_ids, **(record_filters or {}))
+    if REPORT_PRIORITY is not None:
+        full_data = deduplicate_station_hours(full_data, REPORT_PRIORITY)
 
-    # Convert date and time to string format to ensure consistent type for merging
-    df["date"] = df["date"].astype(str)
-    df["time"] = df["time"].astype(str)
-
-    # Filter by combined USAF-WBAN ID directly
-    filtered_df = df[df["station_id"].isin(station_ids)]
-
-    # Ensure 'filtered_df' has data before proceeding
-    if filtered_df.empty:
+    # Ensure there is matching data before returning
+    if full_data.empty:
         print(f"No matching data found in {filepath} for specified station IDs.")
         return pd.DataFrame()  # Return empty DataFrame to avoid further processing
 
-    # Convert relevant columns to numeric, handling errors gracefully
-    numeric_columns = ["temperature", "dew_point", "wind_speed", "sea_level_pressure"]
-    for col in numeric_columns:
-        filtered_df[col] = pd.to_numeric(filtered_df[col], errors='coerce')
+    return full_data
 
-    # Convert temperature, wind speed, dew point, and pressure to their respective units
-    try:
-        filtered_df["temperature"] = filtered_df["temperature"] / 10.0
-        filtered_df["dew_point"] = filtered_df["dew_point"] / 10.0
-        filtered_df["wind_speed"] = filtered_df["wind_speed"] / 10.0
-        filtered_df["sea_level_pressure"] = filtered_df["sea_level_pressure"] / 10.0
-    except Exception as e:
-        print(f"Error converting units in file {filepath}: {e}")
-        return pd.DataFrame()  # Return empty DataFrame if conversion fails
-
-    # Calculate relative humidity
+
+def parse_isd_member(raw, name, station_ids, record_filters=None):
+    """Gunzip an in-memory tar member and decode it like parse_isd_file."""
     try:
-        # Use the formula to calculate relative humidity
-        filtered_df["relative_humidity"] = 100 * (np.exp((17.625 * filtered_df["dew_point"]) / (filtered_df["dew_point"] + 243.04)) / 
-                                                  np.exp((17.625 * filtered_df["temperature"]) / (filtered_df["temperature"] + 243.04)))
-    except Exception as e:
-        print(f"Error calculating relative humidity in file {filepath}: {e}")
-        return pd.DataFrame()  # Return empty DataFrame if calculation fails
-
-    # Select relevant columns
-    main_data = filtered_df[["date", "time", "station_id", "temperature", "dew_point", "relative_humidity", 
-                             "temp_quality", "wind_speed", "sea_level_pressure", "pressure_quality"]].copy()
-
-    # Ensure date and time columns are of string type in main_data
-    main_data["date"] = main_data["date"].astype(str)
-    main_data["time"] = main_data["time"].astype(str)
-
-    # Attempt to extract precipitation data if available
-    precip_data = []
-    with open(filepath, 'r') as file:
-        lines = file.readlines()
-        for line in lines:
-            # Extract and zero-pad USAF and WBAN IDs to create combined station ID
-            usaf_id = line[4:10].zfill(6)
-            wban_id = line[10:15].zfill(5)
-            station_id = f"{usaf_id}-{wban_id}"
-
-            if station_id in station_ids:
-                # Check for 'AA1' indicator in the line to confirm presence of precipitation data
-                aa1_index = line.find('AA1')
-                if aa1_index != -1:
-                    # Ensure sufficient length before extracting fields to avoid out-of-bounds errors
-                    if len(line) > aa1_index + 11:
-                        try:
-                            # Extract period quantity and precipitation depth
-                            period_quantity = int(line[aa1_index + 3:aa1_index + 5])  # Hours
-                            precip_depth = int(line[aa1_index + 5:aa1_index + 9]) / 10.0  # Depth in mm
-                            precip_data.append({
-                                "station_id": station_id,
-                                "date": line[15:23],  # date portion
-                                "time": line[23:27],  # time portion
-                                "precip_period_hours": period_quantity,
-                                "precip_depth_mm": precip_depth
-                            })
-                        except ValueError:
-                            print(f"Error parsing precipitation data in file {filepath} for line: {line}")
-                    else:
-                        print(f"Line too short for precipitation parsing in file {filepath}: {line}")
-
-    # If precipitation data exists, create DataFrame and ensure 'date' and 'time' are strings for merging
-    if precip_data:
-        precip_df = pd.DataFrame(precip_data)
-        precip_df["date"] = precip_df["date"].astype(str)  # Ensure date is string for consistent merging
-        precip_df["time"] = precip_df["time"].astype(str)  # Ensure time is string for consistent merging
-        full_data = pd.merge(main_data, precip_df, on=["station_id", "date", "time"], how="left")
-    else:
-        full_data = main_data
+        buf = isd_bytes_to_buffer(raw, name)
+    except (OSError, EOFError) as e:
+        print(f"Error reading archive member {name}: {e}")
+        return pd.DataFrame()
+
+    full_data = decode_isd_buffer(buf, station_ids, **(record_filters or {}))
+    if REPORT_PRIORITY is not None:
+        full_data = deduplicate_station_hours(full_data, REPORT_PRIORITY)
+    if full_data.empty:
+        print(f"No matching data found in {name} for specified station IDs.")
+        return pd.DataFrame()
 
     return full_data
 
 
-# Process each file individually and append results to the correct year-based CSV
-for directory in directories:
-    directory_path = os.path.join(base_dir, directory)
-    
-    if not os.path.exists(directory_path):
-        print(f"Directory {directory_path} does not exist. Skipping.")
-        continue
-    
-    for filename in os.listdir(directory_path):
-        filepath = os.path.join(directory_path, filename)
-        # Extract the combined station ID prefix "USAF-WBAN" from the filename
-        usaf_id_prefix = filename[:6].zfill(6)
-        wban_id_prefix = filename[7:12].zfill(5)
-        station_id_prefix = f"{usaf_id_prefix}-{wban_id_prefix}"
-        
-        if station_id_prefix in station_ids:
+def station_id_from_filename(filename):
+    """Extract the combined station ID prefix "USAF-WBAN" from an ISD filename."""
+    usaf_id_prefix = filename[:6].zfill(6)
+    wban_id_prefix = filename[7:12].zfill(5)
+    return f"{usaf_id_prefix}-{wban_id_prefix}"
+
+
+def directory_in_date_window(directory, record_filters):
+    """Check whether an isd_YYYY_c* directory or archive can hold records inside the date window."""
+    year = int(directory[4:8])
+    start_date = (record_filters or {}).get("start_date")
+    end_date = (record_filters or {}).get("end_date")
+    if start_date is not None and year < int(str(start_date)[:4]):
+        return False
+    if end_date is not None and year > int(str(end_date)[:4]):
+        return False
+    return True
+
+
+def list_station_files(station_ids, record_filters=None):
+    """List the ISD files for the requested stations across all year directories."""
+    station_set = set(station_ids)
+    station_files = []
+    for directory in directories:
+        if not directory_in_date_window(directory, record_filters):
+            continue
+        directory_path = os.path.join(base_dir, directory)
+
+        if not os.path.exists(directory_path):
+            print(f"Directory {directory_path} does not exist. Skipping.")
+            continue
+
+        for filename in sorted(os.listdir(directory_path)):
+            if station_id_from_filename(filename) in station_set:
+                station_files.append(os.path.join(directory_path, filename))
+    return station_files
+
+
+def extract_sequential(station_files, station_ids, record_filters=None):
+    """Process each file individually and append results to the correct year-based CSV."""
+    for filepath in station_files:
+        filename = os.path.basename(filepath)
+        try:
+            station_data = parse_isd_file(filepath, station_ids, record_filters)
+            if not station_data.empty:
+                # Extract the year from the date column (assuming date format is YYYYMMDD)
+                station_data["year"] = station_data["date"].str[:4]
+
+                # Write each chunk to the appropriate yearly file
+                for year, year_data in station_data.groupby("year"):
+                    year_file = os.path.join(output_dir, f"weather_data_{year}.csv")
+                    # Append data to the year file
+                    year_data.to_csv(year_file, mode='a', header=not os.path.exists(year_file), index=False)
+            print(f"Processed and appended file: {filename}")
+        except Exception as e:
+            print(f"Error processing file {filename}: {e}")
+
+
+# Station IDs and record filters shared with worker processes, set once per worker by the pool initializer
+_worker_station_ids = None
+_worker_record_filters = None
+
+def _init_worker(station_ids, record_filters=None):
+    global _worker_station_ids, _worker_record_filters
+    _worker_station_ids = set(station_ids)
+    _worker_record_filters = record_filters
+
+
+def write_year_shards(station_data, directory, filename):
+    """Write one shard per year contained in a parsed station-year file."""
+    written = []
+    if station_data.empty:
+        return written
+
+    station_data["year"] = station_data["date"].str[:4]
+    for year, year_data in station_data.groupby("year"):
+        year_shard_dir = os.path.join(shard_dir, year)
+        os.makedirs(year_shard_dir, exist_ok=True)
+
+        # Shard names are unique per input file, so workers never share an output file
+        shard_file = os.path.join(year_shard_dir, f"{directory}__{filename}.csv")
+        tmp_file = shard_file + ".tmp"
+        year_data.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, shard_file)  # Publish atomically so merges never see partial shards
+        written.append((year, shard_file))
+
+        if CACHE_MODE:
+            cache_path = os.path.join(cache_dir, year, f"{directory}__{filename}")
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            written.append((year, write_station_year_cache(year_data, cache_path)))
+    return written
+
+
+def extract_file_to_shards(filepath):
+    """Worker task: parse one ISD file and write one shard per year it contains."""
+    filename = os.path.basename(filepath)
+    directory = os.path.basename(os.path.dirname(filepath))
+    station_data = parse_isd_file(filepath, _worker_station_ids, _worker_record_filters)
+    return write_year_shards(station_data, directory, filename)
+
+
+def extract_member_to_shards(directory, filename, raw):
+    """Worker task: gunzip and parse one in-memory archive member, then write its shards."""
+    station_data = parse_isd_member(raw, filename, _worker_station_ids, _worker_record_filters)
+    return write_year_shards(station_data, directory, filename)
+
+
+def merge_year_shards(year):
+    """Concatenate a year's shards in sorted order into weather_data_{year}.csv."""
+    year_shard_dir = os.path.join(shard_dir, year)
+    year_file = os.path.join(output_dir, f"weather_data_{year}.csv")
+    shard_files = []
+    if os.path.isdir(year_shard_dir):
+        shard_files = sorted(f for f in os.listdir(year_shard_dir) if f.endswith(".csv"))
+
+    # A year whose last source disappeared no longer has a partition
+    if not shard_files:
+        if os.path.exists(year_file):
+            os.remove(year_file)
+            print(f"Removed {year_file}: no shards left for {year}")
+        return None
+
+    tmp_file = year_file + ".tmp"
+    with open(tmp_file, 'w') as out:
+        for i, shard in enumerate(shard_files):
+            with open(os.path.join(year_shard_dir, shard)) as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)  # Write the header once, from the first shard
+                for line in f:
+                    out.write(line)
+    os.replace(tmp_file, year_file)
+    print(f"Merged {len(shard_files)} shards into {year_file}")
+    return year_file
+
+
+def source_fingerprint(filepath, previous=None):
+    """Size, mtime and SHA-256 of a source file; the hash is reused while size and mtime are unchanged."""
+    stat = os.stat(filepath)
+    if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": previous["sha256"]}
+
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256.hexdigest()}
+
+
+def run_config_key(station_ids, record_filters):
+    """Hash the settings that shape the output, so changing them forces a full rebuild."""
+    config = {"stations": sorted(station_ids), "filters": record_filters or {}, "archive_mode": ARCHIVE_MODE,
+              "report_priority": REPORT_PRIORITY, "cache_mode": CACHE_MODE}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def load_manifest(config_key):
+    """Load the ingestion manifest, starting over (and clearing shards) when the run settings changed."""
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        if manifest.get("config") == config_key:
+            return manifest
+        print("Station list or record filters changed since the last run; rebuilding all partitions.")
+
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return {"config": config_key, "sources": {}}
+
+
+def save_manifest(manifest):
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def remove_source_outputs(manifest, source):
+    """Delete the shards a source produced and drop it from the manifest; return the years it touched."""
+    entry = manifest["sources"].pop(source)
+    for shard in entry["shards"]:
+        shard_path = os.path.join(output_dir, shard)
+        if os.path.isdir(shard_path):
+            shutil.rmtree(shard_path)  # Columnar cache entries are directories of .npy columns
+        elif os.path.exists(shard_path):
+            os.remove(shard_path)
+    return set(entry["years"])
+
+
+def plan_incremental(sources, manifest):
+    """Select the new or changed sources and the years whose partitions must be rebuilt."""
+    to_process = {}
+    affected_years = set()
+
+    # Sources that vanished (e.g. a reissued isd_YYYY_c... replaced the old one) lose their shards
+    current = set(sources)
+    for source in list(manifest["sources"]):
+        if source not in current:
+            affected_years |= remove_source_outputs(manifest, source)
+
+    for source in sources:
+        previous = manifest["sources"].get(source)
+        fingerprint = source_fingerprint(source, previous)
+        if previous and previous["sha256"] == fingerprint["sha256"]:
+            previous.update(fingerprint)  # Same content, possibly touched: keep its shards
+            continue
+        if previous:
+            affected_years |= remove_source_outputs(manifest, source)
+        to_process[source] = fingerprint
+
+    print(f"{len(to_process)} of {len(sources)} sources are new or changed")
+    return to_process, affected_years
+
+
+def record_source_outputs(manifest, source, fingerprint, written):
+    """Store a processed source's fingerprint with the shards and years it produced."""
+    manifest["sources"][source] = dict(
+        fingerprint,
+        shards=sorted(os.path.relpath(shard, output_dir) for _, shard in written),
+        years=sorted({year for year, _ in written})
+    )
+
+
+def prepare_run(sources, station_ids, record_filters):
+    """Return the manifest, the sources to process with their fingerprints, and the years already affected."""
+    if INCREMENTAL_MODE:
+        manifest = load_manifest(run_config_key(station_ids, record_filters))
+        to_process, affected_years = plan_incremental(sources, manifest)
+        return manifest, to_process, affected_years
+
+    # Start from empty shard and cache directories so outputs from earlier runs are never merged
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return None, {source: None for source in sources}, set()
+
+
+def finish_run(manifest, to_process, produced, affected_years):
+    """Re-merge only the affected years and persist the manifest."""
+    for source, written in produced.items():
+        affected_years |= {year for year, _ in written}
+        if manifest is not None:
+            record_source_outputs(manifest, source, to_process[source], written)
+
+    for year in sorted(affected_years):
+        merge_year_shards(year)
+
+    if manifest is not None:
+        save_manifest(manifest)
+
+
+def extract_parallel(station_files, station_ids, record_filters=None, num_workers=NUM_WORKERS):
+    """Parse station-year files in a process pool, then merge the shards deterministically per year."""
+    manifest, to_process, affected_years = prepare_run(station_files, station_ids, record_filters)
+
+    produced = {}
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(station_ids, record_filters)) as pool:
+        futures = {pool.submit(extract_file_to_shards, filepath): filepath for filepath in to_process}
+        for future in as_completed(futures):
+            filepath = futures[future]
+            filename = os.path.basename(filepath)
             try:
-                station_data = parse_isd_file(filepath, station_ids)
-                if not station_data.empty:
-                    # Extract the year from the date column (assuming date format is YYYYMMDD)
-                    station_data["year"] = station_data["date"].str[:4]
-                    
-                    # Write each chunk to the appropriate yearly file
-                    for year, year_data in station_data.groupby("year"):
-                        year_file = os.path.join(output_dir, f"weather_data_{year}.csv")
-                        # Append data to the year file
-                        year_data.to_csv(year_file, mode='a', header=not os.path.exists(year_file), index=False)
-                print(f"Processed and appended file: {filename}")
+                produced[filepath] = future.result()
+                print(f"Processed file into shards: {filename}")
             except Exception as e:
                 print(f"Error processing file {filename}: {e}")
+                to_process.pop(filepath)  # Leave it out of the manifest so the next run retries it
+
+    finish_run(manifest, to_process, produced, affected_years)
+
+
+def list_archives(record_filters=None):
+    """List the yearly isd_YYYY_c*.tar.gz archives that exist and overlap the date window."""
+    archives = []
+    for directory in directories:
+        if not directory_in_date_window(directory, record_filters):
+            continue
+        archive_path = os.path.join(base_dir, f"{directory}.tar.gz")
+        if not os.path.exists(archive_path):
+            print(f"Archive {archive_path} does not exist. Skipping.")
+            continue
+        archives.append(archive_path)
+    return archives
+
+
+def extract_archives(station_ids, record_filters=None, num_workers=NUM_WORKERS):
+    """Stream matching members out of each yearly tar.gz into the worker pool, without extracting to disk."""
+    archives = list_archives(record_filters)
+    manifest, to_process, affected_years = prepare_run(archives, station_ids, record_filters)
+    max_pending = num_workers * 2  # Bound the compressed members held in memory at once
+
+    produced = {archive_path: [] for archive_path in to_process}
+    failed = set()
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(station_ids, record_filters)) as pool:
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                archive_path, filename = pending.pop(future)
+                try:
+                    produced[archive_path].extend(future.result())
+                    print(f"Processed archive member into shards: {filename}")
+                except Exception as e:
+                    print(f"Error processing archive member {filename}: {e}")
+                    failed.add(archive_path)
+
+        for archive_path in to_process:
+            directory = os.path.basename(archive_path)[:-len(".tar.gz")]
+            print(f"Streaming members from {archive_path}")
+            for filename, raw in iter_isd_tar_members(archive_path, station_ids):
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[pool.submit(extract_member_to_shards, directory, filename, raw)] = (archive_path, filename)
+
+        collect(list(pending))
+
+    # Archives with failed members keep the shards they did produce but are retried next run
+    for archive_path in failed:
+        affected_years |= {year for year, _ in produced.pop(archive_path)}
+        to_process.pop(archive_path)
+
+    finish_run(manifest, to_process, produced, affected_years)
+
+
+def main():
+    station_ids = load_station_ids(stations_file)
+
+    # Record predicates and requested sections travel together to every decode call
+    decode_options = dict(RECORD_FILTERS, sections=DECODE_SECTIONS)
+
+    if ARCHIVE_MODE:
+        extract_archives(station_ids, decode_options, NUM_WORKERS if PARALLEL_MODE else 1)
+        return
+
+    station_files = list_station_files(station_ids, decode_options)
+    print(f"Found {len(station_files)} ISD files for the requested stations")
+
+    if PARALLEL_MODE or INCREMENTAL_MODE:
+        # Incremental runs need the shard layout, so they use a single worker when not parallel
+        extract_parallel(station_files, station_ids, decode_options, NUM_WORKERS if PARALLEL_MODE else 1)
+    else:
+        extract_sequential(station_files, station_ids, decode_options)
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,68 @@
 import os
 import pandas as pd
 import numpy as np
+from isd_hourly_resampler import resample_station_hours, iter_station_complete_chunks
+from isd_columnar_cache import iter_year_chunks, cached_years
+from isd_state_hour_aggregator import new_region_hour_accumulator, accumulate_region_hours, region_hour_means
+from station_region_weights import equal_weights, population_weights, inverse_distance_weights
+from isd_quantile_sketch import new_quantile_sketch, update_quantile_sketch, sketch_quantiles, impute_from_quantiles
 
 # Directory where yearly CSV files are stored
 yearly_data_dir = "/media/christopher/Extreme SSD/yearly_data"
-output_dir = "/media/christopher/Extreme SSD/transformed_data"  # Directory to store transformed files
+output_dir = "/media/christopher/Extreme SSD/final_transformed_data"  # Directory to store final hourly state files
 os.makedirs(output_dir, exist_ok=True)  # Ensure the output directory exists
 
+# Read the typed columnar cache written by the extraction step when it is available for a year
+USE_COLUMNAR_CACHE = True
+cache_dir = os.path.join(yearly_data_dir, "columnar_cache")
+
 # Path to the stations list file
 stations_file = "/media/christopher/Extreme SSD/stations_list.csv"
 
 # List of columns to aggregate and calculate the average
 aggregation_columns = ["temperature", "wind_speed", "sea_level_pressure", "precip_depth_mm", "relative_humidity"]
 
+# Resample each station onto exact top-of-hour observations before aggregating by state
+RESAMPLE_METHOD = "nearest"  # "nearest" within the tolerance, or "linear" interpolation
+RESAMPLE_TOLERANCE_MINUTES = 30
+
+# Station-month medians fill missing fields of observed hours and outages of up to this many hours;
+# longer runs of empty grid hours stay missing so they drop out of the region means
+MAX_IMPUTE_GAP_HOURS = 3
+
+# How stations are weighted within a region: "equal", "population" (POPULATION column of the
+# stations file) or "inverse_distance" (distance to the region centroids in region_centroids_file)
+REGION_WEIGHTING = "equal"
+region_centroids_file = "/media/christopher/Extreme SSD/region_centroids.csv"  # region,LAT,LON
+
 # Read the stations data to map station IDs to states if needed
 try:
     print("Loading station data...")
     stations_df = pd.read_csv(stations_file)
     stations_df["station_id"] = stations_df["USAF"].astype(str).str.zfill(6) + "-" + stations_df["WBAN"].astype(str).str.zfill(5)
-    stations_df = stations_df[["station_id", "STATE"]].rename(columns={"STATE": "state"})
+    stations_df = stations_df.rename(columns={"STATE": "state", "POPULATION": "population"})
     print("Station data loaded successfully.")
 except FileNotFoundError:
     print(f"Error: {stations_file} not found. Ensure the file exists and try again.")
     exit(1)
 
+# Sparse station x region weights; regions are states unless centroids define other geographies
+if REGION_WEIGHTING == "population":
+    region_weights = population_weights(stations_df)
+    region_column = "state"
+elif REGION_WEIGHTING == "inverse_distance":
+    try:
+        centroids_df = pd.read_csv(region_centroids_file)
+    except FileNotFoundError:
+        print(f"Error: {region_centroids_file} not found. Ensure the file exists and try again.")
+        exit(1)
+    region_weights = inverse_distance_weights(stations_df, centroids_df)
+    region_column = "region"
+else:
+    region_weights = equal_weights(stations_df)
+    region_column = "state"
+print(f"Weighting {len(region_weights['stations'])} stations into {len(region_weights['regions'])} regions ({REGION_WEIGHTING})")
+
 # Define data types to enforce consistent types and avoid dtype warnings
 dtype = {
     "year": "str",  # Using string for consistency
@@ -38,78 +77,70 @@ dtype = {
     "relative_humidity": "float64"
 }
 
-# Process each yearly data file in chunks
+
+def read_year_chunks(year, file_path, chunk_size):
+    """Station-complete chunks of one year, from the columnar cache when available, with the SLP sentinel removed."""
+    if USE_COLUMNAR_CACHE and year in cached_years(cache_dir):
+        reader = iter_year_chunks(cache_dir, year, aggregation_columns, chunk_size)
+    else:
+        reader = pd.read_csv(file_path, chunksize=chunk_size, dtype=dtype, low_memory=False)
+    for chunk in iter_station_complete_chunks(reader):
+        # Replace 9999.9 with NaN in sea_level_pressure to handle missing values
+        chunk["sea_level_pressure"] = chunk["sea_level_pressure"].replace(9999.9, np.nan)
+        yield chunk
+
+
+# Process each yearly data file in two streaming passes: per-(station, month) median sketches,
+# then running weighted sums per (region, hour-of-year) with gaps filled from those medians
 for filename in os.listdir(yearly_data_dir):
     if filename.endswith(".csv") and "weather_data" in filename:
         # Extract the year from the filename
         year = filename.split("_")[2].split(".")[0]
         print(f"\nProcessing file: {filename} for year {year}")
 
-        # Path for the temporary file to store intermediate results
-        temp_file = os.path.join(output_dir, f"temp_{year}.csv")
+        # Fixed-size accumulators for the whole year; no intermediate files are written
+        accumulator = new_region_hour_accumulator(year, region_weights, aggregation_columns)
 
         # Process the file in chunks
         file_path = os.path.join(yearly_data_dir, filename)
         chunk_size = 200000  # Define chunk size based on available memory and file size
         chunk_number = 1  # Initialize chunk counter
 
-        # Initialize temporary file by writing headers
-        with open(temp_file, 'w') as f:
-            # Create a blank DataFrame with columns for initialization
-            columns = ["year", "date", "time", "state"] + aggregation_columns
-            pd.DataFrame(columns=columns).to_csv(f, index=False)
-
-        for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype=dtype, low_memory=False):
-            print(f"  Processing chunk {chunk_number}...")
-
-            # Replace 9999.9 with NaN in sea_level_pressure to handle missing values
-            chunk["sea_level_pressure"] = chunk["sea_level_pressure"].replace(9999.9, np.nan)
+        if USE_COLUMNAR_CACHE and year in cached_years(cache_dir):
+            print(f"  Reading year {year} from the columnar cache")
 
-            # Merge with stations data to add the state column if necessary
-            if "state" not in chunk.columns:
-                print("    Adding state information to chunk...")
-                chunk = chunk.merge(stations_df, on="station_id", how="left")
+        # First pass: per-(station, month) median sketches, independent of chunk_size
+        sketch = new_quantile_sketch(aggregation_columns)
+        for chunk in read_year_chunks(year, file_path, chunk_size):
+            update_quantile_sketch(sketch, chunk)
+        station_month_medians = sketch_quantiles(sketch, 0.5)
+        print(f"  Built median sketches for {len(station_month_medians)} station-months")
 
-            # Impute missing values using median for faster processing (column-wise)
-            for col in aggregation_columns:
-                if chunk[col].isna().all():
-                    continue  # Skip entirely NaN columns to avoid warnings
-                chunk[col] = chunk[col].fillna(chunk[col].median())
+        # Second pass: resample, impute from the sketches and accumulate
+        for chunk in read_year_chunks(year, file_path, chunk_size):
+            print(f"  Processing chunk {chunk_number}...")
 
-            # Drop rows only if all aggregation columns are NaN
-            chunk_cleaned = chunk.dropna(subset=aggregation_columns, how='all')
+            # Pick (or interpolate) one observation per station at each top of the hour
+            chunk = resample_station_hours(chunk, aggregation_columns, RESAMPLE_METHOD, RESAMPLE_TOLERANCE_MINUTES)
 
-            # Group by year, date, time, and state, and calculate the average for each specified column
-            chunk_grouped = (
-                chunk_cleaned.groupby(["year", "date", "time", "state"])[aggregation_columns]
-                .mean()
-                .reset_index()
-            )
+            # Fill missing fields and short outages with the station's median for that month
+            chunk = impute_from_quantiles(chunk, station_month_medians, max_gap_hours=MAX_IMPUTE_GAP_HOURS)
 
-            # Append the processed chunk to the temporary file
-            with open(temp_file, 'a') as f:
-                chunk_grouped.to_csv(f, header=False, index=False)
-            print(f"  Chunk {chunk_number} processed and written to temporary file.")
+            # Map the block onto regions and add it to the running per-region, per-hour sums
+            accumulate_region_hours(accumulator, chunk)
+            print(f"  Chunk {chunk_number} accumulated.")
 
             # Increment chunk counter and clear the chunk from memory
             chunk_number += 1
-            del chunk, chunk_cleaned, chunk_grouped
+            del chunk
 
-        # Final aggregation on the temporary file after all chunks are processed
-        print(f"Final aggregation for year {year} from temporary file...")
-        temp_data = pd.read_csv(temp_file)
+        if accumulator["dropped"]:
+            print(f"  Skipped {accumulator['dropped']} rows outside {year} or from stations outside every region")
 
-        final_aggregated_data = (
-            temp_data.groupby(["year", "date", "time", "state"])[aggregation_columns]
-            .mean()
-            .reset_index()
-        )
+        # Weighted hourly region means, renormalized over the reporting stations
+        final_aggregated_data = region_hour_means(accumulator, region_column)
 
         # Save the final aggregated data to the output file
-        output_file = os.path.join(output_dir, f"weather_data_transform_{year}.csv")
+        output_file = os.path.join(output_dir, f"weather_data_final_transform_{year}_hourly.csv")
         final_aggregated_data.to_csv(output_file, index=False)
-        print(f"Transformed data for year {year} saved to {output_file}")
-
-        # Remove the temporary file to free up disk space
-        os.remove(temp_file)
-        print(f"Temporary file {temp_file} deleted.")
+        print(f"Final transformed data for year {year} saved to {output_file}")
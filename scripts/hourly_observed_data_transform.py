@@ -1,7 +1,9 @@
 import os
+import shutil
 import pandas as pd
-from sklearn.impute import KNNImputer
 import numpy as np
+from station_gap_imputer import iter_imputed_chunks
+from spatial_neighbor_imputer import load_station_coordinates, build_station_tree, fill_block_from_neighbours
 
 # Define base directory paths relative to the project root
 PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))  # Adjusts to the directory of this script
@@ -19,29 +21,29 @@ end_date = '2023-12-31'
 chunk_size = 70000
 total_records_processed = 0  # To keep track of the total records processed
 
+# Per-station TOBS gap filling on the station-sorted stream; gaps longer than MAX_GAP_DAYS stay
+# missing and are flagged in TOBS_imputed (0 observed, 1 filled, 2 gap too long)
+IMPUTE_METHOD = "linear"  # "linear" in time, or "seasonal" (same-phase values SEASONAL_PERIOD days away)
+MAX_GAP_DAYS = 7
+SEASONAL_PERIOD = 365
+
+# Gaps too long for a station's own history are then filled from the k nearest stations that
+# reported the same day (inverse-distance-weighted anomalies, TOBS_imputed = 3)
+SPATIAL_IMPUTE = True
+stations_coordinates_file = os.path.join(PROJECT_ROOT, "cleaned_ghcn_stations.txt")
+NEIGHBOURS = 4
+MAX_NEIGHBOUR_DISTANCE_KM = 150
+# The neighbour pass works on one month of all stations at a time, staged here by the first pass
+blocks_dir = os.path.join(DATA_DIR, "neighbour_imputation_blocks")
+# Per-station columns copied onto the rows added for days a station has no row for
+STATION_COLUMNS = ['state']
+
 def remove_stations_with_excessive_missing(chunk, threshold=50):
     """Remove stations with more than `threshold` missing TOBS records."""
     missing_tobs_counts = chunk['TOBS'].isna().groupby(chunk['station_id']).sum()
     stations_to_remove = missing_tobs_counts[missing_tobs_counts > threshold].index
     return chunk[~chunk['station_id'].isin(stations_to_remove)]
 
-# KNN Imputation function for TOBS only
-def knn_impute_tobs(chunk, n_neighbors=3):
-    """Impute missing values in TOBS using K-Nearest Neighbors, for gaps of 7 or fewer missing values."""
-    if chunk['TOBS'].notna().sum() > 0 and chunk['TOBS'].isna().sum() > 0:
-        imputer = KNNImputer(n_neighbors=n_neighbors)
-        imputed_values = imputer.fit_transform(chunk[['TOBS']])
-        if len(imputed_values) == len(chunk):
-            chunk = chunk.copy()
-            chunk['TOBS'] = imputed_values.flatten()
-    return chunk
-
-# Moving average imputation function for TOBS only
-def moving_average_impute_tobs(chunk, window=7):
-    """Apply a moving average over a seven-day window to further smooth TOBS data."""
-    chunk['TOBS'] = chunk['TOBS'].fillna(chunk['TOBS'].rolling(window=window, min_periods=1, center=True).mean())
-    return chunk
-
 # Conversion functions for TOBS and PRCP values
 def convert_tobs_to_fahrenheit(chunk):
     """Convert TOBS from tenths of Celsius to Fahrenheit."""
@@ -56,49 +58,109 @@ def convert_prcp_to_inches(chunk):
 # Prepare output file with headers only once
 header_written = False
 
-# Process data in chunks
-for i, chunk in enumerate(pd.read_csv(input_file, parse_dates=['date'], chunksize=chunk_size), start=1):
-    # Filter by date range
-    chunk = chunk[(chunk['date'] >= start_date) & (chunk['date'] <= end_date)]
-    
-    # Check if the chunk is empty after filtering
-    if chunk.empty:
-        print(f"Skipping empty chunk {i}.")
-        continue  # Skip to the next chunk if this one is empty
-    
-    print(f"Processing chunk {i} with {len(chunk)} records in date range {start_date} to {end_date}")
-    
-    # Remove stations with more than 50 missing TOBS records
-    chunk = remove_stations_with_excessive_missing(chunk, threshold=50)
-    
-    # Check if the chunk is empty after removing stations
-    if chunk.empty:
-        print(f"Skipping chunk {i} after removing stations with excessive missing TOBS records.")
-        continue  # Skip to the next chunk if all stations were removed
-    
-    # Sort chunk by station and date for smooth imputation
-    chunk = chunk.sort_values(by=['station_id', 'date'])
-    
-    # Apply KNN Imputation to TOBS
-    chunk = knn_impute_tobs(chunk)
-    
-    # Apply Moving Average Imputation to TOBS
-    chunk = moving_average_impute_tobs(chunk)
-    
+def filtered_chunks():
+    """Date-filtered, station/date-sorted chunks of the input with heavily incomplete stations removed."""
+    for i, chunk in enumerate(pd.read_csv(input_file, parse_dates=['date'], chunksize=chunk_size), start=1):
+        # Filter by date range
+        chunk = chunk[(chunk['date'] >= start_date) & (chunk['date'] <= end_date)]
+
+        # Check if the chunk is empty after filtering
+        if chunk.empty:
+            print(f"Skipping empty chunk {i}.")
+            continue  # Skip to the next chunk if this one is empty
+
+        print(f"Processing chunk {i} with {len(chunk)} records in date range {start_date} to {end_date}")
+
+        # Remove stations with more than 50 missing TOBS records
+        chunk = remove_stations_with_excessive_missing(chunk, threshold=50)
+
+        # Check if the chunk is empty after removing stations
+        if chunk.empty:
+            print(f"Skipping chunk {i} after removing stations with excessive missing TOBS records.")
+            continue  # Skip to the next chunk if all stations were removed
+
+        # Sort chunk by station and date; the input is written station by station, so the stream stays sorted
+        yield chunk.sort_values(by=['station_id', 'date'])
+
+def stage_block_rows(chunk, climatology_parts, span_parts):
+    """Append a finished chunk to its months' block files and keep its per-station climatology sums, date span and STATION_COLUMNS."""
+    for block, rows in chunk.groupby(chunk['date'].dt.strftime('%Y-%m')):
+        block_file = os.path.join(blocks_dir, f"{block}.csv")
+        rows.to_csv(block_file, mode='a', index=False, header=not os.path.exists(block_file))
+    climatology_parts.append(chunk.groupby(['station_id', chunk['date'].dt.month])['TOBS'].agg(['sum', 'count']))
+    span_parts.append(chunk.groupby('station_id').agg(
+        min=('date', 'min'), max=('date', 'max'), **{column: (column, 'first') for column in STATION_COLUMNS}
+    ))
+
+def neighbour_filled_block(block_file, climatology, spans, station_tree):
+    """Fill the remaining long TOBS gaps of one month (including days without a row) from neighbouring stations."""
+    data = pd.read_csv(block_file, parse_dates=['date'])
+    month_start = data['date'].min().to_period('M').start_time
+    days = pd.date_range(month_start, month_start + pd.offsets.MonthEnd(0), freq='D')
+    return fill_block_from_neighbours(
+        data, 'TOBS', station_tree, spans, days, climatology, NEIGHBOURS, MAX_NEIGHBOUR_DISTANCE_KM
+    )
+
+def impute_long_gaps_from_neighbours(climatology_parts, span_parts):
+    """Second pass, one month block at a time: fill long TOBS gaps from neighbours and write the output."""
+    sums = pd.concat(climatology_parts).groupby(level=[0, 1]).sum()
+    climatology = (sums['sum'] / sums['count']).where(sums['count'] > 0)
+    spans = pd.concat(span_parts).groupby(level=0).agg({'min': 'min', 'max': 'max', **{column: 'first' for column in STATION_COLUMNS}})
+    spans = spans[spans.index.isin(station_tree['station_index'])]  # Stations without coordinates get no grid rows
+
+    filled_total, added_total = 0, 0
+    for i, filename in enumerate(sorted(os.listdir(blocks_dir))):
+        block, filled, added = neighbour_filled_block(os.path.join(blocks_dir, filename), climatology, spans, station_tree)
+        block.to_csv(output_file, mode='a' if i else 'w', index=False, header=not i)
+        filled_total += filled
+        added_total += added
+        print(f"Block {filename[:-4]}: filled {filled} long-gap TOBS values from neighbouring stations ({added} for absent days)")
+
+    shutil.rmtree(blocks_dir)
+    print(f"Filled {filled_total} long-gap TOBS values from neighbouring stations, {added_total} of them on days without a row")
+
+# The KD-tree is built once; without coordinates the per-station output is written as is
+station_tree = None
+if SPATIAL_IMPUTE:
+    try:
+        station_tree = build_station_tree(load_station_coordinates(stations_coordinates_file))
+    except FileNotFoundError:
+        print(f"Error: {stations_coordinates_file} not found. Skipping neighbour imputation.")
+    else:
+        if os.path.isdir(blocks_dir):
+            shutil.rmtree(blocks_dir)
+        os.makedirs(blocks_dir)
+climatology_parts, span_parts = [], []
+
+# Process data in chunks; the imputer holds back each chunk's open station tail until the next chunk
+imputed_chunks = iter_imputed_chunks(
+    filtered_chunks(), ['TOBS'], IMPUTE_METHOD, MAX_GAP_DAYS, period=SEASONAL_PERIOD
+)
+for i, chunk in enumerate(imputed_chunks, start=1):
     # Convert TOBS from tenths of Celsius to Fahrenheit
     chunk = convert_tobs_to_fahrenheit(chunk)
     
     # Convert PRCP from millimeters to inches
     chunk = convert_prcp_to_inches(chunk)
     
-    # Save the processed chunk to the output file incrementally
-    mode = 'a' if header_written else 'w'
-    chunk.to_csv(output_file, mode=mode, index=False, header=not header_written)
-    header_written = True  # Ensure header is only written once
+    if station_tree is not None:
+        # Staged by month for the neighbour pass, which writes the output file
+        stage_block_rows(chunk, climatology_parts, span_parts)
+    else:
+        # Save the processed chunk to the output file incrementally
+        mode = 'a' if header_written else 'w'
+        chunk.to_csv(output_file, mode=mode, index=False, header=not header_written)
+        header_written = True  # Ensure header is only written once
     
     # Update total records processed and print status
     total_records_processed += len(chunk)
     print(f"Chunk {i} processed. Total records processed so far: {total_records_processed}")
 
+if station_tree is not None:
+    if climatology_parts:
+        impute_long_gaps_from_neighbours(climatology_parts, span_parts)
+    else:
+        shutil.rmtree(blocks_dir)
+
 print(f"All chunks processed. Filtered and imputed TOBS data saved to {output_file}")
 print(f"Total records processed: {total_records_processed}")
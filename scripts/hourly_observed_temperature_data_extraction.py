@@ -1,6 +1,14 @@
 import os
+import glob
+import json
+import time
+import shutil
 import pandas as pd
-from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ghcn_dly_decoder import read_dly_buffer, dly_record_matrix, decode_dly_records, dly_wide_frame, dly_long_frame
+from ghcn_inventory_index import load_inventory_index, stations_with_any_element
 
 # Define base location for station files and output directory
 BASE_LOC = '/home/christopher/Downloads/ghcnd_all/ghcnd_all'
@@ -8,9 +16,33 @@ BASE_OUTPUT_DIR = os.path.abspath('research_project_data')
 CLIMATE_DIR = 'climate_data'
 os.makedirs(os.path.join(BASE_OUTPUT_DIR, CLIMATE_DIR), exist_ok=True)
 
-# Define target fields
+# Define target fields; any GHCN-Daily elements work (TMAX, TMIN, SNOW, SNWD, AWND, ...)
 FIELDS = ['TOBS', 'PRCP']  # Specify variables of interest
 
+# Decode MFLAG/QFLAG/SFLAG into 1-byte categorical columns, and optionally drop every value
+# that failed a quality check (non-blank QFLAG) during the parse
+INCLUDE_FLAGS = True
+DROP_QC_FAILED = False
+
+# Bulk mode ingests every ghcnd_all/*.dly file in a process pool into Parquet partitioned by
+# element and year, instead of the per-station CSV for the stations list
+BULK_MODE = False
+NUM_WORKERS = os.cpu_count() or 1
+BULK_BATCH_SIZE = 500  # .dly files per worker task; each task writes one file per element/year partition
+PARQUET_DIR = os.path.join(BASE_OUTPUT_DIR, CLIMATE_DIR, 'ghcnd_parquet')
+INGEST_REPORT = os.path.join(BASE_OUTPUT_DIR, CLIMATE_DIR, 'ghcnd_ingest_report.json')
+
+# Compiled inventory index used to skip .dly files that have none of FIELDS in the window below;
+# the index is rebuilt automatically when the inventory file changes
+INVENTORY_FILE = '/home/christopher/research_proj/ghcnd-inventory.txt'
+INVENTORY_STATIONS_FILE = '/home/christopher/research_proj/ghcnd-stations.txt'  # Supplies states
+INVENTORY_FILTER = {
+    'start_year': None,  # e.g. 2017
+    'end_year': None,    # e.g. 2024
+    'state': None,       # e.g. 'CA'
+    'bbox': None         # (min_lat, min_lon, max_lat, max_lon)
+}
+
 def load_stations_from_csv(csv_path):
     """Load station information from `high_coverage_stations.csv`."""
     stations_df = pd.read_csv(csv_path)
@@ -18,43 +50,103 @@ def load_stations_from_csv(csv_path):
     return stations_df
 
 def parse_dly_file(file_path, station_id):
-    """Parse the `.dly` file for specific variables (TOBS, PRCP)."""
-    # Initialize an empty list to collect rows
-    data_rows = []
-    
+    """Parse the `.dly` file for the FIELDS variables into one row per date with a column (and flags) per element."""
     try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                # Each line represents one element (e.g., PRCP, TOBS) for one month
-                element = line[17:21].strip()  # Get the element type (e.g., PRCP, TOBS)
-                
-                # Only process lines with required elements
-                if element in FIELDS:
-                    year = line[11:15]
-                    month = line[15:17]
-                    
-                    # Extract 31-day values for the month
-                    for day in range(31):
-                        value = line[21 + day * 8:26 + day * 8].strip()  # Read each 5-character field
-                        measurement_flag = line[26 + day * 8:27 + day * 8].strip()
-                        
-                        # Skip missing values indicated by -9999
-                        if value != '-9999':
-                            date = f"{year}-{month}-{str(day + 1).zfill(2)}"
-                            data_rows.append({
-                                'station_id': station_id,
-                                'date': date,
-                                'element': element,
-                                'value': int(value),
-                                'flag': measurement_flag
-                            })
-    
+        buf = read_dly_buffer(file_path)
     except FileNotFoundError:
         print(f"File not found: {file_path}")
-    
-    return pd.DataFrame(data_rows)
+        return pd.DataFrame()
+
+    decoded = decode_dly_records(dly_record_matrix(buf), FIELDS, DROP_QC_FAILED)
+    weather_data = dly_wide_frame(decoded, FIELDS, INCLUDE_FLAGS)
+    weather_data['station_id'] = station_id
+    return weather_data
+
+def candidate_stations(elements=FIELDS):
+    """Stations whose inventory says they can match, or None (no filtering) without an inventory file."""
+    if not os.path.exists(INVENTORY_FILE):
+        print(f"Inventory file {INVENTORY_FILE} not found; opening every station file.")
+        return None
+    index = load_inventory_index(INVENTORY_FILE, INVENTORY_STATIONS_FILE)
+    return stations_with_any_element(index, elements, **INVENTORY_FILTER)
+
+def ingest_batch(batch_id, file_paths, elements):
+    """Worker task: parse a batch of `.dly` files and write them as element/year Parquet partitions."""
+    frames = []
+    bytes_read = 0
+    for file_path in file_paths:
+        buf = read_dly_buffer(file_path)
+        bytes_read += buf.size
+        decoded = decode_dly_records(dly_record_matrix(buf), elements, DROP_QC_FAILED)
+        frames.append(dly_long_frame(decoded, INCLUDE_FLAGS))
+
+    data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not data.empty:
+        pq.write_to_dataset(
+            pa.Table.from_pandas(data, preserve_index=False),
+            PARQUET_DIR,
+            partition_cols=['element', 'year'],
+            basename_template=f"batch{batch_id:06d}-{{i}}.parquet"  # Unique per batch, so workers never collide
+        )
+    return len(data), bytes_read, len(file_paths)
+
+def ingest_bulk(elements=FIELDS, num_workers=NUM_WORKERS, batch_size=BULK_BATCH_SIZE):
+    """Ingest all `.dly` files under BASE_LOC in parallel and write an ingest report."""
+    file_paths = sorted(glob.glob(os.path.join(BASE_LOC, '*.dly')))
+    candidates = candidate_stations(elements)
+    if candidates is not None:
+        matching = [path for path in file_paths if os.path.basename(path)[:-len('.dly')] in candidates]
+        print(f"Inventory index skips {len(file_paths) - len(matching)} of {len(file_paths)} .dly files")
+        file_paths = matching
+    batches = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+    print(f"Ingesting {len(file_paths)} .dly files in {len(batches)} batches with {num_workers} workers")
+
+    # Re-ingestion replaces the whole store rather than mixing old and new batches
+    if os.path.isdir(PARQUET_DIR):
+        shutil.rmtree(PARQUET_DIR)
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+
+    started = time.time()
+    rows, bytes_read, files_done, failed = 0, 0, 0, []
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = {pool.submit(ingest_batch, batch_id, batch, elements): batch_id for batch_id, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            batch_id = futures[future]
+            try:
+                batch_rows, batch_bytes, batch_files = future.result()
+            except Exception as e:
+                print(f"Error ingesting batch {batch_id}: {e}")
+                failed.append(batch_id)
+                continue
+            rows += batch_rows
+            bytes_read += batch_bytes
+            files_done += batch_files
+            print(f"Batch {batch_id} done: {batch_files} files, {batch_rows} rows")
+
+    elapsed = max(time.time() - started, 1e-9)
+    report = {
+        'elements': list(elements),
+        'files': files_done,
+        'rows': rows,
+        'bytes': bytes_read,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1),
+        'bytes_per_second': round(bytes_read / elapsed, 1),
+        'workers': num_workers,
+        'failed_batches': sorted(failed)
+    }
+    with open(INGEST_REPORT, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Ingested {rows} rows from {files_done} files in {elapsed:.1f}s "
+          f"({report['rows_per_second']:.0f} rows/s, {report['bytes_per_second'] / 1e6:.1f} MB/s); report saved to {INGEST_REPORT}")
+    return report
 
 def main():
+    if BULK_MODE:
+        ingest_bulk()
+        return
+
+
     # Load station data from CSV
     stations_csv_path = "high_coverage_tobs_stations.csv"  # Path to pre-generated filtered_stations.csv
     stations_df = load_stations_from_csv(stations_csv_path)
@@ -62,11 +154,15 @@ def main():
     # Prepare output file and write headers
     output_file = os.path.join(BASE_OUTPUT_DIR, CLIMATE_DIR, "observed_weather_data.csv")
     header_written = False
+    candidates = candidate_stations()
     
     # Process each station individually
     for _, row in stations_df.iterrows():
         station_id = row['station_id'].split(":")[-1]  # Strip prefix, leaving just station ID
         state = row['state']
+        if candidates is not None and station_id not in candidates:
+            print(f"Skipping station {station_id}: inventory has none of {FIELDS} in the requested window")
+            continue
         file_path = os.path.join(BASE_LOC, f"{station_id}.dly")
         
         print(f"Processing data for station: {station_id} in state: {state}")
@@ -75,29 +171,12 @@ def main():
         weather_data = parse_dly_file(file_path, station_id)
         
         if not weather_data.empty:
-            # Add state to data
-            weather_data['state'] = state
-            weather_data['date'] = pd.to_datetime(weather_data['date'])
-            
-            # Pivot the data to have each element (TOBS, PRCP) as a separate column
-            pivoted_data = weather_data.pivot_table(
-                index=['date', 'station_id', 'state'],
-                columns='element',
-                values='value',
-                aggfunc='first'
-            ).reset_index()
-            
-            # Ensure "TOBS" and "PRCP" columns are present, fill with NaN if missing
-            for column in FIELDS:
-                if column not in pivoted_data.columns:
-                    pivoted_data[column] = pd.NA
-            
-            # Flatten columns after pivoting
-            pivoted_data.columns.name = None
-            
+            # Add state to data; the parser already returns one column per element
+            weather_data.insert(2, 'state', state)
+
             # Write data to CSV file
             mode = 'a' if header_written else 'w'
-            pivoted_data.to_csv(output_file, mode=mode, header=not header_written, index=False)
+            weather_data.to_csv(output_file, mode=mode, header=not header_written, index=False)
             header_written = True  # Set header_written to True after the first write
         else:
             print(f"No data available for station {station_id} in state {state}.")
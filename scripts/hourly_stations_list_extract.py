@@ -1,11 +1,23 @@
 import requests
 import pandas as pd
+from http_response_cache import open_response_cache, cached_get_json
+from request_scheduler import open_request_scheduler, PRIORITY_HIGH
+from api_page_sink import open_page_sink, write_page, close_page_sink, CDO_STATIONS_SCHEMA
 
 # NOAA API Configuration
 NOAA_API_TOKEN = 'Your_NOAA_API_TOKEN' # Replace with your NOAA API token
 BASE_URL = "https://www.ncei.noaa.gov/cdo-web/api/v2/stations"
 HEADERS = {'token': NOAA_API_TOKEN}
 
+# Write each page of raw station records (plus state) to filtered_stations2.parquet as it arrives
+# instead of the formatted CSV; off by default since the climate transforms read the CSV
+STREAM_TO_PARQUET = False
+
+# Station listings are cached on disk for a day, so reruns do not spend the daily token quota.
+# Requests go through the scheduler shared with the other NOAA jobs, at high priority.
+api_cache = open_response_cache()
+scheduler = open_request_scheduler()
+
 # Define the FIPS codes for each state
 STATE_FIPS_CODES = {
     'CA': '06',  # California
@@ -14,8 +26,11 @@ STATE_FIPS_CODES = {
     'NY': '36'   # New York
 }
 
-def fetch_stations_for_state(fips_code):
-    """Fetch all stations for a given state FIPS code using NOAA's station endpoint."""
+def fetch_stations_for_state(fips_code, sink=None):
+    """Fetch all stations for a given state FIPS code using NOAA's station endpoint.
+
+    With a page sink each page is written to it as it arrives instead of being collected.
+    """
     all_stations = []
     offset = 1
     limit = 1000  # Maximum allowed by NOAA API
@@ -27,18 +42,20 @@ def fetch_stations_for_state(fips_code):
             'offset': offset
         }
         
-        response = requests.get(BASE_URL, headers=HEADERS, params=params)
-        
         try:
-            response.raise_for_status()
-            data = response.json()
+            status_code, data = cached_get_json(api_cache, BASE_URL, params=params, headers=HEADERS, scheduler=scheduler, priority=PRIORITY_HIGH)
+            if status_code != 200:
+                raise requests.exceptions.HTTPError(f"{status_code} error for {BASE_URL}")
             results = data.get('results', [])
             
             if not results:
                 print(f"No more data available for FIPS {fips_code}. Pagination complete.")
                 break
             
-            all_stations.extend(results)
+            if sink is not None:
+                write_page(sink, results)
+            else:
+                all_stations.extend(results)
             print(f"Retrieved {len(results)} stations with offset {offset} for FIPS {fips_code}")
             offset += limit
         
@@ -65,6 +82,19 @@ def format_station_data(stations, state_abbr):
     return formatted_stations
 
 def main():
+    if STREAM_TO_PARQUET:
+        output_file = "filtered_stations2.parquet"
+        sink = open_page_sink(output_file, CDO_STATIONS_SCHEMA)
+        try:
+            for state_abbr, fips_code in STATE_FIPS_CODES.items():
+                print(f"Fetching stations for {state_abbr} with FIPS code {fips_code}")
+                sink['constants']['state'] = state_abbr
+                fetch_stations_for_state(fips_code, sink)
+        finally:
+            rows = close_page_sink(sink)
+        print(f"{rows} stations saved to {output_file}")
+        return
+
     # Collect all formatted station data for the specified states
     all_formatted_stations = []
     
@@ -1,12 +1,25 @@
 import requests
 import pandas as pd
+from http_response_cache import open_response_cache, cached_get_json
+from request_scheduler import open_request_scheduler, PRIORITY_HIGH
+from api_page_sink import open_page_sink, write_page, close_page_sink, CDO_STATIONS_SCHEMA
 from datetime import datetime
+from ghcn_inventory_index import load_inventory_index, query_stations
 
 # NOAA API Configuration
 NOAA_API_TOKEN = 'Your_NOAA_API_TOKEN'  # Replace with your NOAA API token
 BASE_URL = "https://www.ncei.noaa.gov/cdo-web/api/v2/stations"
 HEADERS = {'token': NOAA_API_TOKEN}
 
+# Write each page of matching raw station records (plus state) to high_coverage_tobs_stations.parquet
+# as it arrives instead of the formatted CSV; off by default since the extraction scripts read the CSV
+STREAM_TO_PARQUET = False
+
+# Station listings are cached on disk for a day, so reruns do not spend the daily token quota.
+# Requests go through the scheduler shared with the other NOAA jobs, at high priority.
+api_cache = open_response_cache()
+scheduler = open_request_scheduler()
+
 # Define date range, FIPS codes for each state, and dataset filter
 START_DATE = '2017-01-01'
 END_DATE = '2024-12-31'
@@ -18,19 +31,15 @@ STATE_FIPS_CODES = {
 }
 
 def read_ghcnd_inventory(file_path='/home/christopher/research_proj/ghcnd-inventory.txt'):
-    """Read GHCND inventory and filter for stations with TOBS data."""
-    inventory = pd.read_csv(
-        file_path, 
-        delim_whitespace=True, 
-        names=['station_id', 'latitude', 'longitude', 'element', 'start_year', 'end_year']
-    )
-    print(inventory.head())
-    # Filter for stations with 'TOBS' in the element column
-    tobs_stations = inventory[inventory['element'] == 'TOBS']['station_id'].unique()
-    return set(tobs_stations)
+    """Stations with TOBS data, answered from the compiled inventory index (built on first use)."""
+    index = load_inventory_index(file_path)
+    return query_stations(index, 'TOBS')
 
-def fetch_stations_for_state(fips_code, start_date, end_date, min_coverage, dataset_id, tobs_stations):
-    """Fetch all stations for a given state FIPS code and filter by dataset, coverage, date range, and TOBS availability."""
+def fetch_stations_for_state(fips_code, start_date, end_date, min_coverage, dataset_id, tobs_stations, sink=None):
+    """Fetch all stations for a given state FIPS code and filter by dataset, coverage, date range, and TOBS availability.
+
+    With a page sink the matching stations of each page are written to it as they arrive instead of being collected.
+    """
     all_stations = []
     offset = 1
     limit = 1000  # Maximum allowed by NOAA API
@@ -43,11 +52,10 @@ def fetch_stations_for_state(fips_code, start_date, end_date, min_coverage, data
             'offset': offset
         }
         
-        response = requests.get(BASE_URL, headers=HEADERS, params=params)
-        
         try:
-            response.raise_for_status()
-            data = response.json()
+            status_code, data = cached_get_json(api_cache, BASE_URL, params=params, headers=HEADERS, scheduler=scheduler, priority=PRIORITY_HIGH)
+            if status_code != 200:
+                raise requests.exceptions.HTTPError(f"{status_code} error for {BASE_URL}")
             results = data.get('results', [])
             
             if not results:
@@ -55,6 +63,7 @@ def fetch_stations_for_state(fips_code, start_date, end_date, min_coverage, data
                 break
             
             # Filter stations based on date range, data coverage, and TOBS availability
+            page_stations = []
             for station in results:
                 station_id = station['id'].split(':')[-1]  # Extract the station number only
                 mindate = station.get('mindate')
@@ -70,7 +79,12 @@ def fetch_stations_for_state(fips_code, start_date, end_date, min_coverage, data
                     
                     # Check if station's date range fully covers the requested date range
                     if mindate_dt <= start_date_dt and maxdate_dt >= end_date_dt:
-                        all_stations.append(station)
+                        page_stations.append(station)
+            
+            if sink is not None:
+                write_page(sink, page_stations)
+            else:
+                all_stations.extend(page_stations)
             
             print(f"Retrieved {len(results)} stations with offset {offset} for FIPS {fips_code}")
             offset += limit
@@ -110,6 +124,19 @@ def main():
     tobs_stations = read_ghcnd_inventory()
     print(f"Total stations with TOBS in GHCND inventory: {len(tobs_stations)}")
     
+    if STREAM_TO_PARQUET:
+        output_file = "high_coverage_tobs_stations.parquet"
+        sink = open_page_sink(output_file, CDO_STATIONS_SCHEMA)
+        try:
+            for state_abbr, fips_code in STATE_FIPS_CODES.items():
+                print(f"Fetching stations for {state_abbr} with FIPS code {fips_code}")
+                sink['constants']['state'] = state_abbr
+                fetch_stations_for_state(fips_code, START_DATE, END_DATE, MIN_COVERAGE, DATASET_ID, tobs_stations, sink)
+        finally:
+            rows = close_page_sink(sink)
+        print(f"{rows} high-coverage TOBS stations saved to {output_file}")
+        return
+
     # Collect all formatted station data for the specified states
     all_formatted_stations = []
     
@@ -0,0 +1,176 @@
+import os
+import gzip
+import json
+import calendar
+import time
+import hashlib
+import threading
+import requests
+from datetime import datetime, timedelta
+from request_scheduler import scheduled_get, PRIORITY_NORMAL
+
+# Shared on-disk cache for EIA and NOAA CDO JSON responses; set API_CACHE_DIR to move it
+CACHE_DIR = os.environ.get('API_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'research_project_api'))
+MAX_CACHE_BYTES = 2 * 1024 ** 3  # Least recently used entries are evicted above this size
+
+# Query parameters that identify the caller rather than the data; never part of the key or stored
+SECRET_PARAMS = ('api_key', 'token')
+
+# Windows that ended more than SETTLE_DAYS ago are treated as immutable. More recent ones (the
+# APIs still revise and backfill them) expire after RECENT_TTL, and requests without an end
+# date (station listings, open-ended pulls) after DEFAULT_TTL.
+END_PARAMS = ('end', 'enddate')
+SETTLE_DAYS = 30
+RECENT_TTL = 3600
+DEFAULT_TTL = 24 * 3600
+
+
+def open_response_cache(directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Open (creating if needed) a cache directory; its current size is taken with one scan."""
+    os.makedirs(directory, exist_ok=True)
+    size = sum(entry['size'] for entry in cache_entries(directory))
+    return {'directory': directory, 'max_bytes': max_bytes, 'size': size, 'lock': threading.Lock()}
+
+
+def cache_entries(directory):
+    """Every stored entry with its size and last-use time (file mtime)."""
+    entries = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.json.gz'):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append({'path': path, 'size': stat.st_size, 'used': stat.st_mtime})
+    return entries
+
+
+def normalized_request(url, params=None):
+    """The request as stored: URL without its query, plus all query parameters sorted, secrets removed."""
+    url, _, query = url.partition('?')
+    items = [tuple(pair.split('=', 1)) if '=' in pair else (pair, '') for pair in query.split('&') if pair]
+    items += [(str(name), str(value)) for name, value in (params or {}).items()]
+    return {'url': url, 'params': sorted((name, value) for name, value in items if name not in SECRET_PARAMS)}
+
+
+def request_key(url, params=None):
+    """Content address of a request: SHA-256 of its normalized form."""
+    request = normalized_request(url, params)
+    return hashlib.sha256(json.dumps(request, separators=(',', ':')).encode()).hexdigest()
+
+
+def entry_path(cache, key):
+    return os.path.join(cache['directory'], key[:2], f"{key}.json.gz")
+
+
+def window_end(params):
+    """End date of the requested window (YYYY, YYYY-MM or YYYY-MM-DD[Thh] prefixes), or None."""
+    for name in END_PARAMS:
+        value = str((params or {}).get(name) or '')[:10]
+        if value:
+            parts = [int(part) for part in value.split('-')]
+            year = parts[0]
+            month = parts[1] if len(parts) > 1 else 12
+            day = parts[2] if len(parts) > 2 else calendar.monthrange(year, month)[1]
+            return datetime(year, month, day)
+    return None
+
+
+def response_ttl(params, now=None):
+    """Seconds an entry stays valid, or None for a closed historical window."""
+    end = window_end(params)
+    if end is None:
+        return DEFAULT_TTL
+    now = now or datetime.now()
+    return None if end + timedelta(days=SETTLE_DAYS) < now else RECENT_TTL
+
+
+def cache_lookup(cache, url, params=None):
+    """Cached JSON body for a request, or None on a miss or an expired entry."""
+    path = entry_path(cache, request_key(url, params))
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+
+    if entry['expires'] is not None and entry['expires'] < time.time():
+        with cache['lock']:
+            remove_entry(cache, path)
+        return None
+    # Mark as recently used; another thread or process may have evicted the entry since it was read
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return entry['body']
+
+
+def cache_store(cache, url, params, body):
+    """Store a JSON body compressed under the request's content address, then evict down to size."""
+    path = entry_path(cache, request_key(url, params))
+    ttl = response_ttl(params)
+    entry = {
+        **normalized_request(url, params),
+        'expires': None if ttl is None else time.time() + ttl,
+        'body': body,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    previous = os.path.getsize(path) if os.path.exists(path) else 0
+
+    # Write to a temporary file first so readers never see a partial entry
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        json.dump(entry, f, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+    with cache['lock']:
+        cache['size'] += os.path.getsize(path) - previous
+        if cache['size'] > cache['max_bytes']:
+            evict_entries(cache)
+
+
+def remove_entry(cache, path):
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        cache['size'] -= size
+    except FileNotFoundError:
+        pass
+
+
+def evict_entries(cache, target_fraction=0.9):
+    """Remove least recently used entries until the cache is below `target_fraction` of its limit.
+
+    Called with the cache lock held.
+    """
+    entries = sorted(cache_entries(cache['directory']), key=lambda entry: entry['used'])
+    cache['size'] = sum(entry['size'] for entry in entries)
+    for entry in entries:
+        if cache['size'] <= cache['max_bytes'] * target_fraction:
+            break
+        remove_entry(cache, entry['path'])
+
+
+def cached_get_json(cache, url, params=None, headers=None, session=None, timeout=60, scheduler=None, priority=PRIORITY_NORMAL):
+    """GET a JSON API response through the cache; returns (status_code, body).
+
+    Hits return status 200 without a request. Misses go through `session` (or plain requests),
+    waiting their turn with `scheduler` when one is given (see request_scheduler); only 200
+    responses are parsed and stored, other statuses return (status_code, None).
+    With `cache` None this is an uncached request.
+    """
+    if cache is not None:
+        body = cache_lookup(cache, url, params)
+        if body is not None:
+            return 200, body
+
+    if scheduler is not None:
+        response = scheduled_get(scheduler, url, priority, session=session, params=params, headers=headers, timeout=timeout)
+    else:
+        response = (session or requests).get(url, params=params, headers=headers, timeout=timeout)
+    if response.status_code != 200:
+        return response.status_code, None
+    body = response.json()
+    if cache is not None:
+        cache_store(cache, url, params, body)
+    return 200, body
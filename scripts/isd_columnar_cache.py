@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Columns stored as float32 measurements and as uint8 single-character codes
+MEASUREMENT_DTYPE = np.float32
+CODE_SUFFIXES = ("_quality", "_condition")
+EPOCH = np.datetime64("1970-01-01T00:00", "m")
+
+
+def is_code_column(column):
+    return column.endswith(CODE_SUFFIXES)
+
+
+def encode_codes(values):
+    """Single-character codes as uint8 bytes; empty or missing codes become 0."""
+    codes = pd.Series(values).fillna("").astype(str).str[:1].str.pad(1, fillchar="\0")
+    return np.frombuffer("".join(codes).encode("latin-1"), dtype=np.uint8).copy()
+
+
+def decode_codes(values):
+    """uint8 code bytes back to single-character strings ("" for 0)."""
+    return np.char.decode(np.asarray(values).view("S1"), "latin-1")
+
+
+def cache_columns(station_data):
+    """Convert one decoded station-year frame into compact typed column arrays."""
+    minutes = pd.to_datetime(
+        station_data["date"].astype(str) + station_data["time"].astype(str).str.zfill(4),
+        format="%Y%m%d%H%M", errors="coerce"
+    ).values.astype("datetime64[m]")
+    valid = ~np.isnat(minutes)
+    offsets = (minutes[valid] - EPOCH).astype(np.int64)
+
+    columns = {
+        "epoch_hour": (offsets // 60).astype(np.int32),
+        "minute": (offsets % 60).astype(np.uint8)
+    }
+    for column in station_data.columns:
+        values = station_data[column].to_numpy()[valid]
+        if column == "station_id":
+            columns[column] = np.asarray(values, dtype="S12")
+        elif column == "report_type":
+            columns[column] = np.asarray(values, dtype="S5")
+        elif is_code_column(column):
+            columns[column] = encode_codes(values)
+        elif pd.api.types.is_numeric_dtype(station_data[column]):
+            columns[column] = values.astype(MEASUREMENT_DTYPE)
+    return columns
+
+
+def write_station_year_cache(station_data, cache_path):
+    """Write a station-year as one .npy file per column in `cache_path`, published atomically."""
+    tmp_path = cache_path + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for column, values in cache_columns(station_data).items():
+        np.save(os.path.join(tmp_path, f"{column}.npy"), values)
+
+    if os.path.isdir(cache_path):
+        old_path = cache_path + ".old"
+        os.replace(cache_path, old_path)
+        os.replace(tmp_path, cache_path)
+        for name in os.listdir(old_path):
+            os.remove(os.path.join(old_path, name))
+        os.rmdir(old_path)
+    else:
+        os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def load_station_year(cache_path, columns=None, mmap=True):
+    """Load a station-year's column arrays, memory-mapped by default.
+
+    Requested measurement columns that were not cached come back as all-NaN arrays.
+    """
+    stored = [name[:-4] for name in sorted(os.listdir(cache_path)) if name.endswith(".npy")]
+    if columns is None:
+        names = stored
+    else:
+        # Timestamps and station IDs always come along with the requested columns
+        required = ["epoch_hour", "minute", "station_id"]
+        names = required + [c for c in columns if c not in required]
+    mode = "r" if mmap else None
+
+    arrays = {}
+    for name in names:
+        if name in stored:
+            arrays[name] = np.load(os.path.join(cache_path, f"{name}.npy"), mmap_mode=mode)
+        else:
+            arrays[name] = np.full(len(arrays["epoch_hour"]), np.nan, dtype=MEASUREMENT_DTYPE)
+    return arrays
+
+
+def station_year_frame(arrays, decode=True):
+    """Build a DataFrame from cached arrays with an `obs_time` timestamp column."""
+    minutes = arrays["epoch_hour"].astype(np.int64) * 60 + arrays["minute"]
+    data = {"obs_time": EPOCH + minutes.astype("timedelta64[m]")}
+    for name, values in arrays.items():
+        if name in ("epoch_hour", "minute"):
+            continue
+        if decode and name in ("station_id", "report_type"):
+            values = np.char.decode(values, "ascii")
+        elif decode and is_code_column(name):
+            values = decode_codes(values)
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def cached_years(cache_dir):
+    """Years that have a cache directory."""
+    if not os.path.isdir(cache_dir):
+        return []
+    return sorted(name for name in os.listdir(cache_dir) if name.isdigit())
+
+
+def iter_year_entries(cache_dir, year, columns=None, mmap=True):
+    """Yield the column arrays of every cached station-year of `year`, ordered by entry name."""
+    year_dir = os.path.join(cache_dir, str(year))
+    if not os.path.isdir(year_dir):
+        return
+    for entry in sorted(os.listdir(year_dir)):
+        entry_path = os.path.join(year_dir, entry)
+        if not os.path.isdir(entry_path) or entry.endswith((".tmp", ".old")):
+            continue
+        yield load_station_year(entry_path, columns, mmap)
+
+
+def iter_year_chunks(cache_dir, year, columns=None, chunk_rows=200000):
+    """Yield frames of whole station-years from the cache, each roughly `chunk_rows` rows."""
+    frames, rows = [], 0
+    for arrays in iter_year_entries(cache_dir, year, columns):
+        frames.append(station_year_frame(arrays))
+        rows += len(frames[-1])
+        if rows >= chunk_rows:
+            yield pd.concat(frames, ignore_index=True)
+            frames, rows = [], 0
+    if frames:
+        yield pd.concat(frames, ignore_index=True)
+
+
+def load_year_frame(cache_dir, year, columns=None, mmap=True):
+    """Load every cached station-year for `year` into one frame, ordered by cache entry name."""
+    frames = [station_year_frame(arrays) for arrays in iter_year_entries(cache_dir, year, columns, mmap)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -0,0 +1,96 @@
+import os
+import sys
+import numpy as np
+from isd_record_decoder import record_bounds, field_matrix, parse_int_field, date_key, decode_isd_buffer, DATE_SPEC
+
+# Sidecar written next to each uncompressed ISD station-year file
+INDEX_SUFFIX = ".dayidx.npz"
+
+
+def index_path(filepath):
+    return f"{filepath}{INDEX_SUFFIX}"
+
+
+def map_isd_file(filepath):
+    """Read-only byte view of an ISD file; np.memmap cannot map a zero-byte file, so those give an empty array."""
+    if os.path.getsize(filepath) == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(filepath, dtype=np.uint8, mode="r")
+
+
+def build_day_index(filepath):
+    """Record the byte offset of each day's first record in an ISD file and save it as a sidecar."""
+    if str(filepath).endswith(".gz"):
+        raise ValueError(f"Day index requires an uncompressed ISD file: {filepath}")
+
+    buf = map_isd_file(filepath)
+    starts, _ = record_bounds(buf)
+    dates, valid = parse_int_field(field_matrix(buf, starts, *DATE_SPEC))
+    starts, dates = starts[valid], dates[valid]
+    del buf  # The offsets and dates are copies; release the mapping before writing the sidecar
+
+    # Offsets are only usable as ranges when records are in date order
+    ordered = bool(np.all(np.diff(dates) >= 0))
+    first = np.concatenate(([True], dates[1:] != dates[:-1])) if len(dates) else np.empty(0, dtype=bool)
+
+    stat = os.stat(filepath)
+    np.savez(
+        index_path(filepath),
+        dates=dates[first].astype(np.int32),
+        offsets=starts[first].astype(np.int64),
+        ordered=ordered,
+        file_size=stat.st_size,
+        file_mtime=stat.st_mtime
+    )
+    return index_path(filepath)
+
+
+def load_day_index(filepath):
+    """Load the sidecar index, rebuilding it when missing or older than the ISD file."""
+    path = index_path(filepath)
+    if os.path.exists(path):
+        index = read_index(path)
+        stat = os.stat(filepath)
+        if int(index["file_size"]) == stat.st_size and float(index["file_mtime"]) == stat.st_mtime:
+            return index
+    build_day_index(filepath)
+    return read_index(path)
+
+
+def read_index(path):
+    # Load every array up front so the .npz file is closed again
+    with np.load(path) as index:
+        return {name: index[name] for name in index.files}
+
+
+def read_isd_window(filepath, start_date, end_date, **record_filters):
+    """Decode only the records of an ISD file between two dates (inclusive) via the day index.
+
+    The file is memory-mapped and only the byte range covering the requested days is
+    decoded; the mapping is released before returning. Extra keyword arguments are passed
+    on to decode_isd_buffer as predicates.
+    """
+    index = load_day_index(filepath)
+    buf = map_isd_file(filepath)
+
+    if bool(index["ordered"]):
+        dates, offsets = index["dates"], index["offsets"]
+        lo = np.searchsorted(dates, date_key(start_date), side="left")
+        hi = np.searchsorted(dates, date_key(end_date), side="right")
+        begin = int(offsets[lo]) if lo < len(offsets) else buf.size
+        end = int(offsets[hi]) if hi < len(offsets) else buf.size
+        buf = buf[begin:end]
+
+    # The decoded columns are copies, so dropping the (sliced) view unmaps the file
+    records = decode_isd_buffer(buf, start_date=start_date, end_date=end_date, **record_filters)
+    del buf
+    return records
+
+
+if __name__ == "__main__":
+    # Build day indexes for every uncompressed ISD file in the given directories
+    for directory in sys.argv[1:]:
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(INDEX_SUFFIX) or filename.endswith(".gz"):
+                continue
+            print(f"Indexed {build_day_index(os.path.join(directory, filename))}")
@@ -1,6 +1,4 @@
-import os
 import tarfile
-import shutil
 import boto3
 from pathlib import Path
 
@@ -13,42 +11,22 @@ s3_directory = 'isd'
 # Initialize S3 client
 s3_client = boto3.client('s3')
 
-def extract_tar_gz(file_path, extract_to):
-    """Extracts a .tar.gz file to the specified directory."""
-    if tarfile.is_tarfile(file_path):
-        with tarfile.open(file_path, 'r:gz') as tar:
-            print(f"Extracting {file_path} to {extract_to}...")
-            tar.extractall(path=extract_to)
-            print("Extraction complete.")
-    else:
+def upload_archive_members_to_s3(file_path, bucket, s3_prefix):
+    """Streams each member of a .tar.gz straight to S3 without extracting it to local disk."""
+    if not tarfile.is_tarfile(file_path):
         print(f"{file_path} is not a valid .tar.gz file.")
+        return
 
-def upload_directory_to_s3(directory, bucket, s3_prefix):
-    """Uploads all files in a directory to an S3 bucket with a specified prefix."""
-    for root, _, files in os.walk(directory):
-        for file in files:
-            file_path = Path(root) / file
-            s3_key = f"{s3_prefix}/{file_path.relative_to(directory)}"
-            print(f"Uploading {file_path} to s3://{bucket}/{s3_key}...")
-            s3_client.upload_file(str(file_path), bucket, s3_key)
-            print(f"Uploaded {file_path} to {s3_key}")
+    with tarfile.open(file_path, 'r|gz') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            s3_key = f"{s3_prefix}/{member.name}"
+            print(f"Uploading {member.name} to s3://{bucket}/{s3_key}...")
+            s3_client.upload_fileobj(tar.extractfile(member), bucket, s3_key)
+            print(f"Uploaded {member.name} to {s3_key}")
 
-def cleanup_local_files(directory):
-    """Deletes a specified directory and its contents."""
-    try:
-        shutil.rmtree(directory)
-        print(f"Cleaned up local files in {directory}")
-    except Exception as e:
-        print(f"Failed to delete {directory}: {e}")
+# Stream the archive members to S3; nothing is extracted to a temporary directory
+upload_archive_members_to_s3(archive_file, bucket_name, s3_directory)
 
-# Step 1: Extract the .tar.gz file
-extract_dir = download_dir / 'isd_2023'  # Temporary extraction directory
-extract_tar_gz(archive_file, extract_dir)
-
-# Step 2: Upload extracted files to S3
-upload_directory_to_s3(extract_dir, bucket_name, s3_directory)
-
-# Step 3: Clean up extracted files from local storage
-cleanup_local_files(extract_dir)
-
-print("All files uploaded and local cleanup complete.")
+print("All archive members uploaded.")
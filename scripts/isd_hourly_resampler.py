@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+ONE_HOUR = pd.Timedelta(hours=1)
+
+# Report types in order of preference when a station has several reports for one hour;
+# unlisted types rank after all of these
+DEFAULT_REPORT_PRIORITY = ("FM-15", "FM-16", "AUTO", "SAO", "SY-MT", "FM-12", "SY-SA", "SY-AE", "FM-13")
+
+
+def observation_times(date, time):
+    """Vectorized timestamps from ISD "YYYYMMDD" dates and "HHMM" times (unpadded times accepted)."""
+    date = pd.Series(date).astype(str).str[:8]
+    time = pd.Series(time).astype(str).str.zfill(4)
+    return pd.to_datetime(date.values + time.values, format="%Y%m%d%H%M", errors="coerce")
+
+
+def frame_observation_times(df):
+    """Observation timestamps of a frame: its `obs_time` column (columnar cache) or parsed date/time."""
+    if "obs_time" in df.columns:
+        times = pd.DatetimeIndex(df["obs_time"])
+    else:
+        times = observation_times(df["date"], df["time"])
+    return times.as_unit("ns")  # One resolution for cached and parsed times so merges line up
+
+
+def hour_grid(bounds, key):
+    """Expand per-station (first, last) hours into a dense station x hour frame without Python loops."""
+    counts = ((bounds["last"] - bounds["first"]) // ONE_HOUR).astype(np.int64).to_numpy() + 1
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    steps = np.arange(counts.sum()) - starts
+    return pd.DataFrame({
+        key: np.repeat(bounds.index.to_numpy(), counts),
+        "hour_time": np.repeat(bounds["first"].to_numpy(), counts) + steps * ONE_HOUR.to_timedelta64()
+    })
+
+
+def resample_station_hours(df, value_columns, method="nearest", tolerance_minutes=30,
+                           key="station_id", start=None, end=None):
+    """Resample irregular ISD observations onto an exact top-of-hour grid per station.
+
+    `method="nearest"` takes the observation closest to each top of the hour within
+    `tolerance_minutes`; `method="linear"` interpolates between the nearest earlier and later
+    observations inside the tolerance (an exact match is used as is). Each station gets every
+    hour from its first to its last observation, or from `start` to `end` when given; hours
+    without usable observations are NaN. Returns key, hour_time, date ("YYYYMMDD"),
+    time ("HH00"), hour (0-23), year and the value columns.
+    """
+    if method not in ("nearest", "linear"):
+        raise ValueError(f"Unknown resampling method: {method}")
+
+    obs = df[[key] + value_columns].copy()
+    obs["obs_time"] = frame_observation_times(df)
+    obs = obs.dropna(subset=["obs_time"]).sort_values("obs_time", kind="stable")
+
+    if obs.empty:
+        return pd.DataFrame(columns=[key, "hour_time", "date", "time", "hour", "year"] + value_columns)
+
+    bounds = obs.groupby(key)["obs_time"].agg(first="min", last="max")
+    bounds["first"] = bounds["first"].dt.floor("h") if start is None else pd.Timestamp(start).as_unit("ns")
+    bounds["last"] = bounds["last"].dt.ceil("h") if end is None else pd.Timestamp(end).as_unit("ns")
+    bounds = bounds[bounds["last"] >= bounds["first"]]
+    grid = hour_grid(bounds, key).sort_values("hour_time", kind="stable")
+
+    tolerance = pd.Timedelta(minutes=tolerance_minutes)
+    asof = dict(left_on="hour_time", right_on="obs_time", by=key, tolerance=tolerance)
+
+    if method == "nearest":
+        hourly = pd.merge_asof(grid, obs, direction="nearest", **asof)
+    else:
+        before = pd.merge_asof(grid, obs, direction="backward", **asof)
+        after = pd.merge_asof(grid, obs, direction="forward", **asof)
+        hourly = before[[key, "hour_time"]].copy()
+
+        # Weight of the later observation; one-sided or exact matches fall back to that observation
+        span = (after["obs_time"] - before["obs_time"]) / ONE_HOUR
+        weight = ((hourly["hour_time"] - before["obs_time"]) / ONE_HOUR / span).where(span > 0, 0.0)
+        for col in value_columns:
+            interpolated = before[col] + (after[col] - before[col]) * weight
+            hourly[col] = interpolated.fillna(before[col].where(after["obs_time"].isna()))
+            hourly[col] = hourly[col].fillna(after[col].where(before["obs_time"].isna()))
+
+    hourly = hourly.sort_values([key, "hour_time"], kind="stable").reset_index(drop=True)
+    hourly["date"] = hourly["hour_time"].dt.strftime("%Y%m%d")
+    hourly["time"] = hourly["hour_time"].dt.strftime("%H00")
+    hourly["hour"] = hourly["hour_time"].dt.hour
+    hourly["year"] = hourly["hour_time"].dt.strftime("%Y")
+    return hourly[[key, "hour_time", "date", "time", "hour", "year"] + value_columns]
+
+
+def deduplicate_station_hours(df, priority=DEFAULT_REPORT_PRIORITY, key="station_id"):
+    """Keep one report per station and nearest hour (half past rounds up), chosen by report-type priority.
+
+    Ties within the same report type go to the observation closest to the top of the hour.
+    Implemented as one sort plus a first-occurrence pass; rows keep their original order.
+    """
+    if df.empty or "report_type" not in df.columns:
+        return df
+
+    times = frame_observation_times(df)
+    # Half past goes to the next hour; round("h") would send it to the even hour (01:30 -> 02, 02:30 -> 02)
+    hour_time = (times + ONE_HOUR / 2).floor("h")
+    ranks = {report_type: rank for rank, report_type in enumerate(priority)}
+    order = pd.DataFrame({
+        "key": df[key].to_numpy(),
+        "hour_time": hour_time,
+        "rank": df["report_type"].astype(str).str.strip().map(ranks).fillna(len(priority)).to_numpy(),
+        "distance": np.abs((times - hour_time).to_numpy())
+    }).sort_values(["key", "hour_time", "rank", "distance"], kind="stable")
+
+    # Rows with unparseable times are kept as they are rather than collapsed together
+    first = ~order.duplicated(subset=["key", "hour_time"]) | order["hour_time"].isna()
+    keep = np.sort(order.index[first].to_numpy())
+    return df.iloc[keep]
+
+
+def iter_station_complete_chunks(chunks, key="station_id"):
+    """Re-cut a chunked reader so no station is split across chunks.
+
+    The rows of the last station in each chunk are held back and prepended to the next one,
+    which keeps per-station resampling consistent at chunk boundaries for station-contiguous
+    inputs such as the sharded yearly CSVs.
+    """
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        is_last = chunk[key] == chunk[key].iloc[-1]
+        carry = chunk[is_last]
+        if (~is_last).any():
+            yield chunk[~is_last]
+    if carry is not None and not carry.empty:
+        yield carry
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from isd_hourly_resampler import frame_observation_times
+
+# Histogram bin width per variable. ISD measurements are reported in tenths, so 0.1 bins
+# make the sketch exact for them; derived values such as relative humidity are within half a bin.
+DEFAULT_BIN_WIDTH = 0.1
+
+
+def new_quantile_sketch(columns, bin_width=DEFAULT_BIN_WIDTH, key="station_id"):
+    """Empty mergeable histogram sketch per (station, month, variable)."""
+    return {"columns": list(columns), "bin_width": bin_width, "key": key, "counts": {}}
+
+
+def update_quantile_sketch(sketch, chunk):
+    """Add a chunk's observations to the sketch; the result does not depend on chunk boundaries."""
+    if chunk.empty:
+        return sketch
+
+    month = frame_observation_times(chunk).month.to_numpy(dtype=np.float64)
+    for column in sketch["columns"]:
+        if column not in chunk.columns:
+            continue
+        values = chunk[column].to_numpy(dtype=np.float64)
+        ok = ~np.isnan(values) & ~np.isnan(month)
+        if not ok.any():
+            continue
+
+        # Count observations per (station, month, value bin) and merge them into the running counts
+        bins = np.round(values[ok] / sketch["bin_width"]).astype(np.int64)
+        counts = pd.DataFrame({
+            "key": chunk[sketch["key"]].to_numpy()[ok],
+            "month": month[ok].astype(np.int8),
+            "bin": bins
+        }).value_counts()
+        previous = sketch["counts"].get(column)
+        sketch["counts"][column] = counts if previous is None else previous.add(counts, fill_value=0)
+    return sketch
+
+
+def sketch_quantiles(sketch, q=0.5):
+    """Quantile `q` per (station, month) for every sketched variable, as a frame indexed by key and month."""
+    results = []
+    for column in sketch["columns"]:
+        counts = sketch["counts"].get(column)
+        if counts is None or counts.empty:
+            continue
+
+        counts = counts.sort_index()
+        groups = counts.index.droplevel("bin")
+        cumulative = counts.groupby(level=["key", "month"]).cumsum()
+        total = counts.groupby(level=["key", "month"]).transform("sum")
+
+        # Lower and upper order statistics around the quantile position, averaged like a median
+        position = q * (total - 1)
+        lower = cumulative > np.floor(position)
+        upper = cumulative > np.ceil(position)
+        bins = counts.index.get_level_values("bin").to_numpy()
+        lower_bin = pd.Series(np.where(lower, bins, np.iinfo(np.int64).max), index=groups).groupby(level=[0, 1]).min()
+        upper_bin = pd.Series(np.where(upper, bins, np.iinfo(np.int64).max), index=groups).groupby(level=[0, 1]).min()
+        results.append(((lower_bin + upper_bin) / 2 * sketch["bin_width"]).rename(column))
+
+    if not results:
+        return pd.DataFrame(columns=sketch["columns"])
+    return pd.concat(results, axis=1)
+
+
+def empty_run_lengths(chunk, columns, key="station_id"):
+    """Length of the run of consecutive hours with none of `columns` that each row is in (0 for rows with a value).
+
+    Expects resampled rows: sorted by station and hour, one row per hour.
+    """
+    empty = chunk[columns].isna().all(axis=1).to_numpy()
+    keys = chunk[key].to_numpy()
+    starts = np.concatenate(([True], (empty[1:] != empty[:-1]) | (keys[1:] != keys[:-1])))
+    run = np.cumsum(starts) - 1
+    return np.where(empty, np.bincount(run)[run], 0)
+
+
+def impute_from_quantiles(chunk, quantiles, key="station_id", time_column="hour_time", max_gap_hours=None):
+    """Fill missing values from the per-(station, month) quantiles in one vectorized lookup.
+
+    With `max_gap_hours`, only hours that had an observation (with some fields missing) and
+    runs of at most that many empty hours are filled; longer outages on a resampled grid
+    stay missing instead of becoming a flat line at the station's monthly quantile.
+    """
+    if chunk.empty or quantiles.empty:
+        return chunk
+
+    columns = [column for column in quantiles.columns if column in chunk.columns]
+    month = pd.DatetimeIndex(chunk[time_column]).month
+    lookup = pd.MultiIndex.from_arrays([chunk[key].to_numpy(), month.fillna(0).astype(np.int8)])
+    fills = quantiles.reindex(lookup)
+    if max_gap_hours is not None:
+        fills[empty_run_lengths(chunk, columns, key) > max_gap_hours] = np.nan
+    chunk = chunk.copy()
+    for column in columns:
+        chunk[column] = chunk[column].fillna(pd.Series(fills[column].to_numpy(), index=chunk.index))
+    return chunk
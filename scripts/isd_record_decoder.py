@@ -0,0 +1,333 @@
+import gzip
+import os
+import tarfile
+import numpy as np
+import pandas as pd
+
+# Fixed-width positions of the ISD control and mandatory data sections (0-based, end-exclusive)
+STATION_SPEC = (4, 15)  # USAF ID (4-10) followed by WBAN ID (10-15)
+DATE_SPEC = (15, 23)    # Observation date YYYYMMDD
+TIME_SPEC = (23, 27)    # Observation time HHMM
+REPORT_TYPE_SPEC = (41, 46)  # Report type code, e.g. "FM-15" (METAR), "FM-16" (SPECI), "SY-MT"
+
+# Numeric mandatory fields: (start, end, scale factor, missing value sentinel)
+MANDATORY_FIELDS = {
+    "wind_speed": (65, 69, 10.0, 9999),          # Wind speed (tenths of m/s)
+    "temperature": (87, 92, 10.0, 9999),         # Air temperature (tenths of degrees Celsius)
+    "dew_point": (93, 98, 10.0, 9999),           # Dew point temperature (tenths of degrees Celsius)
+    "sea_level_pressure": (99, 104, 10.0, 99999) # Sea level pressure (tenths of hPa)
+}
+
+# Length of the control plus mandatory data sections; shorter lines are malformed
+MANDATORY_LENGTH = 105
+
+# Offsets of the quality codes that can be filtered on before decoding
+QUALITY_OFFSETS = {
+    "temp_quality": 92,
+    "pressure_quality": 104
+}
+
+# Output column order for the control/mandatory fields, matching the extraction script's CSV layout
+OUTPUT_COLUMNS = [
+    "date", "time", "station_id", "report_type", "temperature", "dew_point", "relative_humidity",
+    "temp_quality", "wind_speed", "sea_level_pressure", "pressure_quality"
+]
+
+# Additional-data sections, one entry per identifier: fields in layout order as
+# (column, width, scale, missing value). Numeric fields have a scale; code fields use
+# scale None and are kept as single-character strings.
+def _precipitation_fields(suffix):
+    return [
+        (f"precip_period_hours{suffix}", 2, 1.0, 99),     # Period quantity (hours)
+        (f"precip_depth_mm{suffix}", 4, 10.0, 9999),      # Depth (mm, scaled by 10)
+        (f"precip_condition{suffix}", 1, None, "9"),      # Condition code
+        (f"precip_quality{suffix}", 1, None, None)        # Quality code
+    ]
+
+ADDITIONAL_SECTIONS = {
+    "AA1": _precipitation_fields(""),
+    "AA2": _precipitation_fields("_2"),
+    "AA3": _precipitation_fields("_3"),
+    "AA4": _precipitation_fields("_4"),
+    "GA1": [                                              # Sky cover layer
+        ("sky_cover_code", 2, 1.0, 99),
+        ("sky_cover_quality", 1, None, None),
+        ("cloud_base_height_m", 6, 1.0, 99999),
+        ("cloud_base_height_quality", 1, None, None),
+        ("cloud_type_code", 2, 1.0, 99),
+        ("cloud_type_quality", 1, None, None)
+    ],
+    "MA1": [                                              # Atmospheric pressure observation
+        ("altimeter_setting", 5, 10.0, 99999),
+        ("altimeter_quality", 1, None, None),
+        ("station_pressure", 5, 10.0, 99999),
+        ("station_pressure_quality", 1, None, None)
+    ],
+    "OC1": [                                              # Wind gust observation
+        ("wind_gust_speed", 4, 10.0, 9999),
+        ("wind_gust_quality", 1, None, None)
+    ],
+    "AJ1": [                                              # Snow depth
+        ("snow_depth_cm", 4, 1.0, 9999),
+        ("snow_depth_condition", 1, None, "9"),
+        ("snow_depth_quality", 1, None, None),
+        ("snow_water_equivalent_mm", 6, 10.0, 999999),
+        ("snow_water_equivalent_condition", 1, None, "9"),
+        ("snow_water_equivalent_quality", 1, None, None)
+    ]
+}
+
+# Sections decoded when the caller does not ask for any
+DEFAULT_SECTIONS = ("AA1",)
+
+NEWLINE = ord("\n")
+
+
+def read_isd_buffer(filepath):
+    """Read an ISD station-year file (plain or gzipped) into a uint8 byte buffer."""
+    opener = gzip.open if str(filepath).endswith(".gz") else open
+    with opener(filepath, "rb") as file:
+        return np.frombuffer(file.read(), dtype=np.uint8)
+
+
+def isd_bytes_to_buffer(raw, name=""):
+    """Gunzip an in-memory ISD member (when gzipped) and view it as a uint8 byte buffer."""
+    if name.endswith(".gz") or raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    return np.frombuffer(raw, dtype=np.uint8)
+
+
+def iter_isd_tar_members(archive_path, station_prefixes=None):
+    """Stream (filename, raw bytes) for each station-year member of an ISD yearly tar.gz.
+
+    The archive is read sequentially without extracting anything to disk. Members whose
+    filename does not start with one of `station_prefixes` (e.g. "722950-23174") are
+    skipped before their bytes are read or decompressed.
+    """
+    prefixes = tuple(station_prefixes) if station_prefixes is not None else None
+    with tarfile.open(archive_path, "r|gz") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = os.path.basename(member.name)
+            if prefixes is not None and not name.startswith(prefixes):
+                continue
+            yield name, tar.extractfile(member).read()
+
+
+def record_bounds(buf):
+    """Return start and end offsets of every record long enough to hold the mandatory section."""
+    if buf.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    newlines = np.flatnonzero(buf == NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [buf.size]))
+
+    # Drop trailing carriage returns so ends always point just past the last data byte
+    has_cr = (ends > starts) & (buf[np.maximum(ends - 1, 0)] == ord("\r"))
+    ends = ends - has_cr
+
+    keep = (ends - starts) >= MANDATORY_LENGTH
+    return starts[keep], ends[keep]
+
+
+def field_matrix(buf, starts, start, end):
+    """Gather the bytes at [start, end) of every record into an (n_records, width) matrix."""
+    return buf[starts[:, None] + np.arange(start, end)]
+
+
+def parse_int_field(field):
+    """Convert a signed ASCII digit matrix to int64 values plus a mask of well-formed rows."""
+    first = field[:, 0]
+    has_sign = (first == ord("+")) | (first == ord("-"))
+    digits = field.astype(np.int64) - ord("0")
+    digits[:, 0] = np.where(has_sign, 0, digits[:, 0])
+
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    powers = 10 ** np.arange(field.shape[1] - 1, -1, -1, dtype=np.int64)
+    values = (np.where(valid[:, None], digits, 0) @ powers) * np.where(first == ord("-"), -1, 1)
+    return values, valid
+
+
+def scaled_field(buf, starts, spec):
+    """Decode a numeric fixed-width field to float64, masking malformed and missing values."""
+    start, end, scale, missing = spec
+    values, valid = parse_int_field(field_matrix(buf, starts, start, end))
+    valid &= np.abs(values) != missing
+    return np.where(valid, values / scale, np.nan)
+
+
+def field_strings(matrix):
+    """View an ASCII byte matrix as one Python string per row."""
+    matrix = np.ascontiguousarray(matrix)
+    return matrix.view(f"S{matrix.shape[1]}").ravel().astype(str)
+
+
+def station_id_strings(buf, starts):
+    """Build combined "USAF-WBAN" station IDs straight from the raw bytes."""
+    ids = field_matrix(buf, starts, *STATION_SPEC)
+    dash = np.full((len(starts), 1), ord("-"), dtype=np.uint8)
+    return field_strings(np.hstack((ids[:, :6], dash, ids[:, 6:])))
+
+
+def section_length(tag):
+    """Total length of an additional-data section, identifier included."""
+    return 3 + sum(width for _, width, _, _ in ADDITIONAL_SECTIONS[tag])
+
+
+def find_sections(buf, starts, ends, tags):
+    """Locate each requested section identifier in every record's additional data section.
+
+    All identifiers are found with one vectorized scan of the buffer. Returns a dict of
+    tag -> offset per record, or -1 where the section is absent or truncated. The search
+    stops at the remarks section so free text cannot match.
+    """
+    positions = {tag: np.full(len(starts), -1, dtype=np.int64) for tag in tags}
+    if len(starts) == 0 or buf.size < 3:
+        return positions
+
+    # Pack every 3-byte window into one integer and match it against all identifiers at once
+    windows = (buf[:-2].astype(np.uint32) << 16) | (buf[1:-1].astype(np.uint32) << 8) | buf[2:]
+    tag_codes = {tag: (ord(tag[0]) << 16) | (ord(tag[1]) << 8) | ord(tag[2]) for tag in tags}
+    hits = np.flatnonzero(np.isin(windows, list(tag_codes.values())))
+    codes = windows[hits]
+
+    # Assign each hit to its record and keep the ones inside the additional data section
+    record = np.searchsorted(starts, hits, side="right") - 1
+    inside = record >= 0
+    hits, codes, record = hits[inside], codes[inside], record[inside]
+    inside = (hits >= starts[record] + MANDATORY_LENGTH + 3) & (hits < remarks_offsets(buf, starts, ends)[record])
+    hits, codes, record = hits[inside], codes[inside], record[inside]
+
+    for tag, code in tag_codes.items():
+        is_tag = codes == code
+        tag_hits, tag_record = hits[is_tag], record[is_tag]
+        complete = tag_hits + section_length(tag) <= ends[tag_record]
+        tag_hits, tag_record = tag_hits[complete], tag_record[complete]
+        # Keep the first hit per record (hits are sorted, so reversed assignment leaves the first)
+        positions[tag][tag_record[::-1]] = tag_hits[::-1]
+    return positions
+
+
+def remarks_offsets(buf, starts, ends):
+    """Return the offset of the "REM" remarks section per record, or the record end if absent."""
+    offsets = ends.copy()
+    if buf.size < 3:
+        return offsets
+    hits = np.flatnonzero((buf[:-2] == ord("R")) & (buf[1:-1] == ord("E")) & (buf[2:] == ord("M")))
+    record = np.searchsorted(starts, hits, side="right") - 1
+    inside = (record >= 0) & (hits >= starts[np.maximum(record, 0)] + MANDATORY_LENGTH)
+    hits, record = hits[inside], record[inside]
+    inside = hits < ends[record]
+    offsets[record[inside][::-1]] = hits[inside][::-1]
+    return offsets
+
+
+def date_key(date):
+    """Normalize "YYYY-MM-DD" or "YYYYMMDD" to an integer YYYYMMDD for byte-level comparisons."""
+    return int(str(date).replace("-", "")[:8])
+
+
+def record_mask(buf, starts, station_ids=None, start_date=None, end_date=None,
+                temp_quality=None, pressure_quality=None):
+    """Evaluate record predicates on the raw bytes at fixed offsets, before any decoding.
+
+    `station_ids` are "USAF-WBAN" strings, dates are inclusive bounds and the quality
+    arguments are collections of accepted single-character codes. None disables a predicate.
+    """
+    mask = np.ones(len(starts), dtype=bool)
+
+    if station_ids is not None:
+        # Compare the 11 raw USAF+WBAN bytes against the wanted IDs with the dash removed
+        wanted = np.array([sid.replace("-", "").encode("ascii") for sid in station_ids], dtype="S11")
+        raw_ids = np.ascontiguousarray(field_matrix(buf, starts, *STATION_SPEC)).view("S11").ravel()
+        mask &= np.isin(raw_ids, wanted)
+
+    if start_date is not None or end_date is not None:
+        dates, valid = parse_int_field(field_matrix(buf, starts, *DATE_SPEC))
+        mask &= valid
+        if start_date is not None:
+            mask &= dates >= date_key(start_date)
+        if end_date is not None:
+            mask &= dates <= date_key(end_date)
+
+    for name, accepted in (("temp_quality", temp_quality), ("pressure_quality", pressure_quality)):
+        if accepted is not None:
+            codes = np.frombuffer("".join(accepted).encode("ascii"), dtype=np.uint8)
+            mask &= np.isin(buf[starts + QUALITY_OFFSETS[name]], codes)
+
+    return mask
+
+
+def section_columns(sections):
+    """Output column names produced by the requested sections, in table order."""
+    return [column for tag in sections for column, _, _, _ in ADDITIONAL_SECTIONS[tag]]
+
+
+def decode_sections(buf, starts, ends, sections):
+    """Decode the requested additional-data sections into typed columns using the section table."""
+    unknown = set(sections) - set(ADDITIONAL_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unsupported ISD additional-data sections: {sorted(unknown)}")
+
+    positions = find_sections(buf, starts, ends, sections)
+    columns = {}
+    for tag in sections:
+        present = positions[tag] >= 0
+        pos = positions[tag][present]
+        offset = 3
+        for column, width, scale, missing in ADDITIONAL_SECTIONS[tag]:
+            field = buf[pos[:, None] + np.arange(offset, offset + width)]
+            offset += width
+            if scale is None:
+                values = np.full(len(starts), "", dtype=object)
+                codes = field_strings(field) if len(pos) else np.empty(0, dtype=str)
+                values[present] = np.where(codes == missing, "", codes) if missing is not None else codes
+            else:
+                values = np.full(len(starts), np.nan)
+                parsed, valid = parse_int_field(field)
+                valid &= np.abs(parsed) != missing
+                values[present] = np.where(valid, parsed / scale, np.nan)
+            columns[column] = values
+    return columns
+
+
+def relative_humidity(temperature, dew_point):
+    """Relative humidity (%) from air and dew point temperatures in degrees Celsius."""
+    return 100 * (np.exp((17.625 * dew_point) / (dew_point + 243.04)) /
+                  np.exp((17.625 * temperature) / (temperature + 243.04)))
+
+
+def decode_isd_buffer(buf, station_ids=None, start_date=None, end_date=None,
+                      temp_quality=None, pressure_quality=None, sections=DEFAULT_SECTIONS):
+    """Decode the mandatory fields and requested additional-data sections of an ISD buffer into one typed frame.
+
+    Station, date-window and quality predicates are applied to the raw bytes first, so only
+    the surviving records are decoded. `sections` lists ADDITIONAL_SECTIONS identifiers.
+    """
+    columns = OUTPUT_COLUMNS + section_columns(sections)
+    starts, ends = record_bounds(buf)
+
+    keep = record_mask(buf, starts, station_ids, start_date, end_date, temp_quality, pressure_quality)
+    starts, ends = starts[keep], ends[keep]
+
+    if len(starts) == 0:
+        return pd.DataFrame(columns=columns)
+
+    data = {
+        "date": field_strings(field_matrix(buf, starts, *DATE_SPEC)),
+        "time": field_strings(field_matrix(buf, starts, *TIME_SPEC)),
+        "station_id": station_id_strings(buf, starts),
+        "report_type": np.char.strip(field_strings(field_matrix(buf, starts, *REPORT_TYPE_SPEC))),
+    }
+    for name, spec in MANDATORY_FIELDS.items():
+        data[name] = scaled_field(buf, starts, spec)
+    for name, offset in QUALITY_OFFSETS.items():
+        data[name] = field_strings(field_matrix(buf, starts, offset, offset + 1))
+
+    data["relative_humidity"] = relative_humidity(data["temperature"], data["dew_point"])
+    data.update(decode_sections(buf, starts, ends, sections))
+
+    return pd.DataFrame(data, columns=columns)
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+ONE_HOUR = pd.Timedelta(hours=1)
+
+
+def hours_in_year(year):
+    start = pd.Timestamp(year=int(year), month=1, day=1)
+    return int((start + pd.DateOffset(years=1) - start) / ONE_HOUR)
+
+
+# Climate normals are keyed by (month, day, hour) rather than a date. Their slots are laid out on
+# a leap year so Feb 29 has one, with 25 hours per day so both 0-23 and 1-24 hour numbering fit.
+NORMALS_YEAR = 2000
+NORMALS_HOURS_PER_DAY = 25
+
+
+def new_region_slot_accumulator(weights, columns, n_slots):
+    """Running weighted-sum/weight arrays for every (column, region, time slot) cell.
+
+    `weights` is a station x region matrix from station_region_weights. Memory is fixed at
+    len(columns) x len(regions) x n_slots cells regardless of input size.
+    """
+    shape = (len(columns), len(weights["regions"]), n_slots)
+    return {
+        "weights": weights,
+        "transposed": weights["matrix"].T.tocsr(),  # region x station, reused for every block
+        "columns": list(columns),
+        "n_slots": n_slots,
+        "sums": np.zeros(shape, dtype=np.float64),
+        "weight_sums": np.zeros(shape, dtype=np.float64),
+        "dropped": 0
+    }
+
+
+def new_region_hour_accumulator(year, weights, columns):
+    """Slot accumulator over the hours of one year (at most 8784 slots)."""
+    acc = new_region_slot_accumulator(weights, columns, hours_in_year(year))
+    acc["year"] = int(year)
+    return acc
+
+
+def new_normals_hour_accumulator(weights, columns):
+    """Slot accumulator over the (month, day, hour) cells of a climate-normals year."""
+    return new_region_slot_accumulator(weights, columns, 366 * NORMALS_HOURS_PER_DAY)
+
+
+def accumulate_region_slots(acc, chunk, slot, key="station_id"):
+    """Add a block of station rows, row i falling in time slot slot[i], with one sparse mat-mul per column.
+
+    Only stations that report a value in a slot add their weight to that slot's denominator,
+    so region weights are renormalized over whoever is reporting.
+    """
+    station_idx = chunk[key].map(acc["weights"]["station_index"]).fillna(-1).to_numpy(dtype=np.int64)
+
+    # Rows outside the slots (e.g. rolled over past Dec 31 23:00) or from unweighted stations are not counted
+    in_range = (slot >= 0) & (slot < acc["n_slots"]) & (station_idx >= 0)
+    acc["dropped"] += int((~in_range).sum())
+    shape = (len(acc["weights"]["stations"]), acc["n_slots"])
+
+    for j, column in enumerate(acc["columns"]):
+        if column not in chunk.columns:
+            continue
+        values = chunk[column].to_numpy(dtype=np.float64)
+        ok = in_range & ~np.isnan(values)
+        coords = (station_idx[ok], slot[ok])
+
+        # Station x slot blocks of values and of reporting indicators, mapped onto regions
+        block = sparse.csr_matrix((values[ok], coords), shape=shape)
+        reporting = sparse.csr_matrix((np.ones(ok.sum()), coords), shape=shape)
+        acc["sums"][j] += (acc["transposed"] @ block).toarray()
+        acc["weight_sums"][j] += (acc["transposed"] @ reporting).toarray()
+    return acc
+
+
+def accumulate_region_hours(acc, chunk, time_column="hour_time", key="station_id"):
+    """Add a block of hourly station rows to a year's accumulator (see accumulate_region_slots)."""
+    if chunk.empty:
+        return acc
+
+    year_start = np.datetime64(f"{acc['year']}-01-01T00:00", "ns")
+    hour_of_year = (pd.DatetimeIndex(chunk[time_column]).as_unit("ns").values - year_start) // np.timedelta64(1, "h")
+    return accumulate_region_slots(acc, chunk, hour_of_year, key)
+
+
+def accumulate_normals_hours(acc, chunk, key="station_id"):
+    """Add a block of climate-normals rows (month, day, hour columns) to a normals accumulator."""
+    if chunk.empty:
+        return acc
+
+    dates = pd.to_datetime(pd.DataFrame({"year": NORMALS_YEAR, "month": chunk["month"], "day": chunk["day"]}), errors="coerce")
+    hours = chunk["hour"].to_numpy(dtype=np.int64)
+    slot = (dates.dt.dayofyear.fillna(0).to_numpy(dtype=np.int64) - 1) * NORMALS_HOURS_PER_DAY + hours
+    slot[(hours < 0) | (hours >= NORMALS_HOURS_PER_DAY) | dates.isna().to_numpy()] = -1
+    return accumulate_region_slots(acc, chunk, slot, key)
+
+
+def reported_slot_means(acc):
+    """(region index, slot, column x cell means) of every region and slot with at least one reporting station."""
+    reported = (acc["weight_sums"] > 0).any(axis=0)
+    region_idx, slot = np.nonzero(reported)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = acc["sums"][:, region_idx, slot] / acc["weight_sums"][:, region_idx, slot]
+    return region_idx, slot, means
+
+
+def region_hour_means(acc, region_column="state"):
+    """Weighted hourly region means as a year,date,hour,<region_column> frame."""
+    region_idx, hour_of_year, means = reported_slot_means(acc)
+
+    hour_time = pd.Timestamp(year=acc["year"], month=1, day=1) + pd.to_timedelta(hour_of_year, unit="h")
+    result = pd.DataFrame({
+        "year": acc["year"],
+        "date": hour_time.strftime("%Y%m%d").astype(int),
+        "hour": hour_time.hour,
+        region_column: np.asarray(acc["weights"]["regions"], dtype=object)[region_idx]
+    })
+    for j, column in enumerate(acc["columns"]):
+        result[column] = means[j]
+    return result.sort_values(["date", "hour", region_column], kind="stable").reset_index(drop=True)
+
+
+def normals_hour_means(acc, region_column="state"):
+    """Weighted region means of climate normals as a month,day,hour,<region_column> frame."""
+    region_idx, slot, means = reported_slot_means(acc)
+
+    day = pd.Timestamp(year=NORMALS_YEAR, month=1, day=1) + pd.to_timedelta(slot // NORMALS_HOURS_PER_DAY, unit="D")
+    result = pd.DataFrame({
+        "month": day.month,
+        "day": day.day,
+        "hour": slot % NORMALS_HOURS_PER_DAY,
+        region_column: np.asarray(acc["weights"]["regions"], dtype=object)[region_idx]
+    })
+    for j, column in enumerate(acc["columns"]):
+        result[column] = means[j]
+    return result.sort_values(["month", "day", "hour", region_column], kind="stable").reset_index(drop=True)
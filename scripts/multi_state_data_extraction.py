@@ -1,10 +1,16 @@
 import os
-import requests
-import pandas as pd
+from http_response_cache import open_response_cache
+from eia_client import new_eia_client, fetch_eia_data, stream_eia_data
+from eia_incremental_sync import sync_series, REVISION_LOOKBACK_HOURS
+from api_page_sink import stream_to_parquet, EIA_SUBBA_DATA_SCHEMA
 
 # EIA API Key
 api_key = 'Your_EIA_API_KEY'
 
+# Responses are cached on disk; one pooled, rate-limited client is shared by all subregions
+api_cache = open_response_cache()
+eia_client = new_eia_client(api_key, cache=api_cache)
+
 # Define the subregions to sample (ID and Name)
 subregions = {
     '4001': 'ISNE_Maine',
@@ -40,46 +46,21 @@ subregions = {
     'WAUE' : 'SWPP_Western_Area_Power_Upper_Great_Plains_East'
 }
 
-# Function to retrieve data for a specific subregion with pagination
-def get_hourly_demand_by_subregion(subregion_id, start_date, end_date):
-    url = f"https://api.eia.gov/v2/electricity/rto/region-sub-ba-data/data/?api_key={api_key}"
-    all_data = pd.DataFrame()  # Initialize empty DataFrame to store all pages
-    offset = 0  # Start with the first page
-    length = 5000  # Maximum records per page, as per EIA API
-
-    while True:
-        params = {
-            "frequency": "hourly",
-            "data[0]": "value",
-            "facets[subba][]": subregion_id,
-            "start": start_date,
-            "end": end_date,
-            "sort[0][column]": "period",
-            "sort[0][direction]": "desc",
-            "offset": offset,
-            "length": length
-        }
-
-        # Make the API request
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        # Check for data and handle errors
-        if 'response' in data and 'data' in data['response']:
-            records = data['response']['data']
-            page_df = pd.DataFrame(records)
-            all_data = pd.concat([all_data, page_df], ignore_index=True)
-
-            # If less data was returned than requested, we're done
-            if len(records) < length:
-                break
-            # Otherwise, move to the next page
-            offset += length
-        else:
-            print("Error fetching data for subregion", subregion_id, ":", data.get('error', 'Unknown error'))
-            break
-
-    return all_data
+# Function to retrieve data for a specific subregion, fetching pages concurrently
+# (written to `sink` page by page when one is given, returning the row count)
+def get_hourly_demand_by_subregion(subregion_id, start_date, end_date, sink=None):
+    params = {
+        "frequency": "hourly",
+        "data[0]": "value",
+        "facets[subba][]": subregion_id,
+        "start": start_date,
+        "end": end_date,
+        "sort[0][column]": "period",
+        "sort[0][direction]": "desc",
+    }
+    if sink is not None:
+        return stream_eia_data(eia_client, "electricity/rto/region-sub-ba-data/data/", params, sink, label=subregion_id)
+    return fetch_eia_data(eia_client, "electricity/rto/region-sub-ba-data/data/", params, label=subregion_id)
 
 # Set up date range for 12 months (e.g., 2022)
 start_date = '2022-01-01T00'  # Example start date
@@ -89,20 +70,40 @@ end_date = '2022-12-31T23'    # Example end date
 main_dir = 'dataset'
 os.makedirs(main_dir, exist_ok=True)
 
-# Loop through each subregion, retrieve data, and save to its own directory
-for subregion_id, subregion_name in subregions.items():
-    # Create a subdirectory for each subregion
-    subregion_dir = os.path.join(main_dir, subregion_name)
-    os.makedirs(subregion_dir, exist_ok=True)
-    
-    # Retrieve data for the subregion
-    demand_data = get_hourly_demand_by_subregion(subregion_id, start_date, end_date)
-    
-    # Save to CSV if data was retrieved successfully
-    if not demand_data.empty:
-        filename = f"{subregion_name}_Hourly_Electricity_Demand_{start_date[:4]}.csv"
-        filepath = os.path.join(subregion_dir, filename)
-        demand_data.to_csv(filepath, index=False)
-        print(f"Data for {subregion_name} saved to {filepath}.")
-    else:
-        print(f"No data available for subregion {subregion_name}.")
+# "full" writes start_date-end_date to one CSV per subregion; "incremental" only fetches hours after
+# each subregion's stored watermark (less REVISION_LOOKBACK_HOURS) and upserts them into sync_store_dir
+sync_mode = 'full'
+sync_store_dir = os.path.join(main_dir, 'subba_data_store')
+
+# Full pulls stream each page into <name>_Hourly_Electricity_Demand_<year>.parquet as it arrives
+# instead of collecting the whole range in memory for one CSV; off by default to keep the CSV
+# outputs downstream steps read
+STREAM_TO_PARQUET = False
+
+if sync_mode == 'incremental':
+    for subregion_id in subregions:
+        sync_series(eia_client, 'subba', subregion_id, start_date, sync_store_dir, REVISION_LOOKBACK_HOURS)
+else:
+    # Loop through each subregion, retrieve data, and save to its own directory
+    for subregion_id, subregion_name in subregions.items():
+        # Create a subdirectory for each subregion
+        subregion_dir = os.path.join(main_dir, subregion_name)
+        os.makedirs(subregion_dir, exist_ok=True)
+
+        if STREAM_TO_PARQUET:
+            filepath = os.path.join(subregion_dir, f"{subregion_name}_Hourly_Electricity_Demand_{start_date[:4]}.parquet")
+            rows = stream_to_parquet(filepath, EIA_SUBBA_DATA_SCHEMA, lambda sink: get_hourly_demand_by_subregion(subregion_id, start_date, end_date, sink=sink))
+            print(f"{rows} records for {subregion_name} saved to {filepath}.")
+            continue
+
+        # Retrieve data for the subregion
+        demand_data = get_hourly_demand_by_subregion(subregion_id, start_date, end_date)
+
+        # Save to CSV if data was retrieved successfully
+        if not demand_data.empty:
+            filename = f"{subregion_name}_Hourly_Electricity_Demand_{start_date[:4]}.csv"
+            filepath = os.path.join(subregion_dir, filename)
+            demand_data.to_csv(filepath, index=False)
+            print(f"Data for {subregion_name} saved to {filepath}.")
+        else:
+            print(f"No data available for subregion {subregion_name}.")
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import fcntl
+import heapq
+import itertools
+import threading
+import requests
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+# Rate state shared by every extraction job on this machine; set API_SCHEDULER_STATE to move it
+STATE_FILE = os.environ.get(
+    'API_SCHEDULER_STATE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'research_project_api', 'rate_limits.json')
+)
+
+# Hosts that share one token are limited together; the NOAA CDO API answers on both hostnames
+HOST_BUCKETS = {
+    'www.ncei.noaa.gov': 'noaa-cdo',
+    'www.ncdc.noaa.gov': 'noaa-cdo',
+    'api.eia.gov': 'eia',
+}
+# Requests per second, burst size and requests per UTC day (None for no daily quota) per bucket
+BUCKET_LIMITS = {
+    'noaa-cdo': {'rate': 5.0, 'burst': 5, 'daily_quota': 10000},
+    'eia': {'rate': 5.0, 'burst': 10, 'daily_quota': None},
+}
+
+# Lower values are served first when requests of one process queue for the same bucket
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+MAX_PENDING = 64  # Requests queued per bucket before callers block (backpressure)
+MAX_RATE_LIMITED_RETRIES = 3  # 429s re-queued before the response is returned to the caller
+DEFAULT_RETRY_AFTER = 30
+
+
+class DailyQuotaExceeded(requests.exceptions.RequestException):
+    """The bucket's daily request quota is used up; raised instead of sending a request that would fail."""
+
+
+def open_request_scheduler(state_file=STATE_FILE, limits=None, max_pending=MAX_PENDING):
+    """Scheduler for this process; token buckets and daily counts are shared with other processes via `state_file`."""
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    return {
+        'state_file': state_file,
+        'limits': limits or BUCKET_LIMITS,
+        'max_pending': max_pending,
+        'queues': {},  # bucket -> heap of (priority, sequence) tickets
+        'counter': itertools.count(),
+        'condition': threading.Condition(),
+    }
+
+
+def request_bucket(url):
+    return HOST_BUCKETS.get(urlparse(url).hostname)
+
+
+def update_bucket_state(scheduler, bucket, update):
+    """Apply `update(state, limits, now)` to a bucket's persisted state under an exclusive file lock."""
+    limits = scheduler['limits'][bucket]
+    with open(f"{scheduler['state_file']}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(scheduler['state_file']) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state = {}
+
+        now = time.time()
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        bucket_state = state.setdefault(bucket, {'tokens': limits['burst'], 'updated': now, 'day': today, 'used': 0, 'blocked_until': 0})
+        if bucket_state['day'] != today:
+            bucket_state.update(day=today, used=0)
+        bucket_state['tokens'] = min(limits['burst'], bucket_state['tokens'] + (now - bucket_state['updated']) * limits['rate'])
+        bucket_state['updated'] = now
+
+        result = update(bucket_state, limits, now)
+        with open(f"{scheduler['state_file']}.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{scheduler['state_file']}.tmp", scheduler['state_file'])
+        return result
+
+
+def take_token(scheduler, bucket):
+    """Consume one request from the bucket; returns 0, or the seconds to wait before trying again."""
+    def take(state, limits, now):
+        if limits['daily_quota'] is not None and state['used'] >= limits['daily_quota']:
+            raise DailyQuotaExceeded(f"Daily quota of {limits['daily_quota']} {bucket} requests used up")
+        if now < state['blocked_until']:
+            return state['blocked_until'] - now
+        if state['tokens'] < 1:
+            return (1 - state['tokens']) / limits['rate']
+        state['tokens'] -= 1
+        state['used'] += 1
+        return 0
+    return update_bucket_state(scheduler, bucket, take)
+
+
+def block_bucket(scheduler, bucket, seconds):
+    """Hold back every process's requests to the bucket, e.g. after a 429 with Retry-After."""
+    def block(state, limits, now):
+        state['blocked_until'] = max(state['blocked_until'], now + seconds)
+        state['tokens'] = 0
+    update_bucket_state(scheduler, bucket, block)
+
+
+def remaining_quota(scheduler, url_or_bucket):
+    """Requests left today for a bucket (or the bucket of a URL); None when it has no daily quota."""
+    bucket = request_bucket(url_or_bucket) or url_or_bucket
+    if bucket not in scheduler['limits'] or scheduler['limits'][bucket]['daily_quota'] is None:
+        return None
+    return update_bucket_state(scheduler, bucket, lambda state, limits, now: limits['daily_quota'] - state['used'])
+
+
+def acquire(scheduler, url, priority=PRIORITY_NORMAL):
+    """Block until a request to `url` may be sent.
+
+    Callers queue per bucket in priority order (FIFO within a priority); the head of the queue
+    takes tokens from the shared bucket. Once max_pending requests are queued for a bucket,
+    further callers wait before joining the queue. Hosts without a bucket pass straight through.
+    """
+    bucket = request_bucket(url)
+    if bucket is None:
+        return
+
+    condition = scheduler['condition']
+    with condition:
+        queue = scheduler['queues'].setdefault(bucket, [])
+        while len(queue) >= scheduler['max_pending']:
+            condition.wait()
+        ticket = (priority, next(scheduler['counter']))
+        heapq.heappush(queue, ticket)
+        try:
+            while True:
+                if queue[0] != ticket:
+                    condition.wait()
+                    continue
+                wait = take_token(scheduler, bucket)
+                if wait == 0:
+                    return
+                condition.wait(timeout=wait)
+        finally:
+            queue.remove(ticket)
+            heapq.heapify(queue)
+            condition.notify_all()
+
+
+def scheduled_get(scheduler, url, priority=PRIORITY_NORMAL, session=None, **kwargs):
+    """GET `url` once the scheduler allows it; 429 responses block the bucket for Retry-After and are re-queued."""
+    for attempt in range(MAX_RATE_LIMITED_RETRIES + 1):
+        acquire(scheduler, url, priority)
+        response = (session or requests).get(url, **kwargs)
+        bucket = request_bucket(url)
+        if response.status_code != 429 or bucket is None or attempt == MAX_RATE_LIMITED_RETRIES:
+            return response
+        retry_after = response.headers.get('Retry-After', '')
+        block_bucket(scheduler, bucket, float(retry_after) if retry_after.isdigit() else DEFAULT_RETRY_AFTER)
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from station_gap_imputer import GAP_TOO_LONG
+
+EARTH_RADIUS_KM = 6371.0
+
+# `<column>_imputed` flag for values filled from neighbouring stations (station_gap_imputer uses 0-2)
+NEIGHBOUR_FILLED = 3
+
+
+def load_station_coordinates(path):
+    """Station coordinates from cleaned_ghcn_stations.txt ("ID LAT LON ELEV STATE NAME") or a CSV.
+
+    CSVs need station_id, latitude and longitude columns (e.g. high_coverage_tobs_stations.csv);
+    COOP:/GHCND: prefixes are stripped from their IDs.
+    """
+    if str(path).endswith(".csv"):
+        coords = pd.read_csv(path, usecols=["station_id", "latitude", "longitude"])
+        coords["station_id"] = coords["station_id"].astype(str).str.split(":").str[-1]
+    else:
+        coords = pd.read_csv(path, sep=r"\s+", usecols=[0, 1, 2], names=["station_id", "latitude", "longitude"])
+    return coords.dropna().drop_duplicates(subset="station_id").reset_index(drop=True)
+
+
+def station_xyz(latitude, longitude):
+    """Project lat/lon onto 3-D points on the Earth's sphere (km); chord distance orders like great-circle."""
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    return EARTH_RADIUS_KM * np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def build_station_tree(coords):
+    """Build the KD-tree over all station coordinates once."""
+    xyz = station_xyz(coords["latitude"].to_numpy(), coords["longitude"].to_numpy())
+    return {
+        "tree": cKDTree(xyz),
+        "xyz": xyz,
+        "station_index": {station: i for i, station in enumerate(coords["station_id"])}
+    }
+
+
+def spatial_impute(frame, column, station_tree, k=4, max_distance_km=150.0, power=2.0, oversample=4,
+                   key="station_id", time_column="date", climatology=None):
+    """Fill missing `column` values from the k nearest stations that reported the same day.
+
+    Each station's anomaly is its value minus its own monthly mean, taken from `frame` or from
+    `climatology` (a Series indexed by station and month, e.g. computed over more data than
+    one block of days); a missing value becomes the station's monthly mean plus the
+    inverse-distance-weighted anomaly of its neighbours. Targets are queried against the tree
+    in one vectorized batch per day, with `oversample` x k candidates so that non-reporting
+    neighbours can be skipped. Returns (values, filled mask); values without a usable
+    neighbour stay missing.
+    """
+    values = frame[column].to_numpy(dtype=np.float64)
+    filled = np.zeros(len(values), dtype=bool)
+    if len(values) == 0:
+        return values, filled
+
+    n_stations = len(station_tree["xyz"])
+    station_idx = frame[key].map(station_tree["station_index"]).fillna(-1).to_numpy(dtype=np.int64)
+    dates = pd.DatetimeIndex(frame[time_column])
+    if climatology is None:
+        climatology = frame[column].groupby([frame[key], dates.month]).transform("mean").to_numpy(dtype=np.float64)
+    else:
+        climatology = climatology.reindex(pd.MultiIndex.from_arrays([frame[key].to_numpy(), dates.month])).to_numpy(dtype=np.float64)
+    anomaly = values - climatology
+
+    targets = np.isnan(values) & (station_idx >= 0) & ~np.isnan(climatology)
+    reporting = ~np.isnan(anomaly) & (station_idx >= 0)
+    day_codes, _ = pd.factorize(dates.normalize())
+    k_query = min(k * oversample, n_stations)
+
+    # Rows grouped by day once, so each day's batch is a slice rather than a full scan
+    order = np.argsort(day_codes, kind="stable")
+    bounds = np.searchsorted(day_codes[order], np.arange(day_codes.max() + 2))
+
+    values = values.copy()
+    for day in np.unique(day_codes[targets]):
+        day_rows = order[bounds[day]:bounds[day + 1]]
+        day_targets = day_rows[targets[day_rows]]
+        day_reporting = day_rows[reporting[day_rows]]
+
+        # Anomaly of every station that reported this day; index n_stations is the tree's "no neighbour"
+        lookup = np.full(n_stations + 1, np.nan)
+        lookup[station_idx[day_reporting]] = anomaly[day_reporting]
+
+        distances, neighbours = station_tree["tree"].query(
+            station_tree["xyz"][station_idx[day_targets]], k=k_query, distance_upper_bound=max_distance_km
+        )
+        distances, neighbours = distances.reshape(len(day_targets), -1), neighbours.reshape(len(day_targets), -1)
+        neighbour_anomaly = lookup[neighbours]
+
+        # Keep the k closest neighbours that reported
+        usable = ~np.isnan(neighbour_anomaly)
+        usable &= np.cumsum(usable, axis=1) <= k
+        weights = np.where(usable, np.maximum(distances, 1.0) ** -power, 0.0)
+        total = weights.sum(axis=1)
+        ok = total > 0
+
+        weighted = (weights * np.where(usable, neighbour_anomaly, 0.0)).sum(axis=1)
+        rows = day_targets[ok]
+        values[rows] = climatology[rows] + weighted[ok] / total[ok]
+        filled[rows] = True
+    return values, filled
+
+
+def absent_station_days(data, spans, days, key="station_id", time_column="date"):
+    """Rows for the `days` inside each station's span that `data` has no row for.
+
+    `spans` is indexed by station with `min` and `max` dates; its other columns (station-constant
+    values such as state) are copied onto the new rows.
+    """
+    grid = pd.MultiIndex.from_product([spans.index, days], names=[key, time_column])
+    station_span = spans.reindex(grid.get_level_values(key))
+    grid_days = grid.get_level_values(time_column)
+    grid = grid[(grid_days >= station_span["min"].to_numpy()) & (grid_days <= station_span["max"].to_numpy())]
+    absent = grid.difference(pd.MultiIndex.from_frame(data[[key, time_column]])).to_frame(index=False)
+    return absent.join(spans.drop(columns=["min", "max"]), on=key)
+
+
+def fill_block_from_neighbours(data, column, station_tree, spans, days, climatology=None, k=4, max_distance_km=150.0,
+                               key="station_id", time_column="date"):
+    """Fill the gaps station_gap_imputer left (flagged GAP_TOO_LONG) in one block of days from neighbouring stations.
+
+    The block is reindexed onto the station x day grid first (see absent_station_days), so days
+    a station has no row for at all are filled too; those become new rows only when a neighbour
+    value was found. Returns (block, values filled, how many of them on new rows).
+    """
+    flag = f"{column}_imputed"
+    absent = absent_station_days(data, spans, days, key, time_column)
+    absent[flag] = GAP_TOO_LONG
+    block = pd.concat([data, absent], ignore_index=True)
+    added = np.arange(len(block)) >= len(data)
+
+    values, filled = spatial_impute(block, column, station_tree, k, max_distance_km, key=key, time_column=time_column,
+                                    climatology=climatology)
+
+    # Only rows the per-station pass gave up on (or had no row for) are changed
+    filled &= (block[flag] == GAP_TOO_LONG).to_numpy()
+    block.loc[filled, column] = values[filled]
+    block.loc[filled, flag] = NEIGHBOUR_FILLED
+    block = block[~added | filled].sort_values([key, time_column], kind="stable", ignore_index=True)
+    return block, int(filled.sum()), int((added & filled).sum())
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+# Values of the per-column `<column>_imputed` flag
+OBSERVED = 0
+FILLED = 1
+GAP_TOO_LONG = 2  # Interior gap longer than max_gap, or a leading/trailing gap; left missing
+
+
+def neighbour_positions(valid, station_start, station_end):
+    """Positions of the previous and next valid row within the same station (-1 where there is none)."""
+    positions = np.arange(len(valid))
+    previous = np.maximum.accumulate(np.where(valid, positions, -1))
+    following = np.minimum.accumulate(np.where(valid, positions, len(valid))[::-1])[::-1]
+    previous = np.where(previous >= station_start, previous, -1)
+    following = np.where(following < station_end, following, -1)
+    return previous, following
+
+
+def fill_station_gaps(frame, column, method="linear", max_gap=7, key="station_id",
+                      time_column="date", time_step=pd.Timedelta(days=1), period=24):
+    """Fill interior gaps of `column` in a station-sorted frame; returns (values, flags).
+
+    Gap length is measured in `time_step` units between the surrounding observations, so
+    absent rows count as missing too. `method="linear"` interpolates in time between those
+    observations; `method="seasonal"` averages the station's observed values `period` time
+    steps before and after (whichever exist), falling back to linear. Gaps longer than
+    `max_gap` and gaps without an observation on both sides are left missing and flagged.
+    """
+    if method not in ("linear", "seasonal"):
+        raise ValueError(f"Unknown gap filling method: {method}")
+
+    values = frame[column].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    flags = np.where(valid, OBSERVED, GAP_TOO_LONG).astype(np.uint8)
+    if valid.all() or len(values) == 0:
+        return values, flags
+
+    stations = frame[key].to_numpy()
+    new_station = np.concatenate(([True], stations[1:] != stations[:-1]))
+    station_start = np.maximum.accumulate(np.where(new_station, np.arange(len(values)), 0))
+    station_end = np.concatenate((np.flatnonzero(new_station)[1:], [len(values)]))[np.cumsum(new_station) - 1]
+    previous, following = neighbour_positions(valid, station_start, station_end)
+
+    times = pd.DatetimeIndex(frame[time_column]).as_unit("ns").asi8
+    step = pd.Timedelta(time_step).value
+    interior = ~valid & (previous >= 0) & (following >= 0)
+    gap_length = np.where(interior, (times[np.maximum(following, 0)] - times[np.maximum(previous, 0)]) // step - 1, 0)
+    fill = interior & (gap_length <= max_gap)
+
+    idx = np.flatnonzero(fill)
+    before, after = previous[idx], following[idx]
+    weight = (times[idx] - times[before]) / (times[after] - times[before])
+    filled = values[before] + (values[after] - values[before]) * weight
+
+    if method == "seasonal":
+        # Same-phase values are looked up by timestamp (t -/+ period), so absent rows do not shift the phase
+        observed = pd.Series(values[valid], index=pd.MultiIndex.from_arrays([stations[valid], times[valid]]))
+        observed = observed[~observed.index.duplicated()]
+        shift = period * step
+        same_phase = np.vstack([
+            observed.reindex(pd.MultiIndex.from_arrays([stations[idx], times[idx] + offset])).to_numpy()
+            for offset in (-shift, shift)
+        ])
+        counts = (~np.isnan(same_phase)).sum(axis=0)
+        with np.errstate(invalid="ignore"):
+            seasonal = np.nansum(same_phase, axis=0) / counts
+        filled = np.where(np.isnan(seasonal), filled, seasonal)
+
+    values = values.copy()
+    values[idx] = filled
+    flags[idx] = FILLED
+    return values, flags
+
+
+def pending_tail(frame, columns, method, max_gap, key, time_column, time_step, period):
+    """Split point of a station-sorted frame into final rows and a tail that depends on future rows.
+
+    Returns (context, cut): rows [0, cut) can be emitted; rows [context, len) must be carried
+    into the next chunk, where [context, cut) are already-emitted context (the last observation
+    before an open gap and, for seasonal fills, `period` time steps of history).
+    """
+    n = len(frame)
+    stations = frame[key].to_numpy()
+    first_last = int(np.argmax(stations == stations[-1]))
+    times = pd.DatetimeIndex(frame[time_column]).as_unit("ns").asi8
+    horizon = (max_gap + 1) * pd.Timedelta(time_step).value
+    span = period * pd.Timedelta(time_step).value
+    station_times = times[first_last:]
+
+    missing = {column: frame[column].isna().to_numpy() for column in columns}
+    observed = {column: np.flatnonzero(~missing[column][first_last:]) + first_last for column in columns}
+
+    # Rows from the first one that may still change with future rows onwards are pending
+    cut = n
+    for column in columns:
+        last = observed[column]
+        if len(last) and times[-1] - times[last[-1]] < horizon:
+            # A trailing gap (or the next one) could still be closed within max_gap
+            cut = min(cut, last[-1] + 1)
+        if method == "seasonal":
+            # Gaps in the last period need the next period's values
+            late = first_last + int(np.searchsorted(station_times, times[-1] - span, side="right"))
+            missing_late = np.flatnonzero(missing[column][late:])
+            if len(missing_late):
+                cut = min(cut, late + missing_late[0])
+
+    # Context: each column's last observation before the cut, plus a period of seasonal history
+    context = cut
+    for column in columns:
+        before = observed[column][observed[column] < cut]
+        if len(before) and (cut < n or times[-1] - times[before[-1]] < horizon):
+            context = min(context, before[-1])
+    if method == "seasonal":
+        # Rows still to come (from the cut, or after the last row) look back one period
+        reference = times[cut] if cut < n else times[-1]
+        context = min(context, first_last + int(np.searchsorted(station_times, reference - span, side="left")))
+    return max(context, first_last) if context < cut else cut, cut
+
+
+def iter_imputed_chunks(chunks, columns, method="linear", max_gap=7, key="station_id",
+                        time_column="date", time_step=pd.Timedelta(days=1), period=24):
+    """Gap-fill a station-sorted chunked stream in one O(n) pass, consistently across chunk boundaries.
+
+    Only the last station of a chunk can continue in the next one. Its rows that still depend
+    on future rows (an open trailing gap shorter than max_gap, or seasonal fills that need the
+    next period) are held back in a tail buffer together with their context and re-processed
+    with the next chunk. Every row is yielded exactly once, with `<column>_imputed` flags.
+    """
+    def impute(frame):
+        frame = frame.copy()
+        for column in columns:
+            frame[column], frame[f"{column}_imputed"] = fill_station_gaps(
+                frame, column, method, max_gap, key, time_column, time_step, period
+            )
+        return frame
+
+    carry, carried_emitted = None, 0
+    for chunk in chunks:
+        frame = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        frame = frame.reset_index(drop=True)
+        if frame.empty:
+            continue
+
+        context, cut = pending_tail(frame, columns, method, max_gap, key, time_column, time_step, period)
+        cut = max(cut, carried_emitted)  # Rows emitted in an earlier round are never emitted again
+        output = impute(frame).iloc[carried_emitted:cut]
+        carry = frame.iloc[context:] if context < len(frame) else None
+        carried_emitted = cut - context
+        if not output.empty:
+            yield output
+
+    if carry is not None:
+        output = impute(carry.reset_index(drop=True)).iloc[carried_emitted:]
+        if not output.empty:
+            yield output
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def weight_matrix(station_ids, region_names, rows, cols, values):
+    """Sparse station x region weight matrix plus the station and region labels of its axes."""
+    matrix = sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float64), (np.asarray(rows), np.asarray(cols))),
+        shape=(len(station_ids), len(region_names))
+    )
+    matrix.eliminate_zeros()
+    return {
+        "matrix": matrix,
+        "stations": list(station_ids),
+        "regions": list(region_names),
+        "station_index": {station: i for i, station in enumerate(station_ids)}
+    }
+
+
+def membership_weights(stations, weight_column=None, region_column="state", key="station_id"):
+    """Weights from a station -> region membership table; one row per (station, region) pair.
+
+    Every member weighs 1 unless `weight_column` (e.g. a population figure) is given.
+    A station listed under several regions (overlapping load zones, say) contributes to each.
+    """
+    members = stations.dropna(subset=[key, region_column]).drop_duplicates(subset=[key, region_column])
+    station_codes, station_ids = pd.factorize(members[key], sort=True)
+    region_codes, region_names = pd.factorize(members[region_column], sort=True)
+    values = np.ones(len(members)) if weight_column is None else members[weight_column].fillna(0).to_numpy()
+    return weight_matrix(station_ids, region_names, station_codes, region_codes, values)
+
+
+def equal_weights(stations, region_column="state", key="station_id"):
+    """Unweighted region means: every member station counts once."""
+    return membership_weights(stations, None, region_column, key)
+
+
+def population_weights(stations, population_column="population", region_column="state", key="station_id"):
+    """Member stations weighted by the population they represent (e.g. their county's)."""
+    return membership_weights(stations, population_column, region_column, key)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distances in km, broadcasting over the inputs."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def inverse_distance_weights(stations, centroids, power=2.0, max_distance_km=300.0, min_distance_km=1.0,
+                             key="station_id", region_column="region"):
+    """Stations weighted by 1 / distance**power to each region centroid within `max_distance_km`.
+
+    `stations` needs key, LAT and LON columns; `centroids` needs region_column, LAT and LON.
+    Distances below `min_distance_km` are clamped so a station at the centroid does not dominate.
+    """
+    stations = stations.dropna(subset=[key, "LAT", "LON"]).drop_duplicates(subset=[key])
+    distances = haversine_km(
+        stations["LAT"].to_numpy()[:, None], stations["LON"].to_numpy()[:, None],
+        centroids["LAT"].to_numpy()[None, :], centroids["LON"].to_numpy()[None, :]
+    )
+    rows, cols = np.nonzero(distances <= max_distance_km)
+    values = np.maximum(distances[rows, cols], min_distance_km) ** -power
+    return weight_matrix(stations[key].to_numpy(), centroids[region_column].to_numpy(), rows, cols, values)
@@ -1,11 +1,21 @@
 import os
 import requests
 import pandas as pd
+from http_response_cache import open_response_cache, cached_get_json
+from eia_client import new_eia_client, fetch_eia_data, stream_eia_data, PAGE_LENGTH
+from request_scheduler import open_request_scheduler, remaining_quota, DailyQuotaExceeded
+from api_page_sink import write_page, stream_to_parquet, eia_monthly_schema, CDO_DATA_SCHEMA
 
 # API Keys
 EIA_API_KEY = 'Your_EIA_API_KEY'
 NOAA_API_KEY = 'Your_NOAA_API_TOKEN'
 
+# Responses are cached on disk, and NOAA and EIA requests are paced by the scheduler shared with
+# the other extraction jobs; one pooled EIA client is shared by all states
+api_cache = open_response_cache()
+scheduler = open_request_scheduler()
+eia_client = new_eia_client(EIA_API_KEY, cache=api_cache, scheduler=scheduler)
+
 # Configuration for states, date range, and directories
 STATES = {'CO': 'Colorado', 'TX': 'Texas', 'CA': 'California'}
 START_DATE = '2022-01-01'
@@ -23,51 +33,50 @@ def ensure_directory(path):
 ensure_directory(ENERGY_DIR)
 ensure_directory(TEMPERATURE_DIR)
 
-# Function to retrieve monthly electricity generation data by state
-def get_monthly_generation_by_state(state_code, start_date, end_date, length=5000):
-    url = "https://api.eia.gov/v2/electricity/electric-power-operational-data/data/"
+# Stream API pages straight into Parquet datasets (same names, .parquet) instead of collecting them
+# for one CSV; off by default since temperature_energy_data_transform.py reads the CSVs
+STREAM_TO_PARQUET = False
+GENERATION_SCHEMA = eia_monthly_schema('generation', ['location', 'stateDescription', 'sectorid', 'sectorDescription', 'fueltypeid', 'fuelTypeDescription'])
+
+# Function to retrieve monthly electricity generation data by state (streamed to `sink` when given)
+def get_monthly_generation_by_state(state_code, start_date, end_date, length=PAGE_LENGTH, sink=None):
     params = {
-        "api_key": EIA_API_KEY,
         "frequency": "monthly",
         "data[0]": "generation",
         "facets[location][]": state_code,
         "sort[0][column]": "period",
         "sort[0][direction]": "desc",
-        "offset": 0,
-        "length": length
     }
     if start_date:
         params["start"] = start_date
     if end_date:
         params["end"] = end_date
 
-    response = requests.get(url, params=params)
-    try:
-        data = response.json()
-        records = data.get('response', {}).get('data', [])
-        return pd.DataFrame(records) if records else pd.DataFrame()
-    except (requests.exceptions.JSONDecodeError, KeyError):
-        print(f"Error fetching data for state {state_code}: {data.get('error', 'Unknown error')}")
-        return pd.DataFrame()
+    if sink is not None:
+        return stream_eia_data(eia_client, "electricity/electric-power-operational-data/data/", params, sink, length, label=f"{state_code} generation")
+    return fetch_eia_data(eia_client, "electricity/electric-power-operational-data/data/", params, length, label=f"{state_code} generation")
 
 # Function to retrieve monthly average temperature data using GSOM, with fallback to GSDN if needed
-def get_monthly_average_temperature_by_state(state_fips, start_date, end_date):
+def get_monthly_average_temperature_by_state(state_fips, start_date, end_date, sink=None):
     # Attempt to retrieve data from GSOM
     fip_code = {'CO': '08', 'TX':'48', 'CA':'06'}
-    temperature_data = fetch_data_with_pagination(fip_code[state_fips], start_date, end_date, "GSOM", "TAVG")
+    temperature_data = fetch_data_with_pagination(fip_code[state_fips], start_date, end_date, "GSOM", "TAVG", sink)
+    retrieved = temperature_data if sink is not None else len(temperature_data)
     
     # If no GSOM data, fallback to GSDN
-    if temperature_data.empty:
+    if not retrieved:
         print(f"No GSOM data available for state FIPS {state_fips}. Falling back to GSDN.")
-        temperature_data = fetch_data_with_pagination(fip_code[state_fips], start_date, end_date, "GHCND", "TAVG")
+        temperature_data = fetch_data_with_pagination(fip_code[state_fips], start_date, end_date, "GHCND", "TAVG", sink)
     
     return temperature_data
 
-# Function to handle paginated data retrieval for GSOM and GSDN datasets
-def fetch_data_with_pagination(state_fips, start_date, end_date, datasetid, datatypeid):
+# Function to handle paginated data retrieval for GSOM and GSDN datasets (written to `sink` page by page
+# when one is given, returning the row count)
+def fetch_data_with_pagination(state_fips, start_date, end_date, datasetid, datatypeid, sink=None):
     url = "https://www.ncdc.noaa.gov/cdo-web/api/v2/data"
     headers = {"token": NOAA_API_KEY}
     all_data = []
+    retrieved = 0
     offset = 0
     limit = 1000  # NOAA API max limit per request
     
@@ -83,32 +92,50 @@ def fetch_data_with_pagination(state_fips, start_date, end_date, datasetid, data
             "offset": offset,
         }
         
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                results = data.get('results', [])
-                if not results:
-                    break  # No more data to retrieve; exit the loop
+        try:
+            status_code, data = cached_get_json(api_cache, url, params=params, headers=headers, scheduler=scheduler)
+        except requests.exceptions.JSONDecodeError:
+            print(f"Error decoding JSON for dataset {datasetid} for state FIPS {state_fips}.")
+            break
+        except DailyQuotaExceeded as e:
+            print(f"Stopping dataset {datasetid} for state FIPS {state_fips} at offset {offset}: {e}")
+            break
+        if status_code == 200:
+            results = data.get('results', [])
+            if not results:
+                break  # No more data to retrieve; exit the loop
+            if sink is not None:
+                write_page(sink, results)  # Streamed out as it arrives instead of kept
+                retrieved += len(results)
+            else:
                 all_data.extend(results)
-                offset += limit  # Increment the offset for the next page
-            except requests.exceptions.JSONDecodeError:
-                print(f"Error decoding JSON for dataset {datasetid} for state FIPS {state_fips}.")
-                break
+            offset += limit  # Increment the offset for the next page
         else:
-            print(f"Error: Received status code {response.status_code} for dataset {datasetid} and state FIPS {state_fips}.")
+            print(f"Error: Received status code {status_code} for dataset {datasetid} and state FIPS {state_fips}.")
             break
 
+    if sink is not None:
+        return retrieved
     return pd.DataFrame(all_data) if all_data else pd.DataFrame()
 
 # Main function to retrieve and save data for each state
 def retrieve_and_save_data(states, start_date, end_date):
+    print(f"NOAA CDO requests left today: {remaining_quota(scheduler, 'noaa-cdo')}")
     for state_code, state_name in states.items():
         state_energy_dir = os.path.join(ENERGY_DIR, state_name)
         state_temperature_dir = os.path.join(TEMPERATURE_DIR, state_name)
         ensure_directory(state_energy_dir)
         ensure_directory(state_temperature_dir)
 
+        if STREAM_TO_PARQUET:
+            energy_path = os.path.join(state_energy_dir, f"{state_name}_Monthly_Electricity_Generation_{start_date[:7]}_{end_date[:7]}.parquet")
+            rows = stream_to_parquet(energy_path, GENERATION_SCHEMA, lambda sink: get_monthly_generation_by_state(state_code, start_date, end_date, sink=sink))
+            print(f"{rows} electricity generation records for {state_name} saved to {energy_path}")
+            temperature_path = os.path.join(state_temperature_dir, f"{state_name}_Monthly_Avg_Temperature_{start_date[:7]}_{end_date[:7]}.parquet")
+            rows = stream_to_parquet(temperature_path, CDO_DATA_SCHEMA, lambda sink: get_monthly_average_temperature_by_state(state_code, start_date, end_date, sink))
+            print(f"{rows} temperature records for {state_name} saved to {temperature_path}")
+            continue
+
         # Retrieve and save electricity generation data
         generation_data = get_monthly_generation_by_state(state_code, start_date, end_date)
         if not generation_data.empty:
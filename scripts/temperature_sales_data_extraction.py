@@ -2,11 +2,21 @@ import os
 import requests
 import pandas as pd
 from datetime import datetime, timedelta
+from http_response_cache import open_response_cache, cached_get_json
+from eia_client import new_eia_client, fetch_eia_data, stream_eia_data, PAGE_LENGTH
+from request_scheduler import open_request_scheduler, remaining_quota, DailyQuotaExceeded
+from api_page_sink import write_page, stream_to_parquet, eia_monthly_schema, CDO_DATA_SCHEMA
 
 # API Keys
 EIA_API_KEY = 'Your_EIA_API_KEY'
 NOAA_API_KEY = 'Your_NOAA_API_TOKEN'
 
+# Responses are cached on disk, and NOAA and EIA requests are paced by the scheduler shared with
+# the other extraction jobs; one pooled EIA client is shared by all states
+api_cache = open_response_cache()
+scheduler = open_request_scheduler()
+eia_client = new_eia_client(EIA_API_KEY, cache=api_cache, scheduler=scheduler)
+
 # Configuration for states, date range, and directories
 STATES = {'CO': 'Colorado', 'TX': 'Texas', 'CA': 'California'}
 START_DATE = '2022-01-01'
@@ -24,6 +34,11 @@ def ensure_directory(path):
 ensure_directory(SALES_DIR)
 ensure_directory(SALES_TEMPERATURE_DIR)
 
+# Stream API pages straight into Parquet datasets (same names, .parquet) instead of collecting them
+# for one CSV per state; off by default to keep the CSV outputs
+STREAM_TO_PARQUET = False
+SALES_SCHEMA = eia_monthly_schema('sales', ['stateid', 'stateDescription', 'sectorid', 'sectorName'])
+
 # Helper function to split date range into 6-month intervals
 def split_date_range(start_date, end_date, interval_months=6):
     start = datetime.strptime(start_date, "%Y-%m-%d")
@@ -38,65 +53,68 @@ def split_date_range(start_date, end_date, interval_months=6):
     return ranges
 
 # Function to retrieve monthly electricity sales data by state within each 6-month period
-def get_monthly_sales_by_state(state_code, start_date, end_date, length=5000):
-    all_data = pd.DataFrame()
+# (streamed to `sink` when given, returning the row count)
+def get_monthly_sales_by_state(state_code, start_date, end_date, length=PAGE_LENGTH, sink=None):
+    frames = []
+    retrieved = 0
     
     for period_start, period_end in split_date_range(start_date, end_date):
-        # Construct the API URL with query parameters for each date range
-        url = (
-            f"https://api.eia.gov/v2/electricity/retail-sales/data/"
-            f"?api_key={EIA_API_KEY}"
-            f"&frequency=monthly"
-            f"&data[0]=sales"
-            f"&facets[stateid][]={state_code}"
-            f"&start={period_start}"
-            f"&end={period_end}"
-            f"&sort[0][column]=period"
-            f"&sort[0][direction]=desc"
-            f"&offset=0"
-            f"&length={length}"
-        )
-        
-        response = requests.get(url)
-        try:
-            data = response.json()
-            records = data.get('response', {}).get('data', [])
-            if records:
-                all_data = pd.concat([all_data, pd.DataFrame(records)], ignore_index=True)
-                print(f"Sales data request completed for {state_code} from {period_start} to {period_end}. Records retrieved: {len(records)}")
-            else:
-                print(f"Sales data request for {state_code} from {period_start} to {period_end} completed with no data.")
-        except (requests.exceptions.JSONDecodeError, KeyError):
-            print(f"Error fetching sales data for state {state_code}: {data.get('error', 'Unknown error')}")
+        params = {
+            "frequency": "monthly",
+            "data[0]": "sales",
+            "facets[stateid][]": state_code,
+            "start": period_start,
+            "end": period_end,
+            "sort[0][column]": "period",
+            "sort[0][direction]": "desc",
+        }
+        if sink is not None:
+            count = stream_eia_data(eia_client, "electricity/retail-sales/data/", params, sink, length, label=f"{state_code} sales")
+        else:
+            records = fetch_eia_data(eia_client, "electricity/retail-sales/data/", params, length, label=f"{state_code} sales")
+            frames.append(records)
+            count = len(records)
+        retrieved += count
+        if count:
+            print(f"Sales data request completed for {state_code} from {period_start} to {period_end}. Records retrieved: {count}")
+        else:
+            print(f"Sales data request for {state_code} from {period_start} to {period_end} completed with no data.")
     
-    return all_data
+    if sink is not None:
+        return retrieved
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
 # Function to retrieve monthly average temperature data using GSOM with fallback to GSDN within each 6-month period
-def get_monthly_average_temperature_by_state(state_fips, start_date, end_date):
+def get_monthly_average_temperature_by_state(state_fips, start_date, end_date, sink=None):
     fip_code = {'CO': '08', 'TX': '48', 'CA': '06'}
     all_temperature_data = pd.DataFrame()
 
     for period_start, period_end in split_date_range(start_date, end_date, 2):
-        temperature_data = fetch_data_with_pagination(fip_code[state_fips], period_start, period_end, "GSOM", "TAVG")
+        temperature_data = fetch_data_with_pagination(fip_code[state_fips], period_start, period_end, "GSOM", "TAVG", sink)
+        retrieved = temperature_data if sink is not None else len(temperature_data)
         
-        if temperature_data.empty:
+        if not retrieved:
             print(f"No GSOM data available for state FIPS {state_fips} from {period_start} to {period_end}. Falling back to GSDN.")
-            temperature_data = fetch_data_with_pagination(fip_code[state_fips], period_start, period_end, "GHCND", "TAVG")
+            temperature_data = fetch_data_with_pagination(fip_code[state_fips], period_start, period_end, "GHCND", "TAVG", sink)
+            retrieved = temperature_data if sink is not None else len(temperature_data)
         
-        if not temperature_data.empty:
-            print(f"Temperature data request completed for {state_fips} from {period_start} to {period_end}. Records retrieved: {len(temperature_data)}")
+        if retrieved:
+            print(f"Temperature data request completed for {state_fips} from {period_start} to {period_end}. Records retrieved: {retrieved}")
         else:
             print(f"Temperature data request for {state_fips} from {period_start} to {period_end} completed with no data.")
         
-        all_temperature_data = pd.concat([all_temperature_data, temperature_data], ignore_index=True)
+        if sink is None:
+            all_temperature_data = pd.concat([all_temperature_data, temperature_data], ignore_index=True)
     
     return all_temperature_data
 
 # Function to handle paginated data retrieval for GSOM and GSDN datasets within specified 6-month periods
-def fetch_data_with_pagination(state_fips, start_date, end_date, datasetid, datatypeid):
+# (written to `sink` page by page when one is given, returning the row count)
+def fetch_data_with_pagination(state_fips, start_date, end_date, datasetid, datatypeid, sink=None):
     url = "https://www.ncdc.noaa.gov/cdo-web/api/v2/data"
     headers = {"token": NOAA_API_KEY}
     all_data = []
+    retrieved = 0
     offset = 0
     limit = 1000  # NOAA API max limit per request
     
@@ -112,33 +130,51 @@ def fetch_data_with_pagination(state_fips, start_date, end_date, datasetid, data
             "offset": offset,
         }
         
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                results = data.get('results', [])
-                if not results:
-                    print(f"Completed temperature data request for {state_fips} with no more records.")
-                    break
-                all_data.extend(results)
-                offset += limit
-            except requests.exceptions.JSONDecodeError:
-                print(f"Error decoding JSON for dataset {datasetid} for state FIPS {state_fips}.")
+        try:
+            status_code, data = cached_get_json(api_cache, url, params=params, headers=headers, scheduler=scheduler)
+        except requests.exceptions.JSONDecodeError:
+            print(f"Error decoding JSON for dataset {datasetid} for state FIPS {state_fips}.")
+            break
+        except DailyQuotaExceeded as e:
+            print(f"Stopping dataset {datasetid} for state FIPS {state_fips} at offset {offset}: {e}")
+            break
+        if status_code == 200:
+            results = data.get('results', [])
+            if not results:
+                print(f"Completed temperature data request for {state_fips} with no more records.")
                 break
+            if sink is not None:
+                write_page(sink, results)  # Streamed out as it arrives instead of kept
+                retrieved += len(results)
+            else:
+                all_data.extend(results)
+            offset += limit
         else:
-            print(f"Error: Received status code {response.status_code} for dataset {datasetid} and state FIPS {state_fips}.")
+            print(f"Error: Received status code {status_code} for dataset {datasetid} and state FIPS {state_fips}.")
             break
 
+    if sink is not None:
+        return retrieved
     return pd.DataFrame(all_data) if all_data else pd.DataFrame()
 
 # Main function to retrieve and save data for each state within each 6-month period
 def retrieve_and_save_data(states, start_date, end_date):
+    print(f"NOAA CDO requests left today: {remaining_quota(scheduler, 'noaa-cdo')}")
     for state_code, state_name in states.items():
         state_sales_dir = os.path.join(SALES_DIR, state_name)
         state_sales_temperature_dir = os.path.join(SALES_TEMPERATURE_DIR, state_name)
         ensure_directory(state_sales_dir)
         ensure_directory(state_sales_temperature_dir)
 
+        if STREAM_TO_PARQUET:
+            sales_path = os.path.join(state_sales_dir, f"{state_name}_Monthly_Electricity_Sales_{start_date[:7]}_{end_date[:7]}.parquet")
+            rows = stream_to_parquet(sales_path, SALES_SCHEMA, lambda sink: get_monthly_sales_by_state(state_code, start_date, end_date, sink=sink))
+            print(f"{rows} electricity sales records for {state_name} saved to {sales_path}")
+            temperature_path = os.path.join(state_sales_temperature_dir, f"{state_name}_Monthly_Avg_Temperature_{start_date[:7]}_{end_date[:7]}.parquet")
+            rows = stream_to_parquet(temperature_path, CDO_DATA_SCHEMA, lambda sink: get_monthly_average_temperature_by_state(state_code, start_date, end_date, sink))
+            print(f"{rows} temperature records for {state_name} saved to {temperature_path}")
+            continue
+
         # Retrieve and save electricity sales data
         sales_data = get_monthly_sales_by_state(state_code, start_date, end_date)
         if not sales_data.empty:
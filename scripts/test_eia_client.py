@@ -0,0 +1,63 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("pyarrow")
+import request_scheduler
+from eia_client import new_eia_client, fetch_eia_page
+from request_scheduler import open_request_scheduler
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """Answers the first request with 429 and Retry-After, every later one with an empty EIA page."""
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        if type(self).hits == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            body = b"{}"
+        else:
+            self.send_response(200)
+            body = json.dumps({"response": {"total": 0, "data": []}}).encode()
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def eia_server(monkeypatch):
+    """A local stand-in for the EIA API, rate-limited through the scheduler's "eia" bucket."""
+    RateLimitedHandler.hits = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setitem(request_scheduler.HOST_BUCKETS, "127.0.0.1", "eia")
+    monkeypatch.setattr("eia_client.EIA_BASE_URL", f"http://127.0.0.1:{server.server_port}/")
+    yield server
+    server.shutdown()
+
+
+def test_429_with_retry_after_blocks_the_bucket(eia_server, tmp_path):
+    state_file = tmp_path / "rate_limits.json"
+    scheduler = open_request_scheduler(str(state_file), limits={"eia": {"rate": 100.0, "burst": 10, "daily_quota": None}})
+    client = new_eia_client("test-key", max_workers=1, scheduler=scheduler)
+    # Use the client's retrying adapter for the plain-HTTP test server too
+    client["session"].mount("http://", client["session"].get_adapter("https://api.eia.gov/"))
+
+    assert not client["session"].get_adapter("https://api.eia.gov/").max_retries.is_retry("GET", 429, True)
+
+    page = fetch_eia_page(client, "electricity/rto/region-data/data/", {"frequency": "hourly"}, 0)
+
+    # The 429 reached the scheduler, which blocked the shared bucket before re-sending
+    state = json.loads(state_file.read_text())
+    assert state["eia"]["blocked_until"] > 0
+    assert RateLimitedHandler.hits == 2
+    assert page == {"total": 0, "data": []}
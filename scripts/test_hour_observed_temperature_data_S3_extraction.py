@@ -0,0 +1,67 @@
+import io
+import asyncio
+import socket
+import pandas as pd
+import pytest
+
+moto_server = pytest.importorskip("moto.server")
+pytest.importorskip("aiobotocore")
+import boto3
+import hour_observed_temperature_data_S3_extraction as extraction
+
+
+def dly_line(station_id, year, month, element, values):
+    """One fixed-width .dly record; days without a value are written as -9999."""
+    days = "".join(f"{values.get(day, -9999):5d}   " for day in range(1, 32))
+    return f"{station_id}{year:04d}{month:02d}{element}{days}\n"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def s3_endpoint(monkeypatch):
+    """A moto S3 server on localhost, reached through the extraction's endpoint override."""
+    for name, value in (("AWS_ACCESS_KEY_ID", "testing"), ("AWS_SECRET_ACCESS_KEY", "testing"),
+                        ("AWS_DEFAULT_REGION", "us-east-1")):
+        monkeypatch.setenv(name, value)
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=free_port())
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+def test_extract_stations_against_s3_endpoint(s3_endpoint, tmp_path):
+    s3 = boto3.client("s3", endpoint_url=s3_endpoint)
+    s3.create_bucket(Bucket=extraction.S3_BUCKET)
+    s3.put_object(
+        Bucket=extraction.S3_BUCKET,
+        Key=f"{extraction.S3_BASE_DIR}/USC00000001.dly",
+        Body=(dly_line("USC00000001", 2022, 1, "TOBS", {1: -45, 2: 52})
+              + dly_line("USC00000001", 2022, 1, "PRCP", {2: 301})
+              + dly_line("USC00000001", 2022, 1, "SNOW", {3: 10})).encode()
+    )
+    s3.put_object(
+        Bucket=extraction.S3_BUCKET,
+        Key=f"{extraction.S3_BASE_DIR}/USC00000002.dly",
+        Body=dly_line("USC00000002", 2022, 2, "TOBS", {28: 17}).encode()
+    )
+    stations = [("USC00000001", "AL"), ("USC00000002", "TX"), ("USC00000003", "OK")]  # The last has no file
+
+    rows = asyncio.run(extraction.extract_stations(
+        stations, str(tmp_path / "observed_weather_data.csv"), endpoint_url=s3_endpoint,
+        max_concurrency=2, parse_workers=2
+    ))
+
+    body = s3.get_object(Bucket=extraction.OUTPUT_BUCKET, Key=extraction.OUTPUT_KEY)["Body"].read()
+    uploaded = pd.read_csv(io.BytesIO(body), parse_dates=["date"]).sort_values(["station_id", "date"], ignore_index=True)
+    assert rows == len(uploaded) == 3
+    assert uploaded["station_id"].tolist() == ["USC00000001", "USC00000001", "USC00000002"]
+    assert uploaded["state"].tolist() == ["AL", "AL", "TX"]
+    assert uploaded["date"].dt.strftime("%Y-%m-%d").tolist() == ["2022-01-01", "2022-01-02", "2022-02-28"]
+    assert uploaded["TOBS"].tolist() == [-45, 52, 17]
+    assert uploaded["PRCP"].isna().tolist() == [True, False, True]
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("scipy")
+from station_gap_imputer import OBSERVED, GAP_TOO_LONG
+from spatial_neighbor_imputer import build_station_tree, fill_block_from_neighbours, NEIGHBOUR_FILLED
+
+
+def test_fill_block_from_neighbours_adds_absent_days_with_station_columns():
+    coords = pd.DataFrame({
+        "station_id": ["A", "B", "C"],
+        "latitude": [40.0, 40.1, 40.2],
+        "longitude": [-100.0, -100.1, -100.2],
+    })
+    days = pd.date_range("2022-03-01", "2022-03-31", freq="D")
+    frames = []
+    for i, (station, state) in enumerate((("A", "TX"), ("B", "TX"), ("C", "OK"))):
+        frames.append(pd.DataFrame({
+            "date": days, "station_id": station, "state": state,
+            "TOBS": 50.0 + i + np.sin(np.arange(len(days))), "TOBS_imputed": OBSERVED,
+        }))
+    data = pd.concat(frames, ignore_index=True)
+
+    # A has a long gap the per-station pass gave up on; B has no rows at all for 10-14 March
+    gap = (data["station_id"] == "A") & data["date"].between("2022-03-05", "2022-03-12")
+    data.loc[gap, "TOBS"] = np.nan
+    data.loc[gap, "TOBS_imputed"] = GAP_TOO_LONG
+    data = data[~((data["station_id"] == "B") & data["date"].between("2022-03-10", "2022-03-14"))]
+
+    spans = pd.DataFrame({"min": days[0], "max": days[-1], "state": ["TX", "TX", "OK"]}, index=pd.Index(["A", "B", "C"], name="station_id"))
+    block, filled, added = fill_block_from_neighbours(data, "TOBS", build_station_tree(coords), spans, days)
+
+    assert (filled, added) == (13, 5)
+    assert len(block) == 3 * len(days)
+    assert block["TOBS"].notna().all()
+    neighbour_filled = block[block["TOBS_imputed"] == NEIGHBOUR_FILLED]
+    assert len(neighbour_filled) == 13
+    # Rows added for days without a row keep their station's state
+    assert neighbour_filled["state"].tolist() == ["TX"] * 13
+    assert block.groupby("station_id")["state"].nunique().eq(1).all()